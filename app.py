@@ -1,22 +1,36 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+import time
+import logging
 from contextlib import asynccontextmanager
-import json
 import asyncio
 from command.command_handler import command_handler
 from db.database import init_database, db_manager
 from db.repository import group_repo
 from utils.send_utils_sync import at_user, get_member_nick
 from utils.send_utils import send_message
+from utils.http_client import async_http_client, http_client
+from cache.nick_cache import nick_cache
 from celery_tasks.initialize_tasks import initialize_tasks
 from celery_tasks.schedule_tasks import (add_koupai_member, update_koupai_member, 
                         add_mai89_member, add_bb_member, delete_bb_member, add_daizou_member,
                         scheduled_task)
-from celery_tasks.tasks_crud import get_renwu_list
 from celery_app import cleanup_expired_results
-from cache.redis_pool import get_redis_connection
+from cache.redis_pool import get_redis_connection, redis_pool
+from cache.redis_stats import redis_stats
+from common.metrics import (metrics, CONTENT_TYPE, HTTP_REQUEST_SECONDS, REDIS_SECONDS,
+                            CALLBACK_MESSAGES, COMMANDS)
+from common.tracing import tracer
+from common.log import setup_logging, sampled, PAYLOAD_LOGGER
 import re
 from command.rules.hostPhrase_rules import parse_at_message
-from common.global_vars import *
+from common.group_state import group_state
+from common.ingress import ingress_stamper
+from common.classifier import (message_classifier, MSG_KOUPAI, MSG_BB, MSG_BACK,
+                               MSG_RENWU, MSG_MAI89, MSG_DAIZOU)
+from common.config import FAST_PATH_ENABLED, CALLBACK_CAPTURE_PATH
+from common.capture import CallbackRecorder
+from celery_tasks.fast_path import koupai_fast_path
 # from celery_app import celery_app
 
 # app.add_middleware(
@@ -28,7 +42,14 @@ from common.global_vars import *
 # )
 
 
+# 日志经队列在后台线程中输出（见 common.log）
+setup_logging()
+logger = logging.getLogger(__name__)
+payload_logger = logging.getLogger(PAYLOAD_LOGGER)
+
 redis_conn = get_redis_connection(0)
+# 回调录制（设置 CALLBACK_CAPTURE_PATH 时启用）
+callback_recorder = CallbackRecorder(CALLBACK_CAPTURE_PATH)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 在应用启动时初始化数据库
@@ -43,12 +64,10 @@ async def lifespan(app: FastAPI):
     # 清理过期任务结果
     cleanup_expired_results.delay()
     
-    # 设置全局变量enable_groups
-    set_enable_groups([group[0] for group in await group_repo.get_all_active_groups()])
-    # 从数据库中获取所有被禁排成员和对应群 [(group_wxid, member_wxid, is_baned)] 由tuple组成的List类型
-    set_baned_list([(baned[0], baned[1]) for baned in await group_repo.get_all_group_member_baned()])
-    print(f"active的群组: {get_enable_groups()}")
-    print(f"被禁排成员: {get_baned_list()}")
+    # 加载启用的群组和被禁排成员
+    await group_state.load()
+    print(f"active的群组: {group_state.get_enable_groups()}")
+    print(f"被禁排成员: {group_state.get_baned_list()}")
     # 打印所有已注册的命令
     print("已注册的命令:")
     for cmd, info in command_handler.commands.items():
@@ -58,108 +77,159 @@ async def lifespan(app: FastAPI):
     # 在应用关闭时清理资源
     await db_manager.close_all_connections()
     await initialize_tasks.clear_all_tasks()
+    await redis_pool.close_async()
+    await async_http_client.close()
+    http_client.close()
+    callback_recorder.close()
+    tracer.exporter.close()
     print("数据库连接已关闭")
 # 创建FastAPI应用实例
 app = FastAPI(lifespan=lifespan)
 
 
+@app.middleware("http")
+async def count_redis_commands(request: Request, call_next):
+    """
+    为每个请求开始一个追踪（回调入口），统计请求的耗时、redis命令数和往返次数，
+    追踪ID和redis统计写入响应头
+    """
+    start = time.perf_counter()
+    trace_token = tracer.begin(f"http {request.url.path}")
+    token = redis_stats.begin(f"http {request.url.path}")
+    try:
+        response = await call_next(request)
+    finally:
+        counter = redis_stats.end(token)
+        span = tracer.end(trace_token)
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, path=request.url.path)
+        REDIS_SECONDS.observe(counter.seconds, scope=counter.name)
+    response.headers["X-Trace-Id"] = span.trace_id
+    response.headers["X-Redis-Round-Trips"] = str(counter.round_trips)
+    response.headers["X-Redis-Commands"] = str(counter.commands)
+    return response
+
+
+@app.get("/stats/redis")
+async def get_redis_stats():
+    """本进程按作用域汇总的redis命令数和往返次数"""
+    return redis_stats.snapshot()
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus格式的指标"""
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
+
 @app.post("/wechat/callback")
 async def handle_event(event: dict):
     """处理微信回调事件"""
+    callback_recorder.record(event)
     event_type = event.get("type", 0)
     local_wxid = event.get("wxid", "")
-    print(f"完整数据: {json.dumps(event, ensure_ascii=False, indent=4)}")
+    # 完整回调数据只在运行时打开调试输出时记录（见 common.log），序列化在日志线程中进行
+    if payload_logger.isEnabledFor(logging.DEBUG):
+        payload_logger.debug("完整数据", extra={"payload": event})
     data = event.get("data", {})
     msg_content = data.get("msg", "")
     group_wxid = data.get("fromWxid", "")
-    print(f"group_wxid: {group_wxid}")
     # 处理消息事件
     # 文本消息
     if local_wxid == data.get("finalFromWxid", ""):
         return
-    if event_type == "recvMsg" and msg_content == "ping" and group_wxid not in enable_groups:
-        print(f"{group_wxid}收到ping，激活群机器人")
+    if event_type == "recvMsg" and msg_content == "ping" and not group_state.is_enabled(group_wxid):
+        logger.info(f"{group_wxid}收到ping，激活群机器人")
         
         await group_repo.create_group(group_wxid, is_active=True)
         await initialize_tasks.load_from_database(groups_wxid=group_wxid)
-        add_enable_group(group_wxid)
+        group_state.enable_group(group_wxid)
         
         await send_message(group_wxid, "pong")
-    # 修复：enable_groups 在 startup_event 中是局部变量，需改为全局
     
     
-    if event_type == "recvMsg" and  (group_wxid in get_enable_groups()): 
+    if event_type == "recvMsg" and  group_state.is_enabled(group_wxid): 
         msg_owner = data.get("finalFromWxid", {})
+        # 在入口处记录到达时间，手速排序以此为准，而不是任务被worker执行的时间
+        arrival_us = ingress_stamper.stamp(data)
         at_user = None
         # 当存在@list的时候先尝试解析@list中的内容
         if data.get("atWxidList", "") :
             at_user = data.get("atWxidList", "")
             msg_content = parse_at_message(msg_content)
 
-        print(f"收到消息: {msg_content}")
-        if msg_content.startswith(("修改昵称", "设置欢迎词", "设置退群词", "设置麦序文档", 
-                                    "设置主持", "查询主持", "查询麦序文档", 
-                                    "设置扣排时间", "设置扣排截止时间", "设置任务截止时间", "设置扣排人数",
-                                    "设置任务", "取", "补", "当前麦序", "查询麦序", "查询当前麦序", "转麦序", 
-                                    "清空固定排", "查询固定排", "添加", "设置手速", "设置任务排",
-                                    "设置报备时间", "设置报备人数", "设置固定手速",
-                                    "设置报备次数", "设置报备回厅词", "设置报备超时提示词",
-                                    "设置麦序作废人数", "本档作废", "上档作废", "下档作废", "换主持", "禁排", "取消禁排",
-                                    "今日麦序", "昨日麦序", "累计任务", "累计过")) or "固定排" in msg_content:
-            print(f"收到命令: {msg_content}")
-            response = await command_handler.handle_command(msg_content, group_wxid, msg_owner=msg_owner, at_user=at_user)
-            print(f"命令响应: {response}")
+        logger.info("收到消息: %s", msg_content, extra=sampled("callback", group=group_wxid, member=msg_owner))
+        # 命令路由（前缀树最长匹配）
+        route = command_handler.match_command(msg_content)
+        if route:
+            redis_stats.label("callback command")
+            tracer.tag(group=group_wxid, command=route.name)
+            COMMANDS.inc(command=route.name)
+            logger.info("收到命令: %s", msg_content, extra={"group": group_wxid, "member": msg_owner})
+            response = await command_handler.handle_command(msg_content, group_wxid, msg_owner=msg_owner, at_user=at_user, route=route)
+            logger.info("命令响应: %s", response, extra={"group": group_wxid})
             return
-        elif msg_content in ["p", "P", "排"] :
-            print(f"收到成员输入p:[{msg_owner}]: {msg_content}")
+        # 成员消息分类（按群组预编译的规则，不访问redis）
+        msg_type = message_classifier.classify(group_wxid, msg_content)
+        redis_stats.label(f"callback {msg_type or 'other'}")
+        tracer.tag(group=group_wxid, member=msg_owner, msg_class=msg_type or "other")
+        CALLBACK_MESSAGES.inc(msg_class=msg_type or "other")
+        if msg_type == MSG_KOUPAI:
+            logger.info("收到成员输入p: %s", msg_content, extra=sampled("callback", group=group_wxid, member=msg_owner))
             member_wxid = at_user[0] if at_user else msg_owner
-            if (group_wxid, member_wxid) not in get_baned_list():
-                add_koupai_member.delay(group_wxid, member_wxid = member_wxid, msg_content=msg_content,)
-            else:
+            if group_state.is_baned(group_wxid, member_wxid):
                 await send_message(group_wxid, f"{get_member_nick(group_wxid, member_wxid)} 已被禁排")
+            elif FAST_PATH_ENABLED:
+                await koupai_fast_path.add_koupai_member(group_wxid, member_wxid, msg_content, arrival_us=arrival_us)
+            else:
+                add_koupai_member.delay(group_wxid, member_wxid = member_wxid, msg_content=msg_content,
+                                        arrival_us=arrival_us)
             return
-        elif msg_content.startswith(("bb","BB","Bb", "bB", "报备")):
-            print(f"收到成员输入报备: {msg_content}")
+        elif msg_type == MSG_BB:
+            logger.info("收到成员输入报备: %s", msg_content, extra=sampled("callback", group=group_wxid, member=msg_owner))
             add_bb_member.delay(group_wxid, member_wxid = msg_owner, msg_content=msg_content)
             return
-        elif msg_content == "回":
-            print(f"收到成员输入回厅词: {msg_content}")
+        elif msg_type == MSG_BACK:
+            logger.info("收到成员输入回厅词: %s", msg_content, extra=sampled("callback", group=group_wxid, member=msg_owner))
             delete_bb_member.delay(group_wxid, member_wxid = msg_owner)
             return
-        elif msg_content in get_renwu_list(redis_conn, group_wxid) or msg_content.startswith(("买8", "买9")):
-            print(f"收到成员输入对应任务: {msg_content}")
+        elif msg_type in (MSG_RENWU, MSG_MAI89):
+            logger.info("收到成员输入对应任务: %s", msg_content, extra=sampled("callback", group=group_wxid, member=msg_owner))
             member_wxid = at_user[0] if at_user else msg_owner
-            if (group_wxid, member_wxid) in get_baned_list():
+            if group_state.is_baned(group_wxid, member_wxid):
                 await send_message(group_wxid, f"{get_member_nick(group_wxid, member_wxid)} 已被禁排")
                 return
-            if msg_content.startswith(("买8", "买9")):
-                add_mai89_member.delay(group_wxid, member_wxid = member_wxid, msg_content=msg_content)
+            if FAST_PATH_ENABLED:
+                if msg_type == MSG_MAI89:
+                    await koupai_fast_path.add_mai89_member(group_wxid, member_wxid, msg_content, arrival_us=arrival_us)
+                else:
+                    await koupai_fast_path.update_koupai_member(group_wxid, member_wxid, msg_content, arrival_us=arrival_us)
+            elif msg_type == MSG_MAI89:
+                add_mai89_member.delay(group_wxid, member_wxid = member_wxid, msg_content=msg_content,
+                                       arrival_us=arrival_us)
             else:
-                update_koupai_member.delay(group_wxid, member_wxid = member_wxid, msg_content=msg_content)
+                update_koupai_member.delay(group_wxid, member_wxid = member_wxid, msg_content=msg_content,
+                                           arrival_us=arrival_us)
             return
-        elif msg_content == "带走":
-            print(f"收到成员输入带走: {msg_content}")
+        elif msg_type == MSG_DAIZOU:
+            logger.info("收到成员输入带走: %s", msg_content, extra=sampled("callback", group=group_wxid, member=msg_owner))
             member_wxid = at_user[0] if at_user else msg_owner
-            if (group_wxid, member_wxid) in get_baned_list():
+            if group_state.is_baned(group_wxid, member_wxid):
                 await send_message(group_wxid, f"{get_member_nick(group_wxid, member_wxid)} 已被禁排")
                 return
-            add_daizou_member.delay(group_wxid, member_wxid = member_wxid)
+            if FAST_PATH_ENABLED:
+                await koupai_fast_path.add_daizou_member(group_wxid, member_wxid)
+            else:
+                add_daizou_member.delay(group_wxid, member_wxid = member_wxid)
             return
             
     # 群成员进退群事件
     elif event_type == "groupMemberChanges":
-        print(f"群成员变化: {msg_content}")
+        logger.info("群成员变化: %s", msg_content, extra={"group": group_wxid})
+        # 成员进退群后昵称可能变化，失效该群的昵称缓存
+        nick_cache.invalidate(group_wxid)
         response = await command_handler.handle_event(data.get("eventType"), group_wxid)
-        print(f"事件响应: {response}")
+        logger.info("事件响应: %s", response, extra={"group": group_wxid})
     return {"status": "success"}
-def add_baned_member(group_wxid: str, member_wxid: str):
-    """为全局变量baned_list添加禁排成员，可供其他文件内调用"""
-    global baned_list
-    baned_list.append((group_wxid, member_wxid))
-def remove_baned_member(group_wxid: str, member_wxid: str):
-    """从全局变量baned_list移除禁排成员，可供其他文件内调用"""
-    global baned_list
-    baned_list.remove((group_wxid, member_wxid))
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app='app:app', host="127.0.0.1", port=989, reload=True, reload_excludes=["test_tasks2.py"])
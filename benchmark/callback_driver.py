@@ -0,0 +1,145 @@
+"""
+回调压测驱动：按指定速率向机器人的 /wechat/callback 发送模拟的微信回调，统计吞吐量和响应耗时
+
+示例（在项目根目录，机器人已启动并已激活群组）:
+    python -m benchmark.callback_driver --groups 20 --members 50 --msg p --rate 500 --count 5000
+"""
+import argparse
+import asyncio
+import math
+import time
+import aiohttp
+
+DEFAULT_CALLBACK_URL = "http://127.0.0.1:989/wechat/callback"
+BOT_WXID = "wxid_benchbot"
+
+
+def group_wxid_of(index: int) -> str:
+    """压测群组的wxid"""
+    return f"bench{index:05d}@chatroom"
+
+
+def member_wxid_of(group_index: int, index: int) -> str:
+    """压测成员的wxid"""
+    return f"wxid_bench_{group_index:05d}_{index:04d}"
+
+
+def make_callback(group_wxid: str, member_wxid: str, msg: str, at_list: list = None,
+                  timestamp_ms: int = None, event_type: str = "recvMsg") -> dict:
+    """生成一条千寻回调事件（字段与 app.handle_event 读取的一致）"""
+    data = {
+        "fromWxid": group_wxid,
+        "finalFromWxid": member_wxid,
+        "msg": msg,
+        "fromType": 2,
+        "msgType": 1,
+        "timeStamp": str(timestamp_ms if timestamp_ms is not None else int(time.time() * 1000)),
+    }
+    if at_list:
+        data["atWxidList"] = at_list
+    return {"type": event_type, "wxid": BOT_WXID, "data": data}
+
+
+def percentile(values: list, p: float) -> float:
+    """百分位数（最近秩），values 为空时返回0"""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: list, errors: int = 0, elapsed: float = 0) -> dict:
+    """汇总耗时（秒）为毫秒统计"""
+    total = len(latencies) + errors
+    return {
+        "count": total,
+        "errors": errors,
+        "throughput": round(total / elapsed, 1) if elapsed else 0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p90_ms": round(percentile(latencies, 90) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else 0,
+    }
+
+
+class CallbackDriver:
+    """按速率发送回调事件，同时在途的请求数不超过 concurrency"""
+
+    def __init__(self, url: str = DEFAULT_CALLBACK_URL, concurrency: int = 64):
+        self.url = url
+        self.concurrency = concurrency
+        self.latencies = []
+        self.errors = 0
+        # 每个事件发出的时间 (发送时间戳, 事件)
+        self.sent = []
+
+    async def post(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, event: dict):
+        async with semaphore:
+            start = time.perf_counter()
+            self.sent.append((time.time(), event))
+            try:
+                async with session.post(self.url, json=event) as response:
+                    await response.read()
+                    if response.status >= 400:
+                        self.errors += 1
+                        return
+            except aiohttp.ClientError:
+                self.errors += 1
+                return
+            self.latencies.append(time.perf_counter() - start)
+
+    async def run(self, events, rate: float = 0) -> dict:
+        """
+        发送事件
+        events: 事件列表，或 (相对开始的秒数, 事件) 列表（按时间回放）
+        rate: 每秒发送的事件数，0为不限速（按时间回放时忽略）
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=60)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            tasks = []
+            start = time.perf_counter()
+            for i, item in enumerate(events):
+                if isinstance(item, tuple):
+                    offset, event = item
+                else:
+                    offset, event = (i / rate if rate > 0 else 0), item
+                wait = start + offset - time.perf_counter()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                tasks.append(asyncio.create_task(self.post(session, semaphore, event)))
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - start
+        return summarize(self.latencies, self.errors, elapsed)
+
+
+def build_events(groups: int, members: int, msg: str, count: int) -> list:
+    """生成count条事件，轮流发给每个群组的每个成员"""
+    events = []
+    for i in range(count):
+        group_index = i % groups
+        member_index = (i // groups) % members
+        events.append(make_callback(group_wxid_of(group_index), member_wxid_of(group_index, member_index), msg))
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回调压测驱动")
+    parser.add_argument("--url", default=DEFAULT_CALLBACK_URL)
+    parser.add_argument("--groups", type=int, default=10)
+    parser.add_argument("--members", type=int, default=50)
+    parser.add_argument("--msg", default="p", help="成员发送的消息内容")
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=0, help="每秒发送的事件数，0为不限速")
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    driver = CallbackDriver(args.url, args.concurrency)
+    result = asyncio.run(driver.run(build_events(args.groups, args.members, args.msg, args.count), args.rate))
+    for name, value in result.items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+模拟一整天的定时调度，几秒内跑完24小时
+使用模拟时钟（common.clock）逐分钟推进，为数百个群组生成全天主持和扣排时间，统计每分钟调度的耗时和工作量：
+- 默认只运行调度本身：领取到期的定时事件、报备超时定时器，统计每分钟的耗时、事件数量和redis命令数
+- --execute 时每分钟以eager模式运行真实的 scheduled_task 和 poll_bb_timers，事件对应的任务在本进程内同步执行
+  （会发送消息，请将 QIANXUN_API_URL 指向 benchmark.mock_qianxun；0点会从数据库重新初始化任务）
+
+注意：模拟器会修改redis中的定时事件索引，请使用单独的redis实例运行
+示例（在项目根目录）:
+    python -m benchmark.day_simulator --groups 300
+"""
+import argparse
+import json
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from cache.redis_pool import get_redis_connection
+from common.clock import clock, SimulatedClock
+from celery_tasks.scheduler_index import rebuild_group_events, remove_group_events, claim_due_events, EVENT_GROUPS_KEY
+from celery_tasks.timer_wheel import bb_timers
+from benchmark.callback_driver import percentile
+
+SIM_GROUP_PREFIX = "sim"
+RENWU_DESC = "0.3<0.5<1.0<1.5<2.0<3.0<5.0<10.0"
+
+
+def sim_group_wxid(index: int) -> str:
+    return f"{SIM_GROUP_PREFIX}{index:05d}@chatroom"
+
+
+def seed_groups(redis_conn, groups: list, now: datetime, bb_per_hour: int = 0):
+    """
+    写入模拟群组的配置：全天每小时一个主持场次，扣排时间按群组错开，
+    并按需为每个群组每小时添加报备超时定时器
+    """
+    for i, group_wxid in enumerate(groups):
+        start_koupai = 40 + i % 10
+        redis_conn.hset(f"groups_config:{group_wxid}", mapping={
+            "group_wxid": group_wxid, "start_koupai": start_koupai, "end_koupai": start_koupai + 8,
+            "end_renwu": start_koupai + 10, "limit_koupai": 8, "verify_mode": "", "maixu_desc": "",
+            "renwu_desc": RENWU_DESC, "fixed_p_num": 0, "fixed_renwu_desc": "",
+        })
+        pipe = redis_conn.pipeline(transaction=False)
+        for hour in range(24):
+            pipe.hset(f"tasks:hosts_tasks_config:{group_wxid}:{hour}", mapping={
+                "group_wxid": group_wxid, "start_hour": hour, "host_desc": f"模拟{hour}",
+                "stage": "start", "start_schedule": hour, "end_schedule": hour + 1, "fixed_hosts": "[]",
+            })
+        pipe.sadd("groups_config:koupai_groups", group_wxid)
+        pipe.execute()
+        rebuild_group_events(redis_conn, group_wxid, now)
+        for n in range(bb_per_hour * 24):
+            hour, minute = n // bb_per_hour, (i + n * 7) % 60
+            due = now + timedelta(hours=hour, minutes=minute)
+            bb_timers.schedule(redis_conn, f"history:bb:sim:{group_wxid}:{hour}:{n}", due.timestamp())
+
+
+def clear_groups(redis_conn, groups: list):
+    """清理模拟群组"""
+    for group_wxid in groups:
+        remove_group_events(redis_conn, group_wxid)
+        redis_conn.delete(f"groups_config:{group_wxid}", *[f"tasks:hosts_tasks_config:{group_wxid}:{hour}" for hour in range(24)])
+        redis_conn.srem("groups_config:koupai_groups", group_wxid)
+    for key in redis_conn.zrangebyscore(bb_timers.key, "-inf", "+inf"):
+        if key.startswith("history:bb:sim:"):
+            redis_conn.zrem(bb_timers.key, key)
+
+
+def total_commands(redis_conn) -> int:
+    """redis自启动以来执行的命令总数"""
+    return sum(value["calls"] for value in redis_conn.info("commandstats").values())
+
+
+def run_tick(redis_conn, now: datetime, execute: bool, events: Counter) -> int:
+    """执行一分钟的调度，返回到期的报备定时器数量"""
+    if execute:
+        from celery_tasks.schedule_tasks import scheduled_task, poll_bb_timers
+        scheduled_task.run()
+        poll_bb_timers.run()
+        return 0
+    for action, *_ in claim_due_events(redis_conn, now):
+        events[action] += 1
+    timers = 0
+    while True:
+        keys = bb_timers.claim_due(redis_conn, 500, 60, now.timestamp())
+        bb_timers.ack(redis_conn, keys)
+        timers += len(keys)
+        if len(keys) < 500:
+            return timers
+
+
+def simulate(args) -> dict:
+    redis_conn = get_redis_connection(0)
+    existing = [group for group in redis_conn.smembers(EVENT_GROUPS_KEY) if not group.startswith(SIM_GROUP_PREFIX)]
+    if existing and not args.force:
+        raise RuntimeError(f"redis中已有 {len(existing)} 个真实群组的定时事件，请使用单独的redis实例，或使用 --force")
+    if args.execute:
+        from celery_app import celery_app
+        celery_app.conf.task_always_eager = True
+
+    start = datetime.now().replace(hour=args.start_hour, minute=0, second=0, microsecond=0)
+    sim_clock = SimulatedClock(start)
+    groups = [sim_group_wxid(i) for i in range(args.groups)]
+    events = Counter()
+    tick_costs = []
+    timers = 0
+    with clock.use(sim_clock):
+        seed_start = time.perf_counter()
+        seed_groups(redis_conn, groups, start, args.bb_per_hour)
+        seed_cost = time.perf_counter() - seed_start
+        commands_before = total_commands(redis_conn)
+        for minute in range(args.hours * 60):
+            # 定时任务在每分钟的第2秒执行
+            now = start + timedelta(minutes=minute, seconds=2)
+            sim_clock.set(now)
+            tick_start = time.perf_counter()
+            timers += run_tick(redis_conn, now, args.execute, events)
+            tick_costs.append(time.perf_counter() - tick_start)
+        commands = total_commands(redis_conn) - commands_before
+    if not args.keep:
+        clear_groups(redis_conn, groups)
+
+    ticks = len(tick_costs)
+    return {
+        "groups": args.groups,
+        "ticks": ticks,
+        "seed_seconds": round(seed_cost, 3),
+        "total_seconds": round(sum(tick_costs), 3),
+        "tick_p50_ms": round(percentile(tick_costs, 50) * 1000, 3),
+        "tick_p99_ms": round(percentile(tick_costs, 99) * 1000, 3),
+        "tick_max_ms": round(max(tick_costs) * 1000, 3) if tick_costs else 0,
+        "events": dict(events),
+        "bb_timers": timers,
+        "redis_commands": commands,
+        "redis_commands_per_tick": round(commands / ticks, 2) if ticks else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟一整天的定时调度")
+    parser.add_argument("--groups", type=int, default=300)
+    parser.add_argument("--hours", type=int, default=24)
+    parser.add_argument("--start-hour", type=int, default=0)
+    parser.add_argument("--bb-per-hour", type=int, default=0, help="每个群组每小时的报备超时数量")
+    parser.add_argument("--execute", action="store_true", help="以eager模式运行真实的定时任务")
+    parser.add_argument("--keep", action="store_true", help="结束后保留模拟群组")
+    parser.add_argument("--force", action="store_true", help="redis中有真实群组时仍然运行")
+    parser.add_argument("--output", default="", help="结果写入JSON文件")
+    args = parser.parse_args()
+
+    result = simulate(args)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+开始扣排高峰的端到端压测
+模拟N个群组、每个群组M个成员：触发开始扣排后，按设定速率发送 p、扣任务、买8/买9，统计
+- 回调响应耗时 p50/p99
+- 回调到成员出现在扣排队列中的耗时 p50/p99（轮询成员索引）
+- 手速顺序公平性错误率（进入队列的成员不是最早发送的成员，或队列顺序与发送顺序不一致）
+- 每个操作的redis命令数（INFO commandstats 差值，包含celery broker的命令，已扣除轮询本身的命令）
+
+需要已启动的机器人（app.py）、celery worker、redis，以及千寻接口（可使用 benchmark.mock_qianxun）
+示例（在项目根目录）:
+    python -m benchmark.load_burst --groups 50 --members 30 --rate 800
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime
+import aiohttp
+from cache.redis_pool import get_async_redis_connection
+from celery_tasks.tasks_crud import get_task_key, get_task_index_key
+from benchmark.callback_driver import (DEFAULT_CALLBACK_URL, CallbackDriver, make_callback,
+                                       group_wxid_of, member_wxid_of, summarize)
+
+RENWU_DESC = "0.3<0.5<1.0<1.5<2.0<3.0<5.0<10.0"
+KOUPAI_TYPE_SPEED = "手速"
+
+
+def parse_index_member(member: str) -> tuple:
+    """解析成员索引中的成员字符串，返回 (member_wxid, 扣排类型)"""
+    parts = member.split(":")
+    return parts[0], parts[1]
+
+
+def setup_commands(limit: int, minute: int) -> list:
+    """
+    压测群组的初始化命令：激活、扣排人数、任务、截止时间，最后设置开始时间为当前分钟并设置全天主持，
+    设置主持后立即执行的定时任务会触发开始扣排事件
+    """
+    return [
+        "ping",
+        f"设置扣排人数{limit}",
+        f"设置任务{RENWU_DESC}",
+        "设置扣排截止时间59",
+        f"设置扣排时间{minute}",
+        "设置主持\r0-24压测",
+    ]
+
+
+class QueueObserver:
+    """
+    轮询所有压测群组的成员索引，记录每个成员第一次以期望的扣排类型出现在队列中的时间
+    """
+
+    def __init__(self, redis_conn, groups: list, hour: int, interval: float = 0.005):
+        self.redis_conn = redis_conn
+        self.index_keys = {group_wxid: get_task_index_key(get_task_key(group_wxid, hour)) for group_wxid in groups}
+        self.interval = interval
+        # (group_wxid, member_wxid) -> (发送时间, 期望的扣排类型)
+        self.expected = {}
+        self.latencies = []
+        self.commands = 0
+        self.last_change = time.time()
+        self._stopped = False
+
+    def expect(self, group_wxid: str, member_wxid: str, sent_at: float, koupai_type: str):
+        self.expected[(group_wxid, member_wxid)] = (sent_at, koupai_type)
+
+    async def run(self):
+        while not self._stopped:
+            groups = list(self.index_keys)
+            async with self.redis_conn.pipeline(transaction=False) as pipe:
+                for group_wxid in groups:
+                    pipe.hvals(self.index_keys[group_wxid])
+                results = await pipe.execute()
+            self.commands += len(groups)
+            now = time.time()
+            for group_wxid, members in zip(groups, results):
+                for member in members:
+                    member_wxid, koupai_type = parse_index_member(member)
+                    expected = self.expected.get((group_wxid, member_wxid))
+                    if expected and expected[1] == koupai_type:
+                        del self.expected[(group_wxid, member_wxid)]
+                        self.latencies.append(now - expected[0])
+                        self.last_change = now
+            await asyncio.sleep(self.interval)
+
+    def stop(self):
+        self._stopped = True
+
+
+async def total_commands(redis_conn) -> int:
+    """redis自启动以来执行的命令总数"""
+    stats = await redis_conn.info("commandstats")
+    return sum(value["calls"] for value in stats.values())
+
+
+async def setup_groups(url: str, groups: list, limit: int):
+    """通过回调发送初始化命令（每个群组按顺序，群组之间并发）"""
+    minute = datetime.now().minute
+    if minute >= 58:
+        print("当前分钟接近整点，开始扣排事件可能在压测过程中截止")
+
+    async def setup_group(session, group_wxid):
+        for command in setup_commands(limit, minute):
+            event = make_callback(group_wxid, "wxid_bench_admin", command)
+            async with session.post(url, json=event) as response:
+                await response.read()
+
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(setup_group(session, group_wxid) for group_wxid in groups))
+
+
+async def wait_started(redis_conn, groups: list, hour: int, timeout: float) -> bool:
+    """等待所有群组开始扣排"""
+    sessions = [f"{group_wxid}:{(hour+1)%24}" for group_wxid in groups]
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        started = await redis_conn.smismember("tasks:launch_tasks:koupai_tasks_list", sessions)
+        if all(started):
+            return True
+        await asyncio.sleep(0.2)
+    return False
+
+
+async def send_phase(driver: CallbackDriver, observer: QueueObserver, messages: list, rate: float) -> dict:
+    """
+    按速率发送一批消息
+    messages: [(group_wxid, member_wxid, 消息内容, 期望的扣排类型)]
+    """
+    start = time.time()
+    events = []
+    for i, (group_wxid, member_wxid, msg, koupai_type) in enumerate(messages):
+        offset = i / rate if rate > 0 else 0
+        # 回调中的消息时间戳使用计划发送时间，保证与发送顺序一致
+        events.append((offset, make_callback(group_wxid, member_wxid, msg, timestamp_ms=int((start + offset) * 1000))))
+        observer.expect(group_wxid, member_wxid, start + offset, koupai_type)
+    result = await driver.run(events)
+    observer.last_change = time.time()
+    return result
+
+
+async def wait_settled(observer: QueueObserver, settle: float, timeout: float):
+    """等待队列不再变化"""
+    deadline = time.time() + timeout
+    while observer.expected and time.time() < deadline and time.time() - observer.last_change < settle:
+        await asyncio.sleep(0.05)
+
+
+async def check_fairness(redis_conn, groups: list, hour: int, send_order: dict, limit: int) -> dict:
+    """
+    检查手速排的公平性
+    send_order: {group_wxid: [按发送顺序的member_wxid]}
+    """
+    admitted = misplaced = inversions = 0
+    for group_wxid in groups:
+        queue = await redis_conn.zrevrange(get_task_key(group_wxid, hour), 0, -1)
+        speed = [parse_index_member(member)[0] for member in queue if parse_index_member(member)[1] == KOUPAI_TYPE_SPEED]
+        rank = {member_wxid: i for i, member_wxid in enumerate(send_order[group_wxid])}
+        earliest = set(send_order[group_wxid][:limit])
+        admitted += len(speed)
+        misplaced += sum(1 for member_wxid in speed if member_wxid not in earliest)
+        inversions += sum(1 for a, b in zip(speed, speed[1:]) if rank.get(a, 0) > rank.get(b, 0))
+    return {
+        "admitted": admitted,
+        "not_earliest": misplaced,
+        "order_inversions": inversions,
+        "fairness_error_rate": round((misplaced + inversions) / admitted, 4) if admitted else 0,
+    }
+
+
+async def run_benchmark(args) -> dict:
+    redis_conn = get_async_redis_connection()
+    groups = [group_wxid_of(i) for i in range(args.groups)]
+    members = {group_wxid: [member_wxid_of(g, i) for i in range(args.members)] for g, group_wxid in enumerate(groups)}
+    hour = (datetime.now().hour + 1) % 24
+    if not args.skip_setup:
+        await setup_groups(args.url, groups, args.limit)
+    if not await wait_started(redis_conn, groups, datetime.now().hour, args.timeout):
+        raise RuntimeError("等待开始扣排超时，请检查机器人和celery worker是否正常运行")
+
+    observer = QueueObserver(redis_conn, groups, hour)
+    poller = asyncio.create_task(observer.run())
+    commands_before = await total_commands(redis_conn)
+    result = {}
+
+    # 手速阶段：每个群组的成员按随机顺序发送p，群组之间交错
+    send_order = {group_wxid: random.sample(group_members, len(group_members)) for group_wxid, group_members in members.items()}
+    p_messages = [(group_wxid, send_order[group_wxid][i], "p", KOUPAI_TYPE_SPEED)
+                  for i in range(args.members) for group_wxid in groups]
+    result["p_callback"] = await send_phase(CallbackDriver(args.url, args.concurrency), observer, p_messages, args.rate)
+    await wait_settled(observer, args.settle, args.timeout)
+    result["p_queue"] = summarize(observer.latencies)
+    result["p_queue"]["not_observed"] = len(observer.expected)
+    result["fairness"] = await check_fairness(redis_conn, groups, hour, send_order, args.limit)
+    p_actions = len(p_messages)
+
+    # 任务阶段：队列中的成员扣任务，未进入队列的部分成员买8/买9
+    observer.latencies, observer.expected = [], {}
+    renwu = RENWU_DESC.split("<")
+    bid_messages = []
+    for group_wxid in groups:
+        queued = {parse_index_member(member)[0] for member in await redis_conn.hvals(observer.index_keys[group_wxid])}
+        for member_wxid in send_order[group_wxid]:
+            item = random.choice(renwu)
+            if member_wxid in queued:
+                bid_messages.append((group_wxid, member_wxid, item, item))
+            elif random.random() < args.mai89_ratio:
+                mai_type = random.choice(("8", "9"))
+                bid_messages.append((group_wxid, member_wxid, f"买{mai_type}{item}", f"p{mai_type} {item}"))
+    random.shuffle(bid_messages)
+    result["bid_callback"] = await send_phase(CallbackDriver(args.url, args.concurrency), observer, bid_messages, args.rate)
+    await wait_settled(observer, args.settle, args.timeout)
+    result["bid_queue"] = summarize(observer.latencies)
+    # 买8/买9可能被后来的成员挤出，未观察到的不一定是错误
+    result["bid_queue"]["not_observed"] = len(observer.expected)
+
+    observer.stop()
+    await poller
+    commands = await total_commands(redis_conn) - commands_before - observer.commands
+    actions = p_actions + len(bid_messages)
+    result["redis"] = {"commands": commands, "actions": actions,
+                       "commands_per_action": round(commands / actions, 2) if actions else 0}
+    await redis_conn.aclose()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="开始扣排高峰的端到端压测")
+    parser.add_argument("--url", default=DEFAULT_CALLBACK_URL)
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--members", type=int, default=30)
+    parser.add_argument("--limit", type=int, default=8, help="扣排人数（0-10）")
+    parser.add_argument("--rate", type=float, default=500, help="每秒发送的回调数，0为不限速")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--mai89-ratio", type=float, default=0.3, help="未进入队列的成员中买8/买9的比例")
+    parser.add_argument("--settle", type=float, default=3.0, help="队列多少秒不变化视为处理完成")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--skip-setup", action="store_true", help="群组已初始化并已开始扣排时跳过初始化")
+    parser.add_argument("--output", default="", help="结果写入JSON文件")
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(args))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+热点纯函数的微基准测试
+使用接近真实规模的数据（100项任务列表、24个场次、每个场次50人的扣排队列），
+测量每次调用的耗时，并与保存的基准（benchmark/baselines.json）比较，超过阈值时视为性能退化
+
+示例（在项目根目录）:
+    python -m benchmark.micro_bench              # 与基准比较，有退化时返回非0
+    python -m benchmark.micro_bench --save       # 保存当前结果为新的基准
+    python -m benchmark.micro_bench --filter renwu
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import timeit
+from celery_tasks.tasks_crud import (parse_task_members, generate_task_members, get_renwu_dict,
+                                     parse_renwu_list, accumulate_member_tasks)
+from command.rules.hostPhrase_rules import parse_time_slots, parse_at_message
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+RENWU_ITEMS = 100
+HOURS = 24
+MEMBERS = 50
+
+
+def make_renwu_desc(items: int = RENWU_ITEMS) -> str:
+    """生成任务描述 0.1<0.2<...，中间穿插自定义任务"""
+    rules = [f"{(i + 1) / 10:.1f}" for i in range(items - 2)]
+    rules.insert(items // 2, "新人置顶")
+    rules.append("魅力置顶")
+    return "<".join(rules)
+
+
+def make_queue(hour: int, renwu: list, members: int = MEMBERS) -> list:
+    """生成一个场次的扣排队列 [(成员字符串, 分数)]"""
+    rng = random.Random(hour)
+    queue = []
+    for i in range(members):
+        koupai_type = rng.choice(("手速", "补", rng.choice(renwu), f"p8 {rng.choice(renwu)}", f"p9 {rng.choice(renwu)}"))
+        state = rng.choice(("", "", "", "带走", "过", "作废"))
+        member = f"wxid_member{i:04d}:{koupai_type}" + (f":{state}" if state else "")
+        queue.append((member, float(rng.randrange(1 << 40))))
+    return queue
+
+
+def build_fixtures() -> dict:
+    renwu_desc = make_renwu_desc()
+    renwu = parse_renwu_list(renwu_desc)
+    queues = [make_queue(hour, renwu) for hour in range(HOURS)]
+    day_members = [member for hour, queue in enumerate(queues) for member in parse_task_members(queue, hour, None, "bench@chatroom")]
+    return {
+        "renwu_desc": renwu_desc,
+        "renwu": renwu,
+        "queue": queues[0],
+        "day_members": day_members,
+        "time_slots": [f"{hour}-{hour + 1}主持{hour}" for hour in range(HOURS)],
+        "at_message": "@成员昵称\\u2005买8 1.5",
+        "plain_message": "买8 1.5",
+    }
+
+
+def build_cases(fixtures: dict) -> dict:
+    """基准用例 {名称: 无参函数}"""
+    return {
+        "parse_task_members[50]": lambda: parse_task_members(fixtures["queue"], 1, None, "bench@chatroom"),
+        "generate_task_members[24x50]": lambda: generate_task_members(fixtures["day_members"]),
+        "parse_renwu_list[100]": lambda: parse_renwu_list(fixtures["renwu_desc"]),
+        "get_renwu_dict[100]": lambda: get_renwu_dict(fixtures["renwu"]),
+        "accumulate_member_tasks[24x50]": lambda: accumulate_member_tasks({}, fixtures["day_members"]),
+        "parse_time_slots[24]": lambda: parse_time_slots(fixtures["time_slots"]),
+        "parse_at_message[at]": lambda: parse_at_message(fixtures["at_message"]),
+        "parse_at_message[plain]": lambda: parse_at_message(fixtures["plain_message"]),
+    }
+
+
+def measure(func, min_time: float = 0.2, repeat: int = 5) -> float:
+    """每次调用的耗时（微秒），取多轮中的最小值；函数中的print输出被丢弃"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        timer = timeit.Timer(func)
+        number, _ = timer.autorange()
+        number = max(1, int(number * min_time / 0.2))
+        return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def load_baselines(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="热点纯函数的微基准测试")
+    parser.add_argument("--save", action="store_true", help="保存结果为新的基准")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.2, help="比基准慢多少（比例）视为退化")
+    parser.add_argument("--filter", default="", help="只运行名称包含该字符串的用例")
+    parser.add_argument("--min-time", type=float, default=0.2, help="每轮的最短测量时间（秒）")
+    args = parser.parse_args()
+
+    cases = {name: func for name, func in build_cases(build_fixtures()).items() if args.filter in name}
+    baselines = load_baselines(args.baseline)
+    results = {}
+    regressions = []
+    print(f"{'用例':<34}{'耗时(us)':>12}{'基准(us)':>12}{'变化':>10}")
+    for name, func in cases.items():
+        us = measure(func, args.min_time)
+        results[name] = round(us, 3)
+        baseline = baselines.get("results", {}).get(name)
+        change = f"{us / baseline - 1:+.1%}" if baseline else "-"
+        flag = ""
+        if baseline and us > baseline * (1 + args.threshold):
+            regressions.append(name)
+            flag = "  退化"
+        print(f"{name:<34}{us:>12.3f}{baseline or '-':>12}{change:>10}{flag}")
+
+    if args.save:
+        baselines = {"python": platform.python_version(), "machine": platform.machine(),
+                     "results": {**baselines.get("results", {}), **results}}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, ensure_ascii=False, indent=2)
+        print(f"已保存基准到 {args.baseline}")
+    elif regressions:
+        print(f"性能退化: {', '.join(regressions)}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+千寻机器人HTTP接口的本地模拟服务，用于压测
+实现 sendText、getMemberNick、editSelfMemberNick、sendFile（以及可选的群成员列表接口），
+可配置接口延迟、错误率和昵称数据，记录收到的消息供压测脚本统计
+
+启动（在项目根目录）:
+    python -m benchmark.mock_qianxun --port 28888 --latency-ms 20 --jitter-ms 10 --error-rate 0.01
+机器人侧将 QIANXUN_API_URL 指向 http://127.0.0.1:28888/wechat/httpapi（默认值即为该地址）
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter, deque
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+class MockQianxun:
+    """模拟接口的状态：配置、昵称数据、请求计数和最近的消息"""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0,
+                 nicks: dict = None, history: int = 100000, member_list_type: str = "getGroupMemberList"):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        # {group_wxid: {member_wxid: 昵称}}，不在其中的成员使用生成的昵称
+        self.nicks = nicks or {}
+        self.member_list_type = member_list_type
+        self.counts = Counter()
+        self.errors = Counter()
+        # 最近收到的消息 (接收时间戳, 请求类型, wxid, data)
+        self.messages = deque(maxlen=history)
+        self.group_nick = "机器人"
+
+    def reset(self):
+        self.counts.clear()
+        self.errors.clear()
+        self.messages.clear()
+
+    def get_nick(self, group_wxid: str, member_wxid: str) -> str:
+        return self.nicks.get(group_wxid, {}).get(member_wxid) or f"昵称_{member_wxid[-6:]}"
+
+    async def delay(self):
+        """模拟接口耗时"""
+        latency = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if latency > 0:
+            await asyncio.sleep(latency / 1000)
+
+    async def handle(self, request_type: str, data: dict):
+        """处理一次接口请求，返回 (状态码, 响应内容)"""
+        await self.delay()
+        self.counts[request_type] += 1
+        if random.random() < self.error_rate:
+            self.errors[request_type] += 1
+            return 502, {"code": 502, "msg": "mock error"}
+        wxid = data.get("wxid", "")
+        self.messages.append((time.time(), request_type, wxid, data))
+        if request_type == "getMemberNick":
+            return 200, {"code": 200, "result": {"groupNick": self.get_nick(wxid, data.get("objWxid", ""))}}
+        if request_type == self.member_list_type:
+            members = self.nicks.get(wxid, {})
+            return 200, {"code": 200, "result": [{"wxid": member, "groupNick": nick} for member, nick in members.items()]}
+        if request_type == "editSelfMemberNick":
+            self.group_nick = data.get("nick", self.group_nick)
+        if request_type in ("sendText", "sendFile", "editSelfMemberNick"):
+            return 200, {"code": 200, "msg": "操作成功", "result": {}}
+        return 200, {"code": 404, "msg": f"不支持的请求类型 {request_type}"}
+
+    def stats(self) -> dict:
+        return {"counts": dict(self.counts), "errors": dict(self.errors), "messages": len(self.messages)}
+
+
+def create_app(mock: MockQianxun) -> FastAPI:
+    """创建模拟接口的FastAPI应用"""
+    app = FastAPI()
+
+    @app.post("/wechat/httpapi")
+    async def httpapi(request: Request):
+        payload = json.loads(await request.body())
+        status, body = await mock.handle(payload.get("type", ""), payload.get("data", {}))
+        return JSONResponse(body, status_code=status)
+
+    @app.get("/mock/stats")
+    async def stats():
+        return mock.stats()
+
+    @app.get("/mock/messages")
+    async def messages(since: float = 0, wxid: str = None):
+        """获取收到的消息（可按时间和群组过滤）"""
+        return [{"ts": ts, "type": request_type, "wxid": to_wxid, "data": data}
+                for ts, request_type, to_wxid, data in mock.messages
+                if ts >= since and (wxid is None or to_wxid == wxid)]
+
+    @app.post("/mock/reset")
+    async def reset():
+        mock.reset()
+        return {"status": "success"}
+
+    @app.post("/mock/config")
+    async def config(options: dict):
+        """运行中调整延迟和错误率，例如模拟接口重启"""
+        for name in ("latency_ms", "jitter_ms", "error_rate"):
+            if name in options:
+                setattr(mock, name, float(options[name]))
+        return {"latency_ms": mock.latency_ms, "jitter_ms": mock.jitter_ms, "error_rate": mock.error_rate}
+
+    return app
+
+
+def load_nicks(path: str) -> dict:
+    """加载昵称数据文件 {group_wxid: {member_wxid: 昵称}}"""
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="千寻接口模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=28888)
+    parser.add_argument("--latency-ms", type=float, default=0, help="接口平均耗时（毫秒）")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="耗时的随机波动（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0, help="返回502的比例（0-1）")
+    parser.add_argument("--nicks", default="", help="昵称数据JSON文件 {group_wxid: {member_wxid: 昵称}}")
+    parser.add_argument("--member-list-type", default="getGroupMemberList", help="群成员列表接口的请求类型")
+    args = parser.parse_args()
+
+    import uvicorn
+    mock = MockQianxun(args.latency_ms, args.jitter_ms, args.error_rate, load_nicks(args.nicks),
+                       member_list_type=args.member_list_type)
+    uvicorn.run(create_app(mock), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
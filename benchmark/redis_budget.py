@@ -0,0 +1,136 @@
+"""
+成员操作的redis往返预算
+在一个压测群组上依次执行快速通道和celery任务（在本进程内同步执行任务函数）的成员操作，
+统计每个操作的redis往返次数和命令数（cache.redis_stats），超过预算时返回非0，
+往返次数的增长会表现为预算失败，而不是高峰时的变慢
+
+快速通道的操作要求为一次读取（pipeline）加一次原子脚本，celery任务的预算为当前的实际值，
+优化后请同步降低预算
+
+注意：会写入压测群组的配置和扣排队列，并且导入celery时会清空broker，请使用单独的redis实例运行；
+结束扣排会发送消息，请将 QIANXUN_API_URL 指向 benchmark.mock_qianxun
+示例（在项目根目录）:
+    python -m benchmark.redis_budget
+"""
+import argparse
+import asyncio
+from cache.redis_pool import get_redis_connection
+from cache.redis_stats import redis_stats, RedisBudgetExceeded
+from cache.redis_scripts import redis_scripts
+from cache.nick_cache import nick_cache
+from common.clock import clock
+from celery_tasks.tasks_crud import get_task_key, get_task_index_key
+from celery_tasks.fast_path import koupai_fast_path
+from celery_tasks.schedule_tasks import (add_koupai_member, update_koupai_member, add_mai89_member,
+                                         add_daizou_member, send_koupai_task_end)
+from benchmark.callback_driver import group_wxid_of, member_wxid_of
+
+RENWU_DESC = "0.3<0.5<1.0<1.5<2.0<3.0<5.0<10.0"
+BUDGET_GROUP_INDEX = 99999
+
+
+def setup_group(redis_conn, group_wxid: str, hour: int, members: list):
+    """写入压测群组的配置、主持配置和成员昵称，并开始扣排和任务阶段"""
+    session = f"{group_wxid}:{(hour+1)%24}"
+    clear_group(redis_conn, group_wxid, hour)
+    redis_conn.hset(f"groups_config:{group_wxid}", mapping={
+        "group_wxid": group_wxid, "start_koupai": 0, "end_koupai": 50, "end_renwu": 55,
+        "limit_koupai": 8, "verify_mode": "", "maixu_desc": "", "renwu_desc": RENWU_DESC,
+        "fixed_p_num": 0, "fixed_renwu_desc": "",
+    })
+    redis_conn.hset(f"tasks:hosts_tasks_config:{group_wxid}:{(hour+1)%24}", mapping={
+        "group_wxid": group_wxid, "start_hour": (hour+1)%24, "host_desc": "预算",
+        "stage": "start", "start_schedule": (hour+1)%24, "end_schedule": (hour+2)%24, "fixed_hosts": "[]",
+    })
+    redis_conn.sadd("tasks:launch_tasks:koupai_tasks_list", session)
+    redis_conn.sadd("tasks:launch_tasks:renwu_tasks_list", session)
+    nick_cache.set_many(group_wxid, {member_wxid: member_wxid[-4:] for member_wxid in members})
+
+
+def clear_group(redis_conn, group_wxid: str, hour: int):
+    session = f"{group_wxid}:{(hour+1)%24}"
+    task_key = get_task_key(group_wxid, (hour+1)%24)
+    redis_conn.delete(f"groups_config:{group_wxid}", f"tasks:hosts_tasks_config:{group_wxid}:{(hour+1)%24}",
+                      task_key, get_task_index_key(task_key))
+    redis_conn.srem("tasks:launch_tasks:koupai_tasks_list", session)
+    redis_conn.srem("tasks:launch_tasks:renwu_tasks_list", session)
+    nick_cache.invalidate(group_wxid)
+
+
+def build_cases(group_wxid: str, members: list, hour: int) -> list:
+    """
+    预算用例 [(名称, 函数, 是否为协程, 往返次数预算)]，按顺序执行（后面的用例依赖前面加入队列的成员）
+    """
+    m = members
+    return [
+        ("fast add p", lambda: koupai_fast_path.add_koupai_member(group_wxid, m[0], "p"), True, 2),
+        ("fast renwu", lambda: koupai_fast_path.update_koupai_member(group_wxid, m[0], "1.0"), True, 2),
+        ("fast mai89", lambda: koupai_fast_path.add_mai89_member(group_wxid, m[1], "买81.0"), True, 2),
+        ("fast daizou", lambda: koupai_fast_path.add_daizou_member(group_wxid, m[0]), True, 2),
+        ("task add p", lambda: add_koupai_member.run(group_wxid, m[2], "p"), False, 6),
+        ("task renwu", lambda: update_koupai_member.run(group_wxid, m[2], "1.0"), False, 5),
+        ("task mai89", lambda: add_mai89_member.run(group_wxid, m[3], "买81.0"), False, 7),
+        ("task daizou", lambda: add_daizou_member.run(group_wxid, m[2]), False, 2),
+        ("task end koupai", lambda: send_koupai_task_end.run(group_wxid, hour, "end_koupai"), False, 4),
+    ]
+
+
+def load_scripts(redis_conn):
+    """预先加载所有脚本，避免第一次调用时的 NOSCRIPT 重试计入用例"""
+    for source in redis_scripts.SOURCES.values():
+        redis_conn.script_load(source)
+
+
+async def run_case(name: str, func, is_async: bool, round_trips: int):
+    """在预算内执行一个用例，返回 (计数, 是否超出预算)"""
+    exceeded = False
+    try:
+        with redis_stats.budget(name, round_trips=round_trips) as counter:
+            if is_async:
+                await func()
+            else:
+                func()
+    except RedisBudgetExceeded as e:
+        print(e)
+        exceeded = True
+    # 快速通道的后台发送与用例共享计数，立即复制结果
+    return counter.as_dict(), exceeded
+
+
+async def run_budgets(args) -> list:
+    redis_conn = get_redis_connection(0)
+    hour = clock.now().hour
+    group_wxid = group_wxid_of(BUDGET_GROUP_INDEX)
+    members = [member_wxid_of(BUDGET_GROUP_INDEX, i) for i in range(4)]
+    setup_group(redis_conn, group_wxid, hour, members)
+    load_scripts(redis_conn)
+    results = []
+    try:
+        for name, func, is_async, round_trips in build_cases(group_wxid, members, hour):
+            if args.filter not in name:
+                continue
+            counter, exceeded = await run_case(name, func, is_async, round_trips)
+            results.append((name, counter, round_trips, exceeded))
+    finally:
+        if not args.keep:
+            clear_group(redis_conn, group_wxid, hour)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="成员操作的redis往返预算")
+    parser.add_argument("--filter", default="", help="只运行名称包含该字符串的用例")
+    parser.add_argument("--keep", action="store_true", help="结束后保留压测群组")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_budgets(args))
+    print(f"{'用例':<20}{'往返':>6}{'预算':>6}{'命令':>6}{'耗时(ms)':>10}")
+    for name, counter, round_trips, exceeded in results:
+        flag = "  超出预算" if exceeded else ""
+        print(f"{name:<20}{counter['round_trips']:>6}{round_trips:>6}{counter['commands']:>6}{counter['seconds'] * 1000:>10.2f}{flag}")
+    if any(exceeded for *_, exceeded in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+回放录制的回调（录制方法：启动机器人时设置 CALLBACK_CAPTURE_PATH）
+按原始时间间隔以指定倍速发送到 /wechat/callback，--speed 0 为不等待、尽快发送。
+消息自带的时间戳会换算为回放时间，手速排序与录制时的先后顺序一致。
+千寻接口可使用 benchmark.mock_qianxun 代替，回放结束后输出模拟接口收到的请求数
+
+示例（在项目根目录）:
+    python -m benchmark.replay captures/peak.jsonl --speed 10
+"""
+import argparse
+import asyncio
+import copy
+import json
+import time
+import requests
+from common.capture import read_capture
+from benchmark.callback_driver import DEFAULT_CALLBACK_URL, CallbackDriver
+
+
+def build_replay(records, speed: float, start: float = None, groups: set = None) -> list:
+    """
+    将录制的 (接收时间戳, 事件) 转换为 (相对开始的秒数, 事件)
+    speed: 倍速，0为全部立即发送
+    groups: 只回放这些群组的事件
+    """
+    start = start or time.time()
+    events = []
+    first = None
+    for ts, event in records:
+        data = event.get("data", {})
+        if groups and data.get("fromWxid") not in groups:
+            continue
+        if first is None:
+            first = ts
+        offset = (ts - first) / speed if speed > 0 else 0
+        event = copy.deepcopy(event)
+        data = event.get("data", {})
+        # 消息时间戳换算到回放时间，保持录制时的相对顺序
+        if str(data.get("timeStamp", "")).isdigit():
+            data["timeStamp"] = str(int((start + (int(data["timeStamp"]) / 1000 - first) / (speed or 1)) * 1000))
+        events.append((offset, event))
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放录制的回调")
+    parser.add_argument("capture", help="录制文件")
+    parser.add_argument("--url", default=DEFAULT_CALLBACK_URL)
+    parser.add_argument("--speed", type=float, default=1, help="回放倍速，0为尽快发送")
+    parser.add_argument("--groups", default="", help="只回放指定群组，逗号分隔")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--mock-url", default="http://127.0.0.1:28888", help="模拟千寻接口地址，为空时不统计")
+    parser.add_argument("--output", default="", help="结果写入JSON文件")
+    args = parser.parse_args()
+
+    groups = set(filter(None, args.groups.split(",")))
+    events = build_replay(read_capture(args.capture), args.speed, groups=groups)
+    print(f"回放 {len(events)} 个事件")
+    mock_url = args.mock_url
+    if mock_url:
+        try:
+            requests.post(f"{mock_url}/mock/reset", timeout=5)
+        except requests.RequestException as e:
+            print(f"模拟千寻接口不可用，不统计接口请求: {e}")
+            mock_url = ""
+    result = {"callback": asyncio.run(CallbackDriver(args.url, args.concurrency).run(events))}
+    if mock_url:
+        result["mock"] = requests.get(f"{mock_url}/mock/stats", timeout=5).json()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
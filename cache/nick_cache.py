@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import OrderedDict
+from cache.redis_pool import get_redis_connection
+from common.config import NICK_CACHE_TTL, NICK_LOCAL_TTL, NICK_LOCAL_SIZE
+
+
+class NickCache:
+    """
+    成员昵称的两级缓存
+    第一级为进程内LRU（有效期短，跨进程的失效最多延迟 NICK_LOCAL_TTL 秒），
+    第二级为每个群组一个redis hash（member_wxid -> 昵称），每个字段单独设置过期时间（HEXPIRE）
+    群成员变化事件时按群组失效
+    """
+
+    KEY_PREFIX = "cache:member_nick"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (group_wxid, member_wxid) -> (昵称, 过期时间)
+        self._local = OrderedDict()
+
+    def _key(self, group_wxid: str) -> str:
+        return f"{self.KEY_PREFIX}:{group_wxid}"
+
+    def _get_local(self, group_wxid: str, member_wxid: str):
+        with self._lock:
+            item = self._local.get((group_wxid, member_wxid))
+            if item is None:
+                return None
+            if item[1] < time.monotonic():
+                del self._local[(group_wxid, member_wxid)]
+                return None
+            self._local.move_to_end((group_wxid, member_wxid))
+            return item[0]
+
+    def _set_local(self, group_wxid: str, member_wxid: str, nick: str):
+        with self._lock:
+            self._local[(group_wxid, member_wxid)] = (nick, time.monotonic() + NICK_LOCAL_TTL)
+            self._local.move_to_end((group_wxid, member_wxid))
+            while len(self._local) > NICK_LOCAL_SIZE:
+                self._local.popitem(last=False)
+
+    def get(self, group_wxid: str, member_wxid: str):
+        """查询缓存中的昵称，不存在时返回None"""
+        nick = self._get_local(group_wxid, member_wxid)
+        if nick is not None:
+            return nick
+        nick = get_redis_connection(0).hget(self._key(group_wxid), member_wxid)
+        if nick is not None:
+            self._set_local(group_wxid, member_wxid, nick)
+        return nick
+
+    def set(self, group_wxid: str, member_wxid: str, nick: str):
+        """写入昵称"""
+        self._set_local(group_wxid, member_wxid, nick)
+        pipe = get_redis_connection(0).pipeline(transaction=False)
+        pipe.hset(self._key(group_wxid), member_wxid, nick)
+        pipe.hexpire(self._key(group_wxid), NICK_CACHE_TTL, member_wxid)
+        pipe.execute()
+
+    def get_many(self, group_wxid: str, members_wxid: list) -> dict:
+        """批量查询缓存中的昵称，只返回命中的成员 {member_wxid: 昵称}"""
+        nicks = {}
+        missing = []
+        for member_wxid in members_wxid:
+            nick = self._get_local(group_wxid, member_wxid)
+            if nick is not None:
+                nicks[member_wxid] = nick
+            else:
+                missing.append(member_wxid)
+        if missing:
+            for member_wxid, nick in zip(missing, get_redis_connection(0).hmget(self._key(group_wxid), missing)):
+                if nick is not None:
+                    nicks[member_wxid] = nick
+                    self._set_local(group_wxid, member_wxid, nick)
+        return nicks
+
+    def set_many(self, group_wxid: str, nicks: dict):
+        """批量写入昵称（一次往返）"""
+        if not nicks:
+            return
+        for member_wxid, nick in nicks.items():
+            self._set_local(group_wxid, member_wxid, nick)
+        pipe = get_redis_connection(0).pipeline(transaction=False)
+        pipe.hset(self._key(group_wxid), mapping=nicks)
+        pipe.hexpire(self._key(group_wxid), NICK_CACHE_TTL, *nicks)
+        pipe.execute()
+
+    def invalidate(self, group_wxid: str, member_wxid: str = None):
+        """使昵称缓存失效，不传member_wxid时失效整个群组"""
+        with self._lock:
+            if member_wxid is not None:
+                self._local.pop((group_wxid, member_wxid), None)
+            else:
+                for key in [key for key in self._local if key[0] == group_wxid]:
+                    del self._local[key]
+        redis_conn = get_redis_connection(0)
+        if member_wxid is not None:
+            redis_conn.hdel(self._key(group_wxid), member_wxid)
+        else:
+            redis_conn.delete(self._key(group_wxid))
+
+
+# 全局昵称缓存实例
+nick_cache = NickCache()
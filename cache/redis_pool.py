@@ -1,6 +1,8 @@
 import redis
+import redis.asyncio
 import threading
 from typing import Optional
+from cache.redis_stats import InstrumentedConnection, AsyncInstrumentedConnection
 
 class RedisConnectionPool:
     """Redis连接池管理器"""
@@ -26,7 +28,8 @@ class RedisConnectionPool:
             port=6379,
             db=0,
             max_connections=20,
-            decode_responses=True
+            decode_responses=True,
+            connection_class=InstrumentedConnection
         )
         
         # 创建用于后台任务结果的连接池
@@ -34,7 +37,18 @@ class RedisConnectionPool:
             host='127.0.0.1',
             port=6379,
             db=1,
-            max_connections=10
+            max_connections=10,
+            connection_class=InstrumentedConnection
+        )
+
+        # 创建异步连接池（FastAPI快速通道使用）
+        self.async_pool = redis.asyncio.ConnectionPool(
+            host='127.0.0.1',
+            port=6379,
+            db=0,
+            max_connections=20,
+            decode_responses=True,
+            connection_class=AsyncInstrumentedConnection
         )
         
         self._initialized = True
@@ -53,9 +67,21 @@ class RedisConnectionPool:
                 decode_responses=True
             )
 
+    def get_async_connection(self) -> redis.asyncio.Redis:
+        """获取异步Redis连接"""
+        return redis.asyncio.Redis(connection_pool=self.async_pool)
+
+    async def close_async(self):
+        """关闭异步连接池"""
+        await self.async_pool.disconnect()
+
 # 全局Redis连接池实例
 redis_pool = RedisConnectionPool()
 
 def get_redis_connection(db: int = 0) -> redis.Redis:
     """获取Redis连接的便捷函数"""
-    return redis_pool.get_connection(db)
\ No newline at end of file
+    return redis_pool.get_connection(db)
+
+def get_async_redis_connection() -> redis.asyncio.Redis:
+    """获取异步Redis连接的便捷函数"""
+    return redis_pool.get_async_connection()
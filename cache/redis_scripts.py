@@ -0,0 +1,181 @@
+import threading
+import redis
+import redis.asyncio
+from redis.commands.core import Script
+
+# 成员索引（hash: member_wxid -> 完整成员字符串）与扣排队列保持同步
+# 索引不存在但队列存在时（例如旧数据），先根据队列重建一次索引
+ENSURE_INDEX_LUA = """
+local key = KEYS[1]
+local index_key = KEYS[2]
+if redis.call('EXISTS', index_key) == 0 and redis.call('ZCARD', key) > 0 then
+    for _, member in ipairs(redis.call('ZRANGE', key, 0, -1)) do
+        redis.call('HSET', index_key, string.match(member, '^([^:]*)'), member)
+    end
+end
+"""
+
+# 扣排队列的 添加/替换/挤出 脚本
+# KEYS[1]: 扣排队列key tasks:launch_tasks:{date}:{group_wxid}:{hour}
+# KEYS[2]: 成员索引key tasks:launch_index:{date}:{group_wxid}:{hour}
+# ARGV[1]: member_wxid
+# ARGV[2]: 完整成员字符串 member_wxid:msg_content
+# ARGV[3]: 分数
+# ARGV[4]: 扣排人数上限 limit_koupai
+# ARGV[5]: mai_type（空字符串、p8、p9；其他值如daizou不挤出成员）
+# ARGV[6]/ARGV[7]: 买8/买9 挤出范围的分数上下限（mai_type为空时不使用）
+# 返回: {被挤出去的成员wxid（没有则为空字符串）, 当前正分成员数量}
+ADD_WITH_TIMESTAMP_LUA = ENSURE_INDEX_LUA + """
+local member_wxid = ARGV[1]
+local limit_koupai = tonumber(ARGV[4])
+local mai_type = ARGV[5]
+
+-- 移除 member_wxid:* 的成员（重复打榜时替换）
+local old_member = redis.call('HGET', index_key, member_wxid)
+if old_member then
+    redis.call('ZREM', key, old_member)
+end
+redis.call('ZADD', key, ARGV[3], ARGV[2])
+redis.call('HSET', index_key, member_wxid, ARGV[2])
+
+local function evict(min_score, max_score)
+    local lowest = redis.call('ZRANGEBYSCORE', key, min_score, max_score, 'LIMIT', 0, 1)
+    if lowest[1] then
+        local exit_wxid = string.match(lowest[1], '^([^:]*)')
+        redis.call('ZREM', key, lowest[1])
+        if redis.call('HGET', index_key, exit_wxid) == lowest[1] then
+            redis.call('HDEL', index_key, exit_wxid)
+        end
+        return exit_wxid
+    end
+    return ''
+end
+
+local exit_wxid = ''
+if mai_type == '' then
+    -- 正分成员超过限制人数时，移除分数最低的正分成员
+    if limit_koupai < redis.call('ZCOUNT', key, 0, '+inf') then
+        exit_wxid = evict(0, '+inf')
+    end
+elseif mai_type == 'p8' or mai_type == 'p9' then
+    -- 买8/买9 在各自分数范围内只保留一个，移除分数最小的
+    if redis.call('ZCOUNT', key, ARGV[6], ARGV[7]) > 1 then
+        exit_wxid = evict(ARGV[6], ARGV[7])
+    end
+end
+return {exit_wxid, redis.call('ZCOUNT', key, 0, '+inf')}
+"""
+
+# 查询成员当前的成员字符串和分数，不存在返回空
+# KEYS[1]/KEYS[2]: 同上  ARGV[1]: member_wxid
+GET_MEMBER_LUA = ENSURE_INDEX_LUA + """
+local member = redis.call('HGET', index_key, ARGV[1])
+if not member then
+    return false
+end
+return {member, redis.call('ZSCORE', key, member)}
+"""
+
+# 移除成员，返回剩余正分成员数量
+# KEYS[1]/KEYS[2]: 同上  ARGV[1]: member_wxid
+REMOVE_MEMBER_LUA = ENSURE_INDEX_LUA + """
+local member = redis.call('HGET', index_key, ARGV[1])
+if member then
+    redis.call('ZREM', key, member)
+    redis.call('HDEL', index_key, ARGV[1])
+end
+return redis.call('ZCOUNT', key, 0, '+inf')
+"""
+
+# 领取到期的定时事件，并将其分数顺延到下一个周期之后（多个worker同时执行时每个事件只会被领取一次）
+# KEYS[1]: 定时事件有序集合  ARGV[1]: 当前时间戳  ARGV[2]: 周期（秒）
+# 返回: {事件, 原定触发时间戳, ...}
+CLAIM_DUE_EVENTS_LUA = """
+local now = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now, 'WITHSCORES')
+for i = 1, #due, 2 do
+    local score = tonumber(due[i + 1])
+    local next_score = score + period * (math.floor((now - score) / period) + 1)
+    redis.call('ZADD', KEYS[1], next_score, due[i])
+end
+return due
+"""
+
+# 领取到期的定时器（最多ARGV[3]个），领取后将分数推迟到租约到期时间；
+# 处理完成后由调用方ZREM确认，处理过程中进程退出时租约到期后会被重新领取
+# KEYS[1]: 定时器有序集合  ARGV[1]: 当前时间戳  ARGV[2]: 租约到期时间戳  ARGV[3]: 每批数量
+CLAIM_DUE_TIMERS_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[3]))
+for _, member in ipairs(due) do
+    redis.call('ZADD', KEYS[1], ARGV[2], member)
+end
+return due
+"""
+
+# 将v0分数更新为v1分数（比较后更新：成员的分数在读取后已经改变时跳过）
+# KEYS[1]: 扣排队列或历史麦序  ARGV: 每3个为一组 成员, 原分数, 新分数
+# 返回: 更新的成员数量
+UPGRADE_LEGACY_SCORES_LUA = """
+local upgraded = 0
+for i = 1, #ARGV, 3 do
+    local current = redis.call('ZSCORE', KEYS[1], ARGV[i])
+    if current and tonumber(current) == tonumber(ARGV[i + 1]) then
+        redis.call('ZADD', KEYS[1], ARGV[i + 2], ARGV[i])
+        upgraded = upgraded + 1
+    end
+end
+return upgraded
+"""
+
+
+class RedisScripts:
+    """Redis Lua脚本管理器，脚本只在本地计算一次sha，调用时使用EVALSHA（不存在时自动回退EVAL并缓存）"""
+
+    _instance = None
+    _lock = threading.Lock()
+
+    SOURCES = {
+        "add_with_timestamp": ADD_WITH_TIMESTAMP_LUA,
+        "get_member": GET_MEMBER_LUA,
+        "remove_member": REMOVE_MEMBER_LUA,
+        "claim_due_events": CLAIM_DUE_EVENTS_LUA,
+        "claim_due_timers": CLAIM_DUE_TIMERS_LUA,
+        "upgrade_legacy_scores": UPGRADE_LEGACY_SCORES_LUA,
+    }
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(RedisScripts, cls).__new__(cls)
+                    cls._instance._scripts = {}
+                    cls._instance._async_scripts = {}
+        return cls._instance
+
+    def get(self, redis_conn: redis.Redis, name: str) -> Script:
+        """获取已注册的脚本，调用时需传入 client=redis_conn"""
+        script = self._scripts.get(name)
+        if script is None:
+            with self._lock:
+                script = self._scripts.get(name)
+                if script is None:
+                    script = redis_conn.register_script(self.SOURCES[name])
+                    self._scripts[name] = script
+        return script
+
+    def run(self, redis_conn: redis.Redis, name: str, keys: list, args: list):
+        """执行指定脚本（一次往返）"""
+        return self.get(redis_conn, name)(keys=keys, args=args, client=redis_conn)
+
+    async def run_async(self, redis_conn: redis.asyncio.Redis, name: str, keys: list, args: list):
+        """使用异步客户端执行指定脚本（一次往返）"""
+        script = self._async_scripts.get(name)
+        if script is None:
+            script = redis_conn.register_script(self.SOURCES[name])
+            self._async_scripts[name] = script
+        return await script(keys=keys, args=args, client=redis_conn)
+
+
+# 全局脚本管理实例
+redis_scripts = RedisScripts()
@@ -0,0 +1,173 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+import redis
+import redis.asyncio
+
+
+class RedisBudgetExceeded(AssertionError):
+    """redis命令数或往返次数超过预算"""
+
+
+class RedisCounter:
+    """一个作用域（celery任务、HTTP请求）内的redis命令数、往返次数和等待响应的时间"""
+
+    __slots__ = ("name", "commands", "round_trips", "seconds")
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.commands = 0
+        self.round_trips = 0
+        self.seconds = 0.0
+
+    def as_dict(self) -> dict:
+        return {"commands": self.commands, "round_trips": self.round_trips, "seconds": round(self.seconds, 6)}
+
+    def __repr__(self):
+        return f"RedisCounter({self.name!r}, commands={self.commands}, round_trips={self.round_trips})"
+
+
+class RedisStats:
+    """
+    redis命令统计：由 InstrumentedConnection 在每次发送请求和读取响应时记录，
+    同时累加到当前作用域（contextvars，celery任务和HTTP请求各自独立）和进程内按作用域名称的汇总中
+    一次发送为一次往返（pipeline的多条命令只算一次往返），每读取一个响应为一条命令
+    """
+
+    def __init__(self):
+        self._current: ContextVar[Optional[RedisCounter]] = ContextVar("redis_counter", default=None)
+        self._lock = threading.Lock()
+        self.total = RedisCounter("total")
+        # 作用域名称 -> [调用次数, 命令数, 往返次数, 秒]
+        self._by_name = {}
+
+    def record_round_trip(self):
+        counter = self._current.get()
+        if counter is not None:
+            counter.round_trips += 1
+        with self._lock:
+            self.total.round_trips += 1
+
+    def record_command(self, seconds: float):
+        counter = self._current.get()
+        if counter is not None:
+            counter.commands += 1
+            counter.seconds += seconds
+        with self._lock:
+            self.total.commands += 1
+            self.total.seconds += seconds
+
+    def current(self) -> Optional[RedisCounter]:
+        """当前作用域的计数，不在作用域内时为None"""
+        return self._current.get()
+
+    def label(self, name: str):
+        """修改当前作用域的名称（例如回调请求按消息类型汇总），不在作用域内时忽略"""
+        counter = self._current.get()
+        if counter is not None:
+            counter.name = name
+
+    def begin(self, name: str):
+        """开始一个作用域，返回用于 end 的token"""
+        return self._current.set(RedisCounter(name))
+
+    def end(self, token) -> RedisCounter:
+        """结束作用域并汇总，返回该作用域的计数"""
+        counter = self._current.get()
+        self._current.reset(token)
+        if counter is not None:
+            with self._lock:
+                item = self._by_name.setdefault(counter.name, [0, 0, 0, 0.0])
+                item[0] += 1
+                item[1] += counter.commands
+                item[2] += counter.round_trips
+                item[3] += counter.seconds
+        return counter
+
+    @contextmanager
+    def scope(self, name: str):
+        """统计with块内的redis命令"""
+        token = self.begin(name)
+        try:
+            yield self._current.get()
+        finally:
+            self.end(token)
+
+    @contextmanager
+    def budget(self, name: str = "budget", round_trips: int = None, commands: int = None):
+        """
+        断言with块内的redis往返次数和命令数不超过预算，超过时抛出 RedisBudgetExceeded
+        例如: with redis_stats.budget("add p", round_trips=2): ...
+        """
+        with self.scope(name) as counter:
+            yield counter
+        if round_trips is not None and counter.round_trips > round_trips:
+            raise RedisBudgetExceeded(f"{name}: redis往返 {counter.round_trips} 次，预算 {round_trips} 次")
+        if commands is not None and counter.commands > commands:
+            raise RedisBudgetExceeded(f"{name}: redis命令 {counter.commands} 条，预算 {commands} 条")
+
+    def snapshot(self) -> dict:
+        """进程内的汇总 {作用域名称: {calls, commands, round_trips, seconds}}，以及total"""
+        with self._lock:
+            by_name = {name: {"calls": calls, "commands": commands, "round_trips": round_trips, "seconds": round(seconds, 6)}
+                       for name, (calls, commands, round_trips, seconds) in self._by_name.items()}
+            total = self.total.as_dict()
+        return {"total": total, "scopes": by_name}
+
+
+# 全局redis命令统计实例
+redis_stats = RedisStats()
+
+
+class InstrumentedConnection(redis.Connection):
+    """统计往返次数和命令数的同步连接（建立连接时的握手命令不计入）"""
+
+    _connecting = False
+
+    def connect(self, *args, **kwargs):
+        self._connecting = True
+        try:
+            return super().connect(*args, **kwargs)
+        finally:
+            self._connecting = False
+
+    def send_packed_command(self, *args, **kwargs):
+        if not self._connecting:
+            redis_stats.record_round_trip()
+        return super().send_packed_command(*args, **kwargs)
+
+    def read_response(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().read_response(*args, **kwargs)
+        finally:
+            if not self._connecting:
+                redis_stats.record_command(time.perf_counter() - start)
+
+
+class AsyncInstrumentedConnection(redis.asyncio.Connection):
+    """统计往返次数和命令数的异步连接（建立连接时的握手命令不计入）"""
+
+    _connecting = False
+
+    async def connect(self, *args, **kwargs):
+        self._connecting = True
+        try:
+            return await super().connect(*args, **kwargs)
+        finally:
+            self._connecting = False
+
+    async def send_packed_command(self, *args, **kwargs):
+        if not self._connecting:
+            redis_stats.record_round_trip()
+        return await super().send_packed_command(*args, **kwargs)
+
+    async def read_response(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().read_response(*args, **kwargs)
+        finally:
+            if not self._connecting:
+                redis_stats.record_command(time.perf_counter() - start)
@@ -4,7 +4,18 @@ from datetime import datetime
 from pydantic import BaseModel
 from datetime import timedelta, timezone
 from celery.schedules import crontab
+from celery.signals import task_prerun, task_postrun, before_task_publish, worker_init
+from celery.signals import setup_logging as celery_setup_logging
 import redis
+import time
+import logging
+from common.config import BB_TIMER_POLL_SECONDS, OUTBOX_POLL_SECONDS, REDIS_TASK_WARN_ROUND_TRIPS, METRICS_WORKER_PORT
+from cache.redis_stats import redis_stats
+from common.metrics import start_exporter, BROKER_WAIT_SECONDS, TASK_SECONDS, REDIS_SECONDS
+from common.tracing import tracer
+from common.log import setup_logging
+
+logger = logging.getLogger(__name__)
 class TaskResult(BaseModel):
     task_id: str
     group_wxid: str
@@ -34,6 +45,14 @@ celery_app.conf.beat_schedule = {
         'task': 'celery_tasks.schedule_tasks.scheduled_task',
         'schedule': crontab(minute='*'),  # 每分钟的第二秒执行一次
         
+    },
+    'poll-bb-timers': {
+        'task': 'celery_tasks.schedule_tasks.poll_bb_timers',
+        'schedule': BB_TIMER_POLL_SECONDS,  # 报备超时定时器轮询
+    },
+    'flush-outbox': {
+        'task': 'celery_tasks.schedule_tasks.flush_outbox',
+        'schedule': OUTBOX_POLL_SECONDS,  # 补发发件箱中的消息
     },
         'cleanup-results-hourly': {
         'task': 'celery_app.cleanup_expired_results',
@@ -42,6 +61,74 @@ celery_app.conf.beat_schedule = {
     },
 }
 
+@celery_setup_logging.connect
+def configure_logging(**kwargs):
+    """worker和beat使用 common.log 的日志配置（队列异步输出、结构化、运行时级别），不使用celery默认的配置"""
+    setup_logging()
+
+
+# 正在执行的任务的redis统计作用域、开始时间和追踪span task_id -> (redis统计token, 开始时间, 追踪token)
+_task_scopes = {}
+
+
+@before_task_publish.connect
+def stamp_enqueued_at(headers=None, **kwargs):
+    """发布任务时在消息头中记录发布时间（用于统计broker等待时间）和当前的追踪上下文"""
+    if headers is not None:
+        headers["enqueued_at"] = time.time()
+        tracer.inject(headers)
+
+
+@task_prerun.connect
+def begin_task_scope(task_id=None, task=None, **kwargs):
+    """任务开始时记录broker等待时间，开始该任务的追踪span，并开始统计该任务的redis命令数和往返次数"""
+    now = time.time()
+    enqueued_at = task.request.get("enqueued_at")
+    parent = tracer.extract(task.request)
+    if enqueued_at:
+        BROKER_WAIT_SECONDS.observe(max(now - float(enqueued_at), 0), task=task.name)
+        if parent.get("sampled"):
+            tracer.record_span("broker_wait", parent["trace_id"], parent["parent_id"], float(enqueued_at), now, task=task.name)
+    trace_token = tracer.begin(task.name, task_id=task_id, **parent)
+    _task_scopes[task_id] = (redis_stats.begin(task.name), time.perf_counter(), trace_token)
+
+
+@task_postrun.connect
+def end_task_scope(task_id=None, task=None, **kwargs):
+    """任务结束时记录执行耗时，并汇总该任务的redis命令数和往返次数"""
+    scope = _task_scopes.pop(task_id, None)
+    if scope is None:
+        return
+    token, start, trace_token = scope
+    TASK_SECONDS.observe(time.perf_counter() - start, task=task.name)
+    # token 不是在当前上下文中创建的（例如任务中切换了协程）时会抛出 ValueError，
+    # 两者分别处理，避免一个失败导致另一个没有结束
+    try:
+        tracer.end(trace_token)
+    except ValueError:
+        pass
+    try:
+        counter = redis_stats.end(token)
+    except ValueError:
+        return
+    if counter is None:
+        return
+    REDIS_SECONDS.observe(counter.seconds, scope=task.name)
+    if counter.round_trips >= REDIS_TASK_WARN_ROUND_TRIPS:
+        logger.warning(f"任务 {task.name} 的redis往返 {counter.round_trips} 次，命令 {counter.commands} 条")
+
+
+@worker_init.connect
+def start_worker_exporter(**kwargs):
+    """worker启动时启动指标HTTP服务"""
+    if not METRICS_WORKER_PORT:
+        return
+    try:
+        start_exporter(METRICS_WORKER_PORT)
+    except OSError as e:
+        logger.error(f"指标服务启动失败（端口 {METRICS_WORKER_PORT}）: {e}")
+
+
 @celery_app.task
 def cleanup_expired_results():
     """
@@ -61,7 +148,7 @@ def cleanup_expired_results():
     
     deleted_count = 0
     expired_before = datetime.now(timezone.utc) - timedelta(hours=1)  # 1小时前
-    print(f"清理过期任务结果，过期时间: {expired_before.isoformat()}")
+    logger.info(f"清理过期任务结果，过期时间: {expired_before.isoformat()}")
     for key in redis_conn.scan_iter(match=pattern, count=1000):
         try:
             # 获取任务元数据
@@ -82,9 +169,9 @@ def cleanup_expired_results():
                         deleted_count += 1
                         
         except Exception as e:
-            print(f"清理键 {key} 失败: {e}")
+            logger.warning(f"清理键 {key} 失败: {e}")
             continue
-    print(f"清理过期任务结果完成，删除 {deleted_count} 条记录")
+    logger.info(f"清理过期任务结果完成，删除 {deleted_count} 条记录")
     return {
         'deleted_count': deleted_count,
         'timestamp': datetime.now().isoformat()
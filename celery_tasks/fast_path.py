@@ -0,0 +1,151 @@
+import asyncio
+import logging
+from common.clock import clock
+from cache.redis_pool import get_async_redis_connection
+from cache.redis_scripts import redis_scripts
+from celery_tasks.tasks_crud import (get_task_key, get_task_index_key, build_add_member_args, count_fixed_speed,
+                                     get_koupai_base_score, get_mai89_score, get_renwu_dict, parse_renwu_list)
+from celery_tasks.schedule_tasks import notify_koupai_full, notify_koupai_update, notify_mai89
+from common.score_codec import TIER_DAIZOU
+from utils.send_utils_sync import send_message, get_member_nick
+from utils.send_scheduler import PRIORITY_URGENT
+
+logger = logging.getLogger(__name__)
+
+
+def send_member_message(group_wxid: str, member_wxid: str, msg: str):
+    """发送带成员昵称前缀的消息（成员操作的即时回复）"""
+    send_message(group_wxid, f"{get_member_nick(group_wxid, member_wxid)} {msg}", priority=PRIORITY_URGENT)
+
+
+def parse_index_member(member: str) -> tuple:
+    """解析成员索引中的成员字符串，返回 (扣排类型, 状态)"""
+    parts = member.split(":")
+    return parts[1], parts[2] if len(parts) > 2 else ""
+
+
+class KoupaiFastPath:
+    """
+    成员操作快速通道（KOUPAI_FAST_PATH=1 时启用）
+    在回调请求内使用异步redis客户端和原子脚本直接修改扣排队列，不经过celery broker；
+    只有发往群里的消息交给后台线程发送。
+    与 schedule_tasks 中对应的任务逻辑一致，成员查询依赖成员索引（见 get_task_index_key）
+    """
+
+    def __init__(self):
+        # 保存后台发送任务的引用，防止被回收
+        self._background = set()
+
+    def _send_later(self, func, *args):
+        """在后台线程中渲染并发送消息（需要查询昵称等阻塞操作），不阻塞回调响应"""
+        task = asyncio.create_task(asyncio.to_thread(func, *args))
+        self._background.add(task)
+        task.add_done_callback(self._on_sent)
+
+    def _on_sent(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"快速通道后台发送消息时出错: {task.exception()}")
+
+    async def add_koupai_member(self, group_wxid: str, member_wxid: str, msg_content: str = "p", arrival_us: int = None):
+        """添加成员到扣排队列（p/补），对应 add_koupai_member 任务"""
+        try:
+            redis_conn = get_async_redis_connection()
+            current_hour = clock.now().hour
+            session = f"{group_wxid}:{(current_hour+1)%24}"
+            task_key = get_task_key(group_wxid, (current_hour+1)%24)
+            async with redis_conn.pipeline(transaction=False) as pipe:
+                pipe.hgetall(f"groups_config:{group_wxid}")
+                pipe.sismember("tasks:launch_tasks:koupai_tasks_list", session)
+                pipe.zcount(task_key, 0, float('inf'))
+                pipe.hvals(get_task_index_key(task_key))
+                group_config, has_task, current_members, members = await pipe.execute()
+            member_limit = int(group_config["limit_koupai"])
+            if not (has_task and (current_members < member_limit) or (msg_content == "补")):
+                return
+            fixed_num = count_fixed_speed(parse_index_member(member) for member in members)
+            base_score, koupai_type = get_koupai_base_score(group_config, msg_content, has_task, fixed_num)
+            keys, args = build_add_member_args(group_wxid, member_wxid, base_score, koupai_type,
+                                               current_hour=(current_hour+1)%24, arrival_us=arrival_us)
+            _, current_members = await redis_scripts.run_async(redis_conn, "add_with_timestamp", keys=keys, args=args)
+            # 达到人数上限时，删除扣排阶段队列，添加任务阶段队列
+            if current_members >= member_limit:
+                if has_task:
+                    async with redis_conn.pipeline(transaction=False) as pipe:
+                        pipe.srem("tasks:launch_tasks:koupai_tasks_list", session)
+                        pipe.sadd("tasks:launch_tasks:renwu_tasks_list", session)
+                        await pipe.execute()
+                self._send_later(notify_koupai_full, group_wxid, current_hour, has_task)
+        except Exception as e:
+            logger.error(f"快速通道添加成员{member_wxid}到扣牌任务列表{group_wxid}时出错: {e}")
+
+    async def update_koupai_member(self, group_wxid: str, member_wxid: str, msg_content: str, arrival_us: int = None):
+        """扣任务，对应 update_koupai_member 任务"""
+        try:
+            redis_conn = get_async_redis_connection()
+            current_hour = clock.now().hour
+            async with redis_conn.pipeline(transaction=False) as pipe:
+                pipe.sismember("tasks:launch_tasks:renwu_tasks_list", f"{group_wxid}:{(current_hour+1)%24}")
+                pipe.hmget(f"groups_config:{group_wxid}", "limit_koupai", "renwu_desc")
+                has_renwu, (limit_koupai, renwu_desc) = await pipe.execute()
+            if not has_renwu:
+                return
+            limit_koupai = int(limit_koupai)
+            base_score = get_renwu_dict(parse_renwu_list(renwu_desc)).get(msg_content, 0)
+            keys, args = build_add_member_args(group_wxid, member_wxid, base_score, msg_content, limit_koupai,
+                                               current_hour=(current_hour+1)%24, arrival_us=arrival_us)
+            exit_member, _ = await redis_scripts.run_async(redis_conn, "add_with_timestamp", keys=keys, args=args)
+            self._send_later(notify_koupai_update, group_wxid, member_wxid, msg_content, exit_member, current_hour, limit_koupai)
+        except Exception as e:
+            logger.error(f"快速通道更新成员{member_wxid}在扣排任务列表{group_wxid}时出错: {e}")
+
+    async def add_mai89_member(self, group_wxid: str, member_wxid: str, msg_content: str, arrival_us: int = None):
+        """买8/买9，对应 add_mai89_member 任务"""
+        try:
+            redis_conn = get_async_redis_connection()
+            current_hour = clock.now().hour
+            task_key = get_task_key(group_wxid, (current_hour+1)%24)
+            async with redis_conn.pipeline(transaction=False) as pipe:
+                pipe.sismember("tasks:launch_tasks:renwu_tasks_list", f"{group_wxid}:{(current_hour+1)%24}")
+                pipe.hmget(f"groups_config:{group_wxid}", "limit_koupai", "renwu_desc")
+                pipe.hget(get_task_index_key(task_key), member_wxid)
+                has_renwu, (limit_koupai, renwu_desc), member = await pipe.execute()
+            if not has_renwu:
+                return
+            # 当成员已经在扣排队列中时（带走的成员除外），不允许重复添加
+            if member and parse_index_member(member)[1] != "带走":
+                self._send_later(send_member_message, group_wxid, member_wxid, "已经在扣排任务列表中")
+                return
+            mai_type, mai_content, base_score = get_mai89_score(msg_content, parse_renwu_list(renwu_desc))
+            if base_score == 0:
+                self._send_later(send_member_message, group_wxid, member_wxid, "输入不符合任务设置。请检查输入")
+                return
+            keys, args = build_add_member_args(group_wxid, member_wxid, base_score, mai_content, int(limit_koupai or 0), mai_type,
+                                               current_hour=(current_hour+1)%24, arrival_us=arrival_us)
+            exit_member, _ = await redis_scripts.run_async(redis_conn, "add_with_timestamp", keys=keys, args=args)
+            self._send_later(notify_mai89, group_wxid, member_wxid, mai_content, exit_member, current_hour)
+        except Exception as e:
+            logger.error(f"快速通道添加成员{member_wxid}到买89任务列表{group_wxid}时出错: {e}")
+
+    async def add_daizou_member(self, group_wxid: str, member_wxid: str):
+        """带走，对应 add_daizou_member 任务"""
+        try:
+            redis_conn = get_async_redis_connection()
+            current_hour = clock.now().hour
+            task_key = get_task_key(group_wxid, (current_hour+1)%24)
+            member = await redis_conn.hget(get_task_index_key(task_key), member_wxid)
+            # 已经带走的成员视为不在列表中
+            if not member or parse_index_member(member)[1] == "带走":
+                self._send_later(send_member_message, group_wxid, member_wxid, "不在当前扣牌列表中")
+                return
+            koupai_type = f"{parse_index_member(member)[0]}:带走"
+            # mai_type 为 daizou 时不挤出其他成员
+            keys, args = build_add_member_args(group_wxid, member_wxid, TIER_DAIZOU, koupai_type, 0, "daizou",
+                                               current_hour=(current_hour+1)%24)
+            await redis_scripts.run_async(redis_conn, "add_with_timestamp", keys=keys, args=args)
+        except Exception as e:
+            logger.error(f"快速通道添加成员{member_wxid}到待扣任务列表{group_wxid}时出错: {e}")
+
+
+# 全局快速通道实例
+koupai_fast_path = KoupaiFastPath()
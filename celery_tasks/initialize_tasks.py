@@ -13,6 +13,9 @@ from db.database import db_manager
 from db.repository import group_repo, command_repo
 from cache.redis_pool import get_redis_connection
 from command.rules.hostPhrase_rules import parse_time_slots
+from common.classifier import message_classifier
+from celery_tasks.scheduler_index import rebuild_group_events, rebuild_all_events, clear_all_events
+from celery_tasks.tasks_crud import upgrade_legacy_scores
 import asyncio
 # 防止循环导入
 # from celery_tasks.schedule_tasks import scheduled_task
@@ -109,6 +112,7 @@ class InitializeTasks:
             # print(f"格式化后的组配置: {formatted_hosts}")
             for task in formatted_configs:
                 self.redis_client.hset(f"{self.GROUPS_CONFIG_KEY}:{task['group_wxid']}", mapping=task)
+                message_classifier.compile(task['group_wxid'], task['renwu_desc'])
             for host in formatted_hosts:
                 self.redis_client.hset(f"{self.HOSTS_TASK_CONFIG_KEY}:{host['group_wxid']}:{host['start_hour']}", mapping=host)
             # 存储任务群组到集合
@@ -117,6 +121,15 @@ class InitializeTasks:
             # 存储群组成员角色信息。
             for role in formatted_members_roles:
                 self.redis_client.hset(f"{self.MEMBER_TASK_KEY}:{role['group_wxid']}:{role['member_wxid']}", mapping=role)
+            # 重建定时事件索引
+            if groups_wxid:
+                rebuild_group_events(self.redis_client, groups_wxid)
+            else:
+                rebuild_all_events(self.redis_client)
+                # 升级前写入的v0分数转换为v1，否则会被档位范围的查询误选（例如带走成员落在买9以上的范围）
+                upgraded = upgrade_legacy_scores(self.redis_client)
+                if upgraded:
+                    logger.info(f"已将 {upgraded} 个成员的分数转换为新编码")
             # 初始化完redis存储后，立即执行检查任务到任务列表是否存在
             # scheduled_task.delay()
         except Exception as e:
@@ -125,6 +138,12 @@ class InitializeTasks:
     async def update_groups_config(self, group_wxid: str, config: dict):
         """更新指定群组的配置"""
         self.redis_client.hset(f"{self.GROUPS_CONFIG_KEY}:{group_wxid}", mapping=config)
+        # 任务描述变更时重新编译成员消息分类规则
+        if "renwu_desc" in config:
+            message_classifier.compile(group_wxid, config["renwu_desc"])
+        # 扣排时间变更时重建定时事件
+        if config.keys() & {"start_koupai", "end_koupai", "end_renwu"}:
+            rebuild_group_events(self.redis_client, group_wxid)
         print(f"已更新群组 {group_wxid} 的配置{config}")
     async def add_koupai_groups(self, group_wxid: str):
         """添加指定群组到开牌群组集合"""
@@ -156,6 +175,7 @@ class InitializeTasks:
             })
         for host in formatted_hosts:
             self.redis_client.hset(f"{self.HOSTS_TASK_CONFIG_KEY}:{host['group_wxid']}:{host['start_hour']}", mapping=host)
+        rebuild_group_events(self.redis_client, group_wxid)
         print(f"已添加群组 {group_wxid} 的所有任务")
     async def update_group_tasks_host_desc(self, group_wxid:str, start_hour:str, end_hour:str, host_desc:str):
         """更新指定群组指定时间范围的主持(临时，重启或者换天后会失效)"""
@@ -186,6 +206,7 @@ class InitializeTasks:
             else:
                 # 存在该任务，更新任务的host_desc和fixed_hosts
                 self.redis_client.hset(f"{self.HOSTS_TASK_CONFIG_KEY}:{group_wxid}:{start_hour}", "host_desc", host_desc)
+        rebuild_group_events(self.redis_client, group_wxid)
         
     async def update_group_tasks_fixed_hosts(self, group_wxid: str):
         """更新指定群fixed_hosts"""
@@ -231,6 +252,7 @@ class InitializeTasks:
         # 2. 批量删除
         if all_keys:
             self.redis_client.delete(*all_keys)
+        clear_all_events(self.redis_client)
         logger.info(f"已清空 {len(all_keys)} 条任务相关 key")
         logger.info("所有任务已清除")
         
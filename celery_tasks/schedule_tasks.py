@@ -2,7 +2,8 @@ import json
 import redis
 from db.repository import group_repo
 from utils.emoji_map import emoji_map
-from utils.send_utils_sync import send_message, at_user, get_member_nick
+from utils.send_utils_sync import send_message, at_user, get_member_nick, get_member_nicks, outbox
+from utils.send_scheduler import PRIORITY_URGENT, PRIORITY_BULK
 from celery_app import celery_app
 from celery import group
 from celery.result import AsyncResult
@@ -12,6 +13,13 @@ import logging
 from cache.redis_pool import get_redis_connection
 from celery_tasks.tasks_crud import *
 from celery_tasks.initialize_tasks import initialize_tasks
+from common.score_codec import TIER_FIXED, TIER_DAIZOU
+from common.clock import clock
+from common.tracing import tracer
+from common.log import sampled
+from common.config import SCHEDULER_GRACE_SECONDS, BB_TIMER_BATCH, BB_TIMER_LEASE_SECONDS, OUTBOX_FLUSH_BATCH
+from celery_tasks.timer_wheel import bb_timers
+from celery_tasks.scheduler_index import (claim_due_events, restore_events, EVENT_START, EVENT_END, EVENT_RENWU, EVENT_SCHEDULE)
 import json
 from contextlib import contextmanager
 import asyncio
@@ -26,7 +34,7 @@ def task_lock(redis_conn, task_key, timeout=30):
     
     # 尝试获取锁
     acquired = redis_conn.set(lock_key, 'locked', nx=True, ex=timeout)
-    print(f"尝试获取锁 {lock_key}，结果: {acquired}")
+    logger.debug("尝试获取锁", extra={"lock_key": lock_key, "acquired": acquired})
     try:
         if acquired:
             yield True  # 获得锁，可以执行
@@ -37,104 +45,54 @@ def task_lock(redis_conn, task_key, timeout=30):
         if acquired:
             redis_conn.delete(lock_key)
 
-def process_valid_groups(current_hour: int, **kwargs):
-    """处理符合下一个分钟扣排任务的群组"""
-    valid_groups_start = kwargs.get("valid_groups_start", [])
-    valid_groups_end = kwargs.get("valid_groups_end", [])
-    valid_groups_end_renwu = kwargs.get("valid_groups_end_renwu", [])
-    valid_groups_schedule = kwargs.get("valid_groups_schedule", [])
-    print(f"valid_groups_start: {valid_groups_start}")
-    print(f"valid_groups_end: {valid_groups_end}")
-    print(f"valid_groups_end_renwu: {valid_groups_end_renwu}")
+def process_due_events(events: list):
+    """将到期的定时事件转换为对应的任务组"""
     tasks = []
     redis_conn = get_redis_connection()
-    # 处理开始扣排任务
-    for group_wxid in valid_groups_start:
-        task_id = f"start:tasks:hosts_tasks:{group_wxid}:{(current_hour+1)%24}"
+    for action, group_wxid, current_hour in events:
+        if action == EVENT_START:
+            # 处理开始扣排任务
+            task_id = f"start:tasks:hosts_tasks:{group_wxid}:{(current_hour+1)%24}"
+            task = send_koupai_task_start.s(group_wxid, current_hour)
+        elif action == EVENT_END:
+            # 处理结束扣排任务
+            task_id = f"end:tasks:hosts_tasks:{group_wxid}:{(current_hour+1)%24}"
+            task = send_koupai_task_end.s(group_wxid, current_hour, "end_koupai")
+        elif action == EVENT_RENWU:
+            # 处理任务结束
+            task_id = f"renwu:tasks:hosts_tasks:{group_wxid}:{(current_hour+1)%24}"
+            task = send_koupai_task_end.s(group_wxid, current_hour, "end_renwu")
+        elif action == EVENT_SCHEDULE:
+            # 处理小时打卡记录表
+            task_id = f"schedule:tasks:hosts_tasks:{group_wxid}:{current_hour}"
+            task = send_task_schedule.s(group_wxid, current_hour)
+        else:
+            continue
         # 检查是否有未完成的对应任务
         with task_lock(redis_conn, task_id) as lock_acquired:
             if not lock_acquired:
                 continue
-        # 先判断是否有未完成的对应任务，有的话直接跳过这个任务创建
-        # if AsyncResult(task_id).state == "PENDING":
-        #     print(f"开始任务 {task_id} 已存在，状态为 {AsyncResult(task_id).state}")
-        #     continue
-        task_start = send_koupai_task_start.s(group_wxid, current_hour).set(
-                task_id=task_id,
-                queue="celery"
-            )
-        tasks.append(task_start)
-    # 处理结束扣排任务
-    for group_wxid in valid_groups_end:
-        task_id = f"end:tasks:hosts_tasks:{group_wxid}:{(current_hour+1)%24}"
-        with task_lock(redis_conn, task_id) as lock_acquired:
-            if not lock_acquired:
-                continue
-        task_end = send_koupai_task_end.s(group_wxid, current_hour, "end_koupai").set(
-                task_id=task_id,
-                queue="celery"
-            )
-        
-        tasks.append(task_end)
-    # 处理任务结束
-    for group_wxid in valid_groups_end_renwu:
-        task_id = f"renwu:tasks:hosts_tasks:{group_wxid}:{(current_hour+1)%24}"
-        with task_lock(redis_conn, task_id) as lock_acquired:
-            if not lock_acquired:
-                continue
-        task_renwu = send_koupai_task_end.s(group_wxid, current_hour, "end_renwu").set(
-                task_id=task_id,
-                queue="celery"
-            )
-        tasks.append(task_renwu)
-    # 处理小时打卡记录表
-    for group_wxid in valid_groups_schedule:
-        task_id = f"schedule:tasks:hosts_tasks:{group_wxid}:{current_hour}"
-        with task_lock(redis_conn, task_id) as lock_acquired:
-            if not lock_acquired:
-                continue
-        task_schedule = send_task_schedule.s(group_wxid, current_hour).set(
-                task_id=task_id,
-                queue="celery"
-            )
-        tasks.append(task_schedule)
+        tasks.append(task.set(task_id=task_id, queue="celery"))
     task_group = group(tasks)
     logger.info(f"创建 group，包含 {len(tasks)} 个任务")
     return task_group
 
 
 @celery_app.task
-def scheduled_task( koupai_type: str = "all", update_group:str = None, **kwargs):
+def scheduled_task(**kwargs):
     """
-    定时任务，每分钟检查一次群组的扣牌时间。
+    定时任务，每分钟执行一次，领取定时事件索引中到期的事件（开始扣排、扣排截止、任务截止、打卡记录表）。
+    设置扣排时间、设置主持等命令会先重建对应群组的事件，再立即执行一次本任务。
     """
     logger.info("每分钟定时任务开始")
     
     #获取当前分钟、小时
-    now = datetime.now()
+    now = clock.now()
     current_minute = now.minute
     current_hour = now.hour
-    # 检查所有群组的扣牌时间
     redis_conn = get_redis_connection(0)
-    # 先获取所有扣排任务群组
-    if update_group:
-        groups_keys = [update_group]
-    else:
-        groups_keys = list(redis_conn.smembers("groups_config:koupai_groups"))
-    valid_groups = []
-    print(f"groups_keys 所有扣牌任务群组: {groups_keys}")
-    # 检查下一个小时的扣牌任务
     try:
-        valid_groups = get_next_hour_group(redis_conn, groups_keys, current_hour)
-        print(f"valid_groups 下一个小时的扣牌任务: {valid_groups}")
-
-        # 检查下一个分钟的扣牌任务
-        valid_groups_start = []
-        valid_groups_end = []
-        valid_groups_end_renwu = []
-        valid_groups_schedule = []
-
-        # 每日0点执行重新初始化所有任务
+        # 每日0点执行重新初始化所有任务（同时重建定时事件索引）
         if current_hour == 0 and current_minute == 0 or kwargs.get("init_tasks"):
             asyncio.run(initialize_tasks.load_from_database())
 
@@ -144,25 +102,22 @@ def scheduled_task( koupai_type: str = "all", update_group:str = None, **kwargs)
             # 并且清空redis内的launch_tasks缓存
             save_task_schedule_day_history.delay(cleanup=True)
 
-        # 保证互斥
-        if koupai_type != "end":
-            valid_groups_start = get_next_minute_group(redis_conn, valid_groups, current_minute, "start_koupai") 
-        if koupai_type != "start":
-            valid_groups_end = get_next_minute_group(redis_conn, valid_groups, current_minute, "end_koupai") 
-            valid_groups_end_renwu = get_next_minute_group(redis_conn, valid_groups, current_minute, "end_renwu") 
-        # 当前为默认all并且是第1分钟时，检查符合发送打卡记录表的群组
-        if koupai_type == "all" and (kwargs.get("schedule_minute") or current_minute == 1):
-            valid_groups_schedule = get_next_schedule_group(redis_conn, groups_keys, current_hour)
-            print(f"valid_groups_schedule 符合发送打卡记录表的群组: {valid_groups_schedule}")
-
-
-        task_group = process_valid_groups(current_hour, valid_groups_start=valid_groups_start, valid_groups_end=valid_groups_end, valid_groups_end_renwu=valid_groups_end_renwu, valid_groups_schedule=valid_groups_schedule)
-        launch_time = now.replace(minute=current_minute, second=0, microsecond=0)
-        print(f"下一分钟到了就开始执行扣排任务: {launch_time}")
-        # 立即执行
-
-        utc_time = datetime.utcfromtimestamp(launch_time.timestamp())
-        task_group.apply_async(eta=utc_time)
+        # 领取到期的事件，错过太久的事件（例如worker停机期间）只顺延不执行
+        claimed = []
+        for action, group_wxid, fire_hour, fire_time in claim_due_events(redis_conn, now):
+            if now.timestamp() - fire_time > SCHEDULER_GRACE_SECONDS:
+                logger.warning(f"跳过过期的定时事件 {action}:{group_wxid}:{fire_hour}，原定时间 {datetime.fromtimestamp(fire_time)}")
+                continue
+            claimed.append((action, group_wxid, fire_hour, fire_time))
+        events = [(action, group_wxid, fire_hour) for action, group_wxid, fire_hour, _ in claimed]
+        logger.debug("到期的定时事件", extra={"events": events})
+        if events:
+            # 立即执行；发布失败（例如broker短暂不可用）时恢复事件的触发时间，下一分钟重新领取
+            try:
+                process_due_events(events).apply_async()
+            except Exception as e:
+                restore_events(redis_conn, claimed)
+                logger.error(f"发布定时事件失败，已恢复 {len(claimed)} 个事件等待重试: {e}")
     except Exception as e:
         logger.error(f"检查扣牌任务时出错: {e}")
     
@@ -174,7 +129,7 @@ def send_koupai_task_start(group_wxid: str, current_hour: int):
     发送指定群组的扣排信息。
     """
     try:
-        print(f"发送扣排任务到群组{group_wxid}")
+        logger.info("发送扣排任务", extra={"group": group_wxid})
         redis_conn = get_redis_connection(0)
         #在任务列表单里添加扣排任务id
         redis_conn.sadd(f"tasks:launch_tasks:koupai_tasks_list", f"{group_wxid}:{(current_hour+1)%24}")
@@ -187,10 +142,10 @@ def send_koupai_task_start(group_wxid: str, current_hour: int):
         fixed_hosts = json.loads(hosts_config["fixed_hosts"])
         # 先往扣排队列里添加固定排成员
         for fixed_host in fixed_hosts:
-            # 因为固定排成员在最前面，因此基础分数设为1000
-            add_with_timestamp(redis_conn, group_wxid, f"{fixed_host}",msg_content="固定排", base_score=1000, current_hour=(current_hour+1)%24)
+            # 因为固定排成员在最前面，因此基础分数为固定排档位
+            add_with_timestamp(redis_conn, group_wxid, f"{fixed_host}",msg_content="固定排", base_score=TIER_FIXED, current_hour=(current_hour+1)%24)
         
-        now_date = datetime.now().strftime('%m-%d')
+        now_date = clock.now().strftime('%m-%d')
         send_message(group_wxid, f"主持: {hsot_desc}\r"
                                  f"时间: {(current_hour+1)%24}-{((current_hour+2)%24)}\r"
                                  f"日期: {now_date}\r"
@@ -221,7 +176,7 @@ def send_koupai_task_end(group_wxid: str, current_hour: int, task_type: str = "e
                 redis_conn.srem(f"tasks:launch_tasks:renwu_tasks_list", f"{group_wxid}:{(current_hour+1)%24}")
             # 并且task_type为end_renwu时，不移除任务列表，并且不执行后续代码，因为已经发过结束任务了
             if task_type == "end_renwu":
-                print(f"不执行后续代码，{task_type}")
+                logger.debug("已经发送过结束任务，不执行后续代码", extra={"group": group_wxid, "task_type": task_type})
 
                 # 重新获取task_members，因为在发送结束任务时，可能会有成员变更，并且要带上“带走”的成员
                 tasks_members = get_group_task_members(redis_conn, group_wxid, current_hour, with_daizou=True)
@@ -235,12 +190,12 @@ def send_koupai_task_end(group_wxid: str, current_hour: int, task_type: str = "e
             tasks_members = get_group_task_members(redis_conn, group_wxid, current_hour, with_daizou=True)
             # 更新redis中的成员任务累积
             update_group_member_task(redis_conn, group_wxid, tasks_members)
-        print(f"发送结束任务到群组{group_wxid}")
+        logger.info("发送结束任务", extra={"group": group_wxid, "task_type": task_type})
         limit_koupai = int(group_config["limit_koupai"])
         hosts_config = get_group_hosts_config(redis_conn, group_wxid, current_hour)
         # 普通排成员
         tasks_members = get_group_task_members(redis_conn, group_wxid, current_hour)
-        print(f"tasks_members: {tasks_members}")
+        logger.debug("当前麦序", extra={"group": group_wxid, "tasks_members": tasks_members})
         tasks_members_desc = "\r".join(
             f"{i+1}. {at_user(member)}({'手速' if koupai_type in ['p', 'P', '排'] else koupai_type})"
             for i, (member, koupai_type, score, state, _, _, _) in enumerate(tasks_members)
@@ -264,48 +219,28 @@ def add_koupai_member(group_wxid: str, member_wxid: str, msg_content: str = "p",
     """
     try:
         redis_conn = get_redis_connection(0)
-        current_hour = datetime.now().hour
+        current_hour = clock.now().hour
         group_config = get_group_config(redis_conn, group_wxid)
         has_task = redis_conn.sismember(f"tasks:launch_tasks:koupai_tasks_list", f"{group_wxid}:{(current_hour+1)%24}")
         has_renwu = redis_conn.sismember(f"tasks:launch_tasks:renwu_tasks_list", f"{group_wxid}:{(current_hour+1)%24}")
         member_limit = int(group_config["limit_koupai"])
         # 获取分数为正值的成员数量
-        print("==============")
-        current_members = redis_conn.zcount(f"tasks:launch_tasks:{group_wxid}:{(current_hour+1)%24}", 0, float('inf'))
-        print(f"当前群[tasks:launch_tasks:{group_wxid}:{(current_hour+1)%24}]成员数: {current_members}, 人数上限: {member_limit}")
+        task_key = get_task_key(group_wxid, (current_hour+1)%24)
+        current_members = redis_conn.zcount(task_key, 0, float('inf'))
+        logger.debug("当前群成员数: %s, 人数上限: %s", current_members, member_limit, extra={"key": task_key})
         if has_task and (current_members < member_limit) or ( msg_content == "补"):
-            base_score = 0
-            # 先获取是否有固定手速排人数和固定手速排任务
-            fixed_p_num = int(group_config["fixed_p_num"])
-            fixed_renwu_desc = group_config["fixed_renwu_desc"]
-            # 如果固定手速排人数大于0，并且有task，那么需要设置base_score
-            if fixed_p_num > 0 and has_task and msg_content != "补":
-                # 获取固定手速排人数（即member带固定手速的人恩叔)
+            fixed_num = 0
+            # 如果固定手速排人数大于0，并且有task，需要获取固定手速排人数（即member带固定手速的人数)
+            if int(group_config["fixed_p_num"]) > 0 and has_task and msg_content != "补":
                 # 先获取获取群组的扣排麦序信息
                 koupai_members = get_group_task_members(redis_conn, group_wxid, current_hour)
-                fixed_num = 0
-                for member, koupai_type, score, state, _, _, _ in koupai_members:
-                    if koupai_type == "固定手速":
-                        fixed_num += 1
-                # 当获取到的固定手速排人数大于固定手速排人数时，固定手速人数未达标。需要设置base_score
-                if fixed_p_num > fixed_num:
-                    # 设置base_score为500，低于固定排
-                    base_score = 500
-                    msg_content = "固定手速"
-                    # 如果有固定手速排任务， 那么base_score为 字典中对应的分数
-                    if fixed_renwu_desc != "":
-                        base_score = get_renwu_dict(get_renwu_list(redis_conn, group_wxid)).get(fixed_renwu_desc, 0)
-            if msg_content == "补":
-                koupai_type = "补"
-            elif msg_content == "固定手速":
-                koupai_type = "固定手速"
-            else:
-                koupai_type = "手速"
-            add_with_timestamp(redis_conn, group_wxid, f"{member_wxid}", msg_content=koupai_type, current_hour = (current_hour+1)%24, base_score = base_score)
+                fixed_num = count_fixed_speed((koupai_type, state) for _, koupai_type, _, state, *_ in koupai_members)
+            base_score, koupai_type = get_koupai_base_score(group_config, msg_content, has_task, fixed_num)
+            add_with_timestamp(redis_conn, group_wxid, f"{member_wxid}", msg_content=koupai_type, current_hour = (current_hour+1)%24, base_score = base_score,
+                               arrival_us = kwargs.get("arrival_us"))
 
             # 获取正分的成员（因为负分为买89，不参与扣排人数限制）
-            current_date = datetime.now().strftime("%Y-%m-%d")
-            current_members = redis_conn.zcount(f"tasks:launch_tasks:{current_date}:{group_wxid}:{(current_hour+1)%24}", 0, float('inf'))
+            current_members = redis_conn.zcount(task_key, 0, float('inf'))
             # return f"成员{member_wxid}已添加到扣排任务列表{group_wxid}"
             # 当采用 手速 扣排达到人数上限的时候，删除扣排阶段队列，添加任务阶段队列
             if current_members >= member_limit:
@@ -313,27 +248,33 @@ def add_koupai_member(group_wxid: str, member_wxid: str, msg_content: str = "p",
                 if has_task:
                     #移扣排队列中对应id
                     redis_conn.srem(f"tasks:launch_tasks:koupai_tasks_list", f"{group_wxid}:{(current_hour+1)%24}")
-                    print(f"尝试添加任务")
                     #在任务列表单里添加任务id
                     redis_conn.sadd(f"tasks:launch_tasks:renwu_tasks_list", f"{group_wxid}:{(current_hour+1)%24}")
-                hosts_config = get_group_hosts_config(redis_conn, group_wxid, current_hour)
-                hsot_desc = hosts_config["host_desc"]
-                tasks_members = get_group_task_members(redis_conn, group_wxid, current_hour)
-                # tasks_members: [('wxid_2tkacjo984zq22', 'p'), ('wxid_dofg3jonqvre22', 'p')]
-                print(f"当前tasks_members: {tasks_members}")
-                tasks_members_desc = "\r".join(
-                    f"{i+1}. {at_user(member)}({koupai_type})"
-                    for i, (member, koupai_type, score, state, _, _, _) in enumerate(tasks_members)
-                )
-                ending = f"\r当前已满 可扣任务" if has_task else ""
-                send_message(group_wxid, f"主持: {hsot_desc}\r"
-                                        f"时间: {(current_hour+1)%24}-{((current_hour+2)%24)}\r"
-                                        f"当前麦序:\r"
-                                        f"{tasks_members_desc}\r"
-                                        f"  \\uD83C\\uDE35"
-                                        f"{ending}")
+                notify_koupai_full(group_wxid, current_hour, has_task)
     except Exception as e:
         logger.error(f"添加成员{member_wxid}到扣牌任务列表{group_wxid}时出错: {e}")
+@tracer.trace()
+def notify_koupai_full(group_wxid: str, current_hour: int, has_task: bool):
+    """
+    发送扣排已满时的当前麦序（同步任务与快速通道共用）
+    """
+    redis_conn = get_redis_connection(0)
+    hosts_config = get_group_hosts_config(redis_conn, group_wxid, current_hour)
+    hsot_desc = hosts_config["host_desc"]
+    tasks_members = get_group_task_members(redis_conn, group_wxid, current_hour)
+    # tasks_members: [('wxid_2tkacjo984zq22', 'p'), ('wxid_dofg3jonqvre22', 'p')]
+    logger.debug("当前麦序", extra={"group": group_wxid, "tasks_members": tasks_members})
+    tasks_members_desc = "\r".join(
+        f"{i+1}. {at_user(member)}({koupai_type})"
+        for i, (member, koupai_type, score, state, _, _, _) in enumerate(tasks_members)
+    )
+    ending = f"\r当前已满 可扣任务" if has_task else ""
+    send_message(group_wxid, f"主持: {hsot_desc}\r"
+                            f"时间: {(current_hour+1)%24}-{((current_hour+2)%24)}\r"
+                            f"当前麦序:\r"
+                            f"{tasks_members_desc}\r"
+                            f"  \\uD83C\\uDE35"
+                            f"{ending}")
 @celery_app.task
 def update_koupai_member(group_wxid: str, member_wxid: str, msg_content: str, **kwargs):
     """
@@ -341,85 +282,92 @@ def update_koupai_member(group_wxid: str, member_wxid: str, msg_content: str, **
     """
     try:
         redis_conn = get_redis_connection(0)
-        current_hour = datetime.now().hour
+        current_hour = clock.now().hour
         has_renwu = redis_conn.sismember(f"tasks:launch_tasks:renwu_tasks_list", f"{group_wxid}:{(current_hour+1)%24}")
         if has_renwu:
             limit_koupai = int(redis_conn.hget(f"groups_config:{group_wxid}", "limit_koupai"))
             base_score = get_renwu_dict(get_renwu_list(redis_conn, group_wxid)).get(msg_content, 0)
             # 添加成员并返回是否有踢出成员
-            exit_member =add_with_timestamp(redis_conn, group_wxid, f"{member_wxid}", current_hour = (current_hour+1)%24, base_score = base_score, msg_content = msg_content, limit_koupai = limit_koupai)
-            tasks_members = get_group_task_members(redis_conn, group_wxid, current_hour)
-            print(f"tasks_members: {tasks_members}")
-
-
-            tasks_members_desc = "\r".join(
-                f"{i+1}. @{get_member_nick(group_wxid, member)}({koupai_type})"
-                for i, (member, koupai_type, score, state, _, _, _) in enumerate(tasks_members)
-            )
-            # 当出现exit_member时，说明有成员被挤出去了。
-            if not exit_member or limit_koupai == len(tasks_members):
-                send_message(group_wxid, f"当前麦序:\r"
-                                        f"{tasks_members_desc}\r"
-                                        f" {emoji_map.get('full', '')}\r"
-                                        f"当前已满 可扣任务")
-                time.sleep(1) #延迟一秒后@被挤出去的成员。
-                # 如果被挤出去的成员不是当前成员，才@被挤出去的成员
-                if exit_member != member_wxid and not exit_member:
-                    send_message(group_wxid, f"{get_member_nick(member_wxid)} {msg_content} 顶 {at_user(exit_member)}")
+            exit_member =add_with_timestamp(redis_conn, group_wxid, f"{member_wxid}", current_hour = (current_hour+1)%24, base_score = base_score, msg_content = msg_content, limit_koupai = limit_koupai,
+                                            arrival_us = kwargs.get("arrival_us"))
+            notify_koupai_update(group_wxid, member_wxid, msg_content, exit_member, current_hour, limit_koupai)
     except Exception as e:
         logger.error(f"更新成员{member_wxid}在扣排任务列表{group_wxid}时出错: {e}")
+@tracer.trace()
+def notify_koupai_update(group_wxid: str, member_wxid: str, msg_content: str, exit_member: str, current_hour: int, limit_koupai: int):
+    """
+    发送扣任务后的当前麦序，以及被顶出去的成员（同步任务与快速通道共用）
+    """
+    redis_conn = get_redis_connection(0)
+    tasks_members = get_group_task_members(redis_conn, group_wxid, current_hour)
+    logger.debug("当前麦序", extra={"group": group_wxid, "tasks_members": tasks_members})
+
+    nicks = get_member_nicks(group_wxid, [member for member, *_ in tasks_members])
+    tasks_members_desc = "\r".join(
+        f"{i+1}. @{nicks[member]}({koupai_type})"
+        for i, (member, koupai_type, score, state, _, _, _) in enumerate(tasks_members)
+    )
+    # 当出现exit_member时，说明有成员被挤出去了。
+    if not exit_member or limit_koupai == len(tasks_members):
+        send_message(group_wxid, f"当前麦序:\r"
+                                f"{tasks_members_desc}\r"
+                                f" {emoji_map.get('full', '')}\r"
+                                f"当前已满 可扣任务")
+        # 如果被挤出去的成员不是当前成员，才@被挤出去的成员
+        if exit_member and exit_member != member_wxid:
+            # 与当前麦序合并为一条消息发送，不再阻塞等待；使用与当前麦序相同的优先级，不合并时也排在当前麦序之后
+            send_message(group_wxid, f"{get_member_nick(group_wxid, member_wxid)} {msg_content} 顶 {at_user(exit_member)}")
 @celery_app.task()
 def add_mai89_member(group_wxid: str, member_wxid: str, msg_content: str, **kwargs):
     """
     添加指定群组的买89成员。只能有一个，且不影响原来的麦序成员。
     """
     try:
-        print(f"添加买89成员{member_wxid}到群组{group_wxid}")
+        logger.debug("添加买89成员", extra={"group": group_wxid, "member": member_wxid})
         redis_conn = get_redis_connection(0)
-        current_hour = datetime.now().hour
+        current_hour = clock.now().hour
         has_renwu = redis_conn.sismember(f"tasks:launch_tasks:renwu_tasks_list", f"{group_wxid}:{(current_hour+1)%24}")
         if has_renwu:
-            # 当成员已经在task_members中时，不允许重复添加
-            tasks_members = get_group_task_members(redis_conn, group_wxid, current_hour)
-            if any(member == member_wxid for member, _, _, _, _, _, _ in tasks_members):
-                send_message(group_wxid, f"{get_member_nick(group_wxid, member_wxid)} 已经在扣排任务列表中")
+            # 当成员已经在扣排队列中时（带走的成员除外），不允许重复添加
+            member_info = get_member(redis_conn, group_wxid, member_wxid, (current_hour+1)%24)
+            if member_info and member_info[2] != "带走":
+                send_message(group_wxid, f"{get_member_nick(group_wxid, member_wxid)} 已经在扣排任务列表中", priority=PRIORITY_URGENT)
                 return
-            part = msg_content.replace("买8", "").strip() if msg_content.startswith("买8") else msg_content.replace("买9", "").strip()
-            base_score = get_renwu_dict(get_renwu_list(redis_conn, group_wxid)).get(part, 0)
+            mai_type, mai_content, base_score = get_mai89_score(msg_content, get_renwu_list(redis_conn, group_wxid))
             if base_score == 0:
-                send_message(group_wxid, f"{get_member_nick(group_wxid, member_wxid)} 输入不符合任务设置。请检查输入")
+                send_message(group_wxid, f"{get_member_nick(group_wxid, member_wxid)} 输入不符合任务设置。请检查输入", priority=PRIORITY_URGENT)
                 return
-            mai_type = f"p8" if msg_content.startswith("买8") else f"p9"
-            mai_content = f"{mai_type} {part}"
-            # 如果是买9，base_score要额外-500，因为我们规定买9要在买8下面
-            if mai_type == "p8":
-                base_score = base_score - 200
-            if mai_type == "p9":
-                base_score = base_score - 1000
             group_config = get_group_config(redis_conn, group_wxid)
-            hosts_config = get_group_hosts_config(redis_conn, group_wxid, current_hour)
             limit_koupai = int(group_config.get("limit_koupai", 0))
             # 添加并获取被t出去的成员
-            exit_member = add_with_timestamp(redis_conn, group_wxid, member_wxid, current_hour = (current_hour+1)%24, base_score = base_score, msg_content = mai_content, limit_koupai = limit_koupai, mai_type = mai_type)
-            
-            if exit_member:
-                send_message(group_wxid, f"{at_user(member_wxid)} {mai_content} 顶 {at_user(exit_member)}")
-            # 更新买89后打印当前麦序
-            tasks_members = get_group_task_members(redis_conn, group_wxid, current_hour)
-            hosts_config = get_group_config(redis_conn, group_wxid).get("hosts_config", {})
-            maixu_desc = "\r".join(
-                f"{i+1}. @{get_member_nick(group_wxid, member)}({koupai_type})"
-                for i, (member, koupai_type, score, state, _, _, _) in enumerate(tasks_members)
-            )
-            
-            send_message(group_wxid, f"主持:{hosts_config.get('host_desc', '')}\r"
-                                     f"时间:{current_hour+1}-{current_hour+2}\r"
-                                     f"{maixu_desc}\r"
-                                     f" {emoji_map.get('full', '')}\r"
-                                     f"当前已满 可扣任务")
+            exit_member = add_with_timestamp(redis_conn, group_wxid, member_wxid, current_hour = (current_hour+1)%24, base_score = base_score, msg_content = mai_content, limit_koupai = limit_koupai, mai_type = mai_type,
+                                             arrival_us = kwargs.get("arrival_us"))
+            notify_mai89(group_wxid, member_wxid, mai_content, exit_member, current_hour)
 
     except Exception as e:
         logger.error(f"添加成员{member_wxid}到买89任务列表{group_wxid}时出错: {e}")
+@tracer.trace()
+def notify_mai89(group_wxid: str, member_wxid: str, mai_content: str, exit_member: str, current_hour: int):
+    """
+    发送买89顶掉的成员和当前麦序（同步任务与快速通道共用）
+    """
+    redis_conn = get_redis_connection(0)
+    if exit_member:
+        send_message(group_wxid, f"{at_user(member_wxid)} {mai_content} 顶 {at_user(exit_member)}", priority=PRIORITY_URGENT)
+    # 更新买89后打印当前麦序
+    tasks_members = get_group_task_members(redis_conn, group_wxid, current_hour)
+    hosts_config = get_group_config(redis_conn, group_wxid).get("hosts_config", {})
+    nicks = get_member_nicks(group_wxid, [member for member, *_ in tasks_members])
+    maixu_desc = "\r".join(
+        f"{i+1}. @{nicks[member]}({koupai_type})"
+        for i, (member, koupai_type, score, state, _, _, _) in enumerate(tasks_members)
+    )
+    
+    send_message(group_wxid, f"主持:{hosts_config.get('host_desc', '')}\r"
+                             f"时间:{current_hour+1}-{current_hour+2}\r"
+                             f"{maixu_desc}\r"
+                             f" {emoji_map.get('full', '')}\r"
+                             f"当前已满 可扣任务")
 
 @celery_app.task
 def add_daizou_member(group_wxid:str, member_wxid:str):
@@ -429,16 +377,17 @@ def add_daizou_member(group_wxid:str, member_wxid:str):
     """
     try:
         redis_conn = get_redis_connection(0)
-        current_hour = datetime.now().hour
-        task_members = get_group_task_members(redis_conn, group_wxid, current_hour, with_daizou = False)
-        # 获取当前成员的扣排类型
-        koupai_type = next((koupai_type for member, koupai_type, score, state, _, _, _ in task_members if member == member_wxid), None)
+        current_hour = clock.now().hour
+        # 获取当前成员的扣排类型（已经带走的成员视为不在列表中）
+        member_info = get_member(redis_conn, group_wxid, member_wxid, (current_hour+1)%24)
+        koupai_type = member_info[0] if member_info and member_info[2] != "带走" else None
         if not koupai_type:
-            send_message(group_wxid, f"{get_member_nick(group_wxid, member_wxid)} 不在当前扣牌列表中")
+            send_message(group_wxid, f"{get_member_nick(group_wxid, member_wxid)} 不在当前扣牌列表中", priority=PRIORITY_URGENT)
             return
         # 将 "带走" 拼接到扣排类型后面
         koupai_type = f"{koupai_type}:带走"
-        add_with_timestamp(redis_conn, group_wxid, member_wxid, current_hour = (current_hour+1)%24, base_score = -1500, msg_content = koupai_type, limit_koupai = 0)
+        # mai_type 为 daizou 时不挤出其他成员
+        add_with_timestamp(redis_conn, group_wxid, member_wxid, current_hour = (current_hour+1)%24, base_score = TIER_DAIZOU, msg_content = koupai_type, limit_koupai = 0, mai_type = "daizou")
     except Exception as e:
         logger.error(f"添加成员{member_wxid}到待扣任务列表{group_wxid}时出错: {e}")
 
@@ -450,8 +399,8 @@ def delete_koupai_member(group_wxid: str, member_wxid: str, **kwargs):
     """
     try:
         redis_conn = get_redis_connection(0)
-        current_hour = datetime.now().hour
-        current_minute = datetime.now().minute
+        current_hour = clock.now().hour
+        current_minute = clock.now().minute
         group_config = get_group_config(redis_conn, group_wxid)
 
         # 获取 任务是否可取、手速是否可取、取排时间（为0默认为任意时间可取）、扣排人数
@@ -459,31 +408,29 @@ def delete_koupai_member(group_wxid: str, member_wxid: str, **kwargs):
         p_qu = int(group_config.get("p_qu", 0))
         qu_time = int(group_config.get("qu_time", 0))
         limit_koupai = int(group_config.get("limit_koupai", 0))
-        # 获取扣排队列（包括买89）中所有成员
-        task_members = get_group_task_members(redis_conn, group_wxid, current_hour)
-
-        # 获取成员的扣排类型
-        member_type = next((koupai_type for member, koupai_type, score, state, _, _, _ in task_members if member == member_wxid), None)
-        print(f"成员{member_wxid}的扣排类型: {member_type}")
+        # 通过成员索引获取成员的扣排类型（包括买89，不包括带走）
+        member_info = get_member(redis_conn, group_wxid, member_wxid, (current_hour+1)%24)
+        member_type = member_info[0] if member_info and member_info[2] != "带走" else None
+        logger.debug("成员的扣排类型", extra={"group": group_wxid, "member": member_wxid, "member_type": member_type})
         group_wxid_this = ""
         if not member_type:
-            send_message(group_wxid, f"{get_member_nick(group_wxid, member_wxid)} 不在扣牌列表中")
+            send_message(group_wxid, f"{get_member_nick(group_wxid, member_wxid)} 不在扣牌列表中", priority=PRIORITY_URGENT)
             return
         if member_type in ['p', 'P', '排', "手速"] and p_qu == 0:
-            send_message(group_wxid, f"群已设置手速不可取")
+            send_message(group_wxid, f"群已设置手速不可取", priority=PRIORITY_URGENT)
             return
         if member_type in group_config.get("renwu_desc", []) and renwu_qu == 0:
-            send_message(group_wxid, f"群已设置取任务不可取")
+            send_message(group_wxid, f"群已设置取任务不可取", priority=PRIORITY_URGENT)
             return
         if qu_time != 0 and current_minute > qu_time:
-            send_message(group_wxid, f"当前不是取排时间")
+            send_message(group_wxid, f"当前不是取排时间", priority=PRIORITY_URGENT)
             return
         remaining_members = delete_member(redis_conn, group_wxid, member_wxid, (current_hour+1)%24, limit_koupai)
-        print(f"剩余: {remaining_members}")
+        logger.debug("剩余成员数", extra={"group": group_wxid, "remaining_members": remaining_members})
         if remaining_members > 0:
             send_message(group_wxid, f"{get_member_nick(group_wxid, member_wxid)}你已取排成功\r"
-                                    f"当前{emoji_map.get('empty', '')}: {remaining_members}"
-                                )
+                                    f"当前{emoji_map.get('empty', '')}: {remaining_members}",
+                         priority=PRIORITY_URGENT)
         # 如果现在是取排时间内，则不需要执行后续操作
         if redis_conn.sismember(f"tasks:launch_tasks:renwu_tasks_list", f"{group_wxid}:{(current_hour+1)%24}"):
             return
@@ -491,7 +438,6 @@ def delete_koupai_member(group_wxid: str, member_wxid: str, **kwargs):
         # 先尝试获取当前成员的任务累积
         # 当member_type可以转化为float类型的时候才可以执行更新任务累积
         try:
-            print(f"member_type!!!: {member_type}")
             # 当member_type为p8或p9时，需要特殊处理（移除掉p8或p9）
             if member_type.startswith("p8") or member_type.startswith("p9"):
                 member_type = member_type.replace("p8", "").replace("p9", "")
@@ -531,22 +477,19 @@ def transfer_koupai_member(group_wxid: str, sender_wxid: str, to_wxid: str, msg_
     """
     try:
         if sender_wxid == to_wxid:
-            send_message(group_wxid, f"{at_user(sender_wxid)}\r不能转给自己")
+            send_message(group_wxid, f"{at_user(sender_wxid)}\r不能转给自己", priority=PRIORITY_URGENT)
             return
         redis_conn = get_redis_connection(0)
-        current_hour = datetime.now().hour
-        current_maixu = get_group_task_members(redis_conn, group_wxid, current_hour,)
-        for (member, koupai_type, score, state, _, _, _) in current_maixu:
-            # 如果存在sender_wxid，说明可转麦序
-            if member == sender_wxid:
-                member = to_wxid
-                koupai_type = msg_content
-                delete_member(redis_conn, group_wxid, sender_wxid, (current_hour+1)%24, limit_koupai=0)
-                add_with_timestamp(redis_conn, group_wxid, f"{to_wxid}", current_hour = (current_hour+1)%24, msg_content = msg_content, extend_score = score)
-                send_message(group_wxid, f"{at_user(sender_wxid)}已转麦序给{at_user(to_wxid)}")
-                break
+        current_hour = clock.now().hour
+        member_info = get_member(redis_conn, group_wxid, sender_wxid, (current_hour+1)%24)
+        # 如果存在sender_wxid（带走的成员除外），说明可转麦序
+        if member_info and member_info[2] != "带走":
+            _, score, _ = member_info
+            delete_member(redis_conn, group_wxid, sender_wxid, (current_hour+1)%24, limit_koupai=0)
+            add_with_timestamp(redis_conn, group_wxid, f"{to_wxid}", current_hour = (current_hour+1)%24, msg_content = msg_content, extend_score = score)
+            send_message(group_wxid, f"{at_user(sender_wxid)}已转麦序给{at_user(to_wxid)}", priority=PRIORITY_URGENT)
         else:
-            send_message(group_wxid, f"{at_user(sender_wxid)}\r不在当前麦序中")
+            send_message(group_wxid, f"{at_user(sender_wxid)}\r不在当前麦序中", priority=PRIORITY_URGENT)
     except Exception as e:
         logger.error(f"转麦序时出错: {e}")
 @celery_app.task
@@ -555,19 +498,18 @@ def check_koupai_member_limit(group_wxid: str, limit_koupai: int):
     检查扣排人数是否超过了设置人数，超过了则删除最小的正分扣排人员
     """
     redis_conn = get_redis_connection(0)
-    current_hour = datetime.now().hour
-    current_date = datetime.now().strftime("%Y-%m-%d")
+    current_hour = clock.now().hour
     # 获取群配置
     group_config = get_group_config(redis_conn, group_wxid)
-    key = f"tasks:launch_tasks:{group_wxid}:{current_hour}:{current_date}"
+    key = get_task_key(group_wxid, (current_hour+1)%24)
     # 获取正分扣排人数
     koupai_count = redis_conn.zcount(key, 0, float('inf'))
     if koupai_count > limit_koupai:
-        print(f"当前扣排人数: {koupai_count}, 限制人数: {limit_koupai}")
+        logger.debug("扣排人数超过限制", extra={"key": key, "koupai_count": koupai_count, "limit_koupai": limit_koupai})
         # 获取分数最小的正分扣排人员
         postive_min_members = redis_conn.zrangebyscore(key, 0, float('inf'), start=0, num=koupai_count - limit_koupai)
-        # 删除这些人员
-        redis_conn.zrem(key, *postive_min_members)
+        # 删除这些人员（同步成员索引）
+        remove_members(redis_conn, key, postive_min_members)
         
 
 
@@ -579,17 +521,18 @@ def get_current_maixu(group_wxid: str, **kwargs):
     """
     try:
         redis_conn = get_redis_connection(0)
-        current_hour = datetime.now().hour
+        current_hour = clock.now().hour
         current_maixu = get_group_task_members(redis_conn, group_wxid, current_hour)
-        print(f"current_maixu: {current_maixu}")
+        logger.debug("当前麦序", extra={"group": group_wxid, "tasks_members": current_maixu})
         current_desc = ''
+        nicks = get_member_nicks(group_wxid, [member for member, _, _, state, *_ in current_maixu if state != "作废"])
         for i, (member, koupai_type, score, state, _, _, _) in enumerate(current_maixu):
             if state != "作废":
-                current_desc += f"{i+1}. @{get_member_nick(group_wxid, member)}({koupai_type})\r"
+                current_desc += f"{i+1}. @{nicks[member]}({koupai_type})\r"
         if current_maixu and current_desc != '':
-            send_message(group_wxid, f"当前麦序：\r{current_desc}")
+            send_message(group_wxid, f"当前麦序：\r{current_desc}", priority=PRIORITY_URGENT)
         else:
-            send_message(group_wxid, "当前没有麦序")
+            send_message(group_wxid, "当前没有麦序", priority=PRIORITY_URGENT)
     except Exception as e:
         logger.error(f"查询当前麦序时出错: {e}")
 @celery_app.task
@@ -599,18 +542,17 @@ def add_bb_member(group_wxid: str, member_wxid: str, msg_content: str, **kwargs)
     """
     try:
         redis_conn = get_redis_connection(0)
-        current_hour = datetime.now().hour
-        current_minute = datetime.now().minute
-        current_date = datetime.now().strftime("%Y-%m-%d")
+        current_hour = clock.now().hour
+        current_minute = clock.now().minute
+        current_date = clock.now().strftime("%Y-%m-%d")
         # 获取报备相关内容
         group_config = get_group_config(redis_conn, group_wxid)
         bb_time = int(group_config.get("bb_time", 15))
         bb_limit = int(group_config.get("bb_limit", 2))
         bb_in_hour = int(group_config.get("bb_in_hour", "0"))
-        bb_timeout_desc = group_config.get("bb_timeout_desc", "您已超时。")
         # 获取指定群id下的报备列表
         bb_list = list(redis_conn.scan_iter(f"history:bb:{current_date}:{group_wxid}:{current_hour}:*"))
-        print(f"当前小时报备列表: {bb_list}")
+        logger.debug("当前小时报备列表", extra={"group": group_wxid, "bb_list": bb_list})
         # 获取还没回来的成员数量
         bb_sum = 0
         if bb_list:
@@ -620,56 +562,98 @@ def add_bb_member(group_wxid: str, member_wxid: str, msg_content: str, **kwargs)
                 if is_timeout == "0" and is_back == "0":
                     bb_sum += 1
         if bb_sum >= bb_limit:
-            send_message(group_wxid, f"已超过报备人数\r当前设置报备人数:{bb_limit}人")
+            send_message(group_wxid, f"已超过报备人数\r当前设置报备人数:{bb_limit}人", priority=PRIORITY_URGENT)
             return
         # 获取报备列表中当前小时成员的报备的次数
         bb_count = len(list(redis_conn.scan_iter(f"history:bb:{current_date}:{group_wxid}:{current_hour}:{member_wxid}:*")))
     
         # 检查是否超过了一小时内的报备次数
         if bb_in_hour <= bb_count:
-            send_message(group_wxid, f"已超过每小时报备次数\r当前设置小时报备次数:{bb_in_hour}次")
+            send_message(group_wxid, f"已超过每小时报备次数\r当前设置小时报备次数:{bb_in_hour}次", priority=PRIORITY_URGENT)
             return
         # 加入报备列表
         # 计算过期时间（datetime格式）
-        time_out = datetime.now() + timedelta(minutes=bb_time)
-        create_time = datetime.now()
+        time_out = clock.now() + timedelta(minutes=bb_time)
+        create_time = clock.now()
 
         key = f"history:bb:{current_date}:{group_wxid}:{current_hour}:{member_wxid}:{current_minute}"
         redis_conn.hset(key, mapping={
                     "group_wxid": group_wxid, "member_wxid": member_wxid, "msg_content": msg_content,
-                    "create_time": str(create_time),"back_time": "",
+                    "create_time": create_time.isoformat(),"back_time": "",
                     "is_timeout": "0", "is_back": "0"})
         # 添加群组成员报备（如果存在则更新）
         asyncio.run(group_repo.add_group_member_bb(group_wxid=group_wxid, member_wxid=member_wxid, msg_content=msg_content, create_time=create_time,is_timeout=0))
         
         # 发送报备成功消息
-        send_message(group_wxid, f"{at_user(member_wxid)}{bb_time}分钟之内回来，回厅再发一个“回”")
-        # 将过期时间转为utc时间
-        time_out_utc = time_out.utcfromtimestamp(time_out.timestamp())
-        print(f"过期时间(UTC): {time_out_utc} 本地时间: {time_out}")
-
-        # 将timeout任务添加到celery队列，到过期时间时候执行，并且指定task_id，方便我们控制
-        send_timeout_message.apply_async(args=[group_wxid, member_wxid, msg_content, create_time, bb_timeout_desc, key], 
-                                        eta=time_out_utc)
+        send_message(group_wxid, f"{at_user(member_wxid)}{bb_time}分钟之内回来，回厅再发一个“回”", priority=PRIORITY_URGENT)
+        logger.info("添加报备", extra=sampled("bb", group=group_wxid, member=member_wxid, time_out=time_out))
+        # 添加超时定时器，由 poll_bb_timers 到期后发送超时消息，回厅时取消
+        bb_timers.schedule(redis_conn, key, time_out.timestamp())
     except Exception as e:
         logger.error(f"添加报备时出错: {e}")
 
+def mark_bb_timeout(redis_conn, key: str, bb_timeout_desc: str = None):
+    """
+    报备到期：成员还没回来时标记为超时，并发送超时消息
+    """
+    bb_record = redis_conn.hgetall(key)
+    # 记录已被清理、已经回来或已经超时的不再处理
+    if not bb_record or bb_record.get("is_back") != "0" or bb_record.get("is_timeout") != "0":
+        return
+    group_wxid = bb_record["group_wxid"]
+    member_wxid = bb_record["member_wxid"]
+    if bb_timeout_desc is None:
+        bb_timeout_desc = redis_conn.hget(f"groups_config:{group_wxid}", "bb_timeout_desc") or "您已超时。"
+    # create_time 与添加报备时写入数据库的值保持一致，才能更新同一条记录
+    # （isoformat写入，微秒为0时不带小数部分；fromisoformat 同时兼容旧的 str() 格式）
+    create_time = datetime.fromisoformat(bb_record["create_time"])
+    # 先更新数据库（可重复执行），再标记为超时：中途出错时记录保持未超时，定时器租约到期后重新处理
+    asyncio.run(group_repo.add_group_member_bb(group_wxid=group_wxid, member_wxid=member_wxid, msg_content=bb_record.get("msg_content"), create_time=create_time, is_timeout=1))
+    redis_conn.hset(key, mapping={
+                "is_timeout": "1", "is_back": "0"})
+    send_message(group_wxid, f"{at_user(member_wxid)}{bb_timeout_desc}")
+
+@celery_app.task
+def poll_bb_timers():
+    """
+    轮询报备超时定时器，批量处理所有到期的报备
+    """
+    redis_conn = get_redis_connection(0)
+    while True:
+        keys = bb_timers.claim_due(redis_conn, BB_TIMER_BATCH, BB_TIMER_LEASE_SECONDS)
+        done = []
+        for key in keys:
+            try:
+                mark_bb_timeout(redis_conn, key)
+                done.append(key)
+            except Exception as e:
+                # 单个定时器出错不影响同一批的其他定时器；不确认，租约到期后重新领取
+                logger.error(f"发送报备超时消息时出错: {key} {e}")
+        bb_timers.ack(redis_conn, done)
+        if len(keys) < BB_TIMER_BATCH:
+            break
+
+@celery_app.task
+def flush_outbox():
+    """
+    按顺序补发发件箱中发送失败的消息（接口恢复后自动补发）
+    """
+    try:
+        redis_conn = get_redis_connection(0)
+        sent = outbox.flush(redis_conn, OUTBOX_FLUSH_BATCH)
+        if sent:
+            logger.info(f"补发消息{sent}条，剩余{outbox.pending(redis_conn)}条")
+    except Exception as e:
+        logger.error(f"补发消息时出错: {e}")
+
 @celery_app.task
 def send_timeout_message(group_wxid: str, member_wxid: str, msg_content: str, create_time: float, bb_timeout_desc: str, key: str, **kwargs):
     """
-    发送报备超时消息
+    发送报备超时消息（仅用于处理升级前已经提交的ETA任务，新的报备使用 bb_timers）
     """
     try:
         redis_conn = get_redis_connection(0)
-        # 如果没回来，才发送超时消息
-        is_back = redis_conn.hget(key, "is_back")
-        if is_back == "0":
-            # 标记为超时
-            redis_conn.hset(key, mapping={
-                        "is_timeout": "1", "is_back": "0"})
-            
-            asyncio.run(group_repo.add_group_member_bb(group_wxid=group_wxid, member_wxid=member_wxid, msg_content=msg_content, create_time=create_time, is_timeout=1))
-            send_message(group_wxid, f"{at_user(member_wxid)}{bb_timeout_desc}")    
+        mark_bb_timeout(redis_conn, key, bb_timeout_desc)
     except Exception as e:
         logger.error(f"发送报备超时消息时出错: {e}")
    
@@ -679,15 +663,15 @@ def delete_bb_member(group_wxid: str, member_wxid: str):
     删除报备
     """
     try:
-        print(f"删除报备: {group_wxid} {member_wxid}")
+        logger.info("删除报备", extra=sampled("bb", group=group_wxid, member=member_wxid))
         redis_conn = get_redis_connection(0)
         # 先删除超时任务
         # result = AsyncResult(f"send_timeout_{group_wxid}_{member_wxid}")
         # result.revoke(terminate=True)
 
-        current_hour = datetime.now().hour
-        current_minute = datetime.now().minute
-        current_date = datetime.now().strftime("%Y-%m-%d")
+        current_hour = clock.now().hour
+        current_minute = clock.now().minute
+        current_date = clock.now().strftime("%Y-%m-%d")
         # 获取列表
         bb_list = list(redis_conn.scan_iter(f"history:bb:{current_date}:{group_wxid}:{current_hour}:{member_wxid}:*"))
         # 如果没有，那再尝试获取上一小时的（因为时间可能跨小时了，注意0点）
@@ -695,30 +679,31 @@ def delete_bb_member(group_wxid: str, member_wxid: str):
             # 如果当前小时是0点，上一小时就是23点
             if current_hour == 0:
                 current_hour = 23
-                current_date = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+                current_date = (clock.now() - timedelta(days=1)).strftime("%Y-%m-%d")
             else:
                 current_hour -= 1
             bb_list = list(redis_conn.scan_iter(f"history:bb:{current_date}:{group_wxid}:{current_hour}:{member_wxid}:*"))
         if not bb_list:
-            send_message(group_wxid, f"{at_user(member_wxid)}当前没有报备记录。")
+            send_message(group_wxid, f"{at_user(member_wxid)}当前没有报备记录。", priority=PRIORITY_URGENT)
             return
         # 遍历列表，找到距离当前时间最近的项，即依据分钟排序
         # 找出list中分钟最大的项，即最近的项
         last_key = max(bb_list, key=lambda x: int(x.split(":")[-1]))
-        # 将其is_back设置为1
+        # 将其is_back设置为1，并取消超时定时器
         redis_conn.hset(last_key, "is_back", "1")
+        bb_timers.cancel(redis_conn, last_key)
         # 设置back_time为当前时间
-        back_time = datetime.now()
+        back_time = clock.now()
         redis_conn.hset(last_key, "back_time", back_time.strftime("%H:%M"))
 
         bb_back_desc = redis_conn.hget(f"groups_config:{group_wxid}", "bb_back_desc")
 
         # 获取create_time
-        create_time = datetime.strptime(redis_conn.hget(last_key, "create_time"), "%Y-%m-%d %H:%M:%S.%f")
+        create_time = datetime.fromisoformat(redis_conn.hget(last_key, "create_time"))
         # 获取msg_content
         msg_content = redis_conn.hget(last_key, "msg_content")
         asyncio.run(group_repo.add_group_member_bb(group_wxid=group_wxid, member_wxid=member_wxid, msg_content=msg_content, create_time=create_time, back_time=back_time))
-        send_message(group_wxid, f"{at_user(member_wxid)}{bb_back_desc}")
+        send_message(group_wxid, f"{at_user(member_wxid)}{bb_back_desc}", priority=PRIORITY_URGENT)
     except Exception as e:
         logger.error(f"删除报备时出错: {e}")
 
@@ -730,8 +715,8 @@ def send_task_schedule(group_wxid: str, current_hour: int):
     try:
 
         redis_conn = get_redis_connection(0)
-        date_last_hour = (datetime.now() - timedelta(hours=1)).strftime("%m-%d")
-        date_last_hour_year = (datetime.now() - timedelta(hours=1)).strftime("%Y-%m-%d")
+        date_last_hour = (clock.now() - timedelta(hours=1)).strftime("%m-%d")
+        date_last_hour_year = (clock.now() - timedelta(hours=1)).strftime("%Y-%m-%d")
         last_hour = (current_hour - 1) % 24
         last_hour_config = redis_conn.hgetall(f"tasks:hosts_tasks_config:{group_wxid}:{last_hour}")
         if not last_hour_config:
@@ -746,16 +731,17 @@ def send_task_schedule(group_wxid: str, current_hour: int):
         # 获取上场次的扣排麦序信息
         group_tasks_members = get_group_task_members(redis_conn, group_wxid, last_hour_start_schedule-1, last_hour_end_schedule, with_daizou=True)
         # 获取上场的扣排信息
-        print(f"上小时场次时间: {last_hour_start_schedule} - {last_hour_end_schedule}")
+        logger.debug("上小时场次时间", extra={"group": group_wxid, "start_schedule": last_hour_start_schedule, "end_schedule": last_hour_end_schedule})
         tasks_members = generate_task_members(group_tasks_members)
         
         # print(f"{last_hour_group_desc} 上场的扣排信息: {json.dumps(tasks_members, ensure_ascii=False)}")
         tasks_desc = "——麦序明细————"
-        print(f"{last_hour_group_desc} 上场的扣排信息: {tasks_members}")
+        logger.debug("上场的扣排信息", extra={"group": group_wxid, "host_desc": last_hour_group_desc, "tasks_members": tasks_members})
+        nicks = get_member_nicks(group_wxid, tasks_members.keys())
         for member_wxid, koupai_info in tasks_members.items():
             # 转化为 @昵称[扣排次数] 扣排详情(仅需要扣排类型)
-            nick_name = get_member_nick(group_wxid, member_wxid) or member_wxid
-            print(f"{nick_name} 扣排信息: {koupai_info}")
+            nick_name = nicks[member_wxid] or member_wxid
+            logger.debug("成员扣排信息", extra={"nick": nick_name, "koupai_info": koupai_info})
             tasks_desc += f"\r@{nick_name} [{len(koupai_info)}]  {'+'.join([item[0] for item in koupai_info])}"
         send_message(group_wxid, f"{emoji_map.get('schedule')} 打卡记录表\r"
                                 f"主持: {last_hour_group_desc}\r"
@@ -768,8 +754,8 @@ def send_task_schedule(group_wxid: str, current_hour: int):
                                 "【带走】\r"
                                 "【收光】\r"
                                 "【歌单】\r"
-                                "【黑麦】"
-                                )
+                                "【黑麦】",
+                         priority=PRIORITY_BULK)
 
     except Exception as e:
         logger.error(f"发送任务打卡记录时出错: {e}")
@@ -781,7 +767,7 @@ def send_task_schedule_day(group_wxid: str, start_hour: int = None, end_hour: in
     
     """
     try:
-        print(f"发送今日麦序记录（可选时间范围）: {group_wxid} {start_hour} {end_hour} {date}")
+        logger.info("发送今日麦序记录", extra={"group": group_wxid, "start_hour": start_hour, "end_hour": end_hour, "date": date})
         redis_conn = get_redis_connection(0)
         tasks_members = {}
         # 获取今日的场次时间
@@ -796,14 +782,14 @@ def send_task_schedule_day(group_wxid: str, start_hour: int = None, end_hour: in
         # 生成字典，key为成员id，value为扣排列表
         tasks_members = generate_task_members(group_tasks_members)
         # 生成的列表 仅需要@昵称：（次数）
-        task_desc = "\r".join([f"@{get_member_nick(group_wxid, member_wxid)} [{len(koupai_info)}]" for member_wxid, koupai_info in tasks_members.items()])
+        nicks = get_member_nicks(group_wxid, tasks_members.keys())
+        task_desc = "\r".join([f"@{nicks[member_wxid]} [{len(koupai_info)}]" for member_wxid, koupai_info in tasks_members.items()])
 
         date_desc = f"日期: {date}" if date != None else "今日"
         header = f"{date_desc}{start_hour}-{end_hour}场麦序统计" if (start_hour != None and end_hour != None) else f"{date_desc}麦序统计"
         send_message(group_wxid, f"{header}\r"
-                                 f"{task_desc}"
-                    
-                    )
+                                 f"{task_desc}",
+                         priority=PRIORITY_BULK)
 
     except Exception as e:
         logger.error(f"发送今日麦序记录时出错: {e}")
@@ -817,13 +803,13 @@ def save_task_schedule_day_history(cleanup: bool = True):
     try:
         redis_conn = get_redis_connection(0)
         # 存储今日麦序记录到历史记录，所以使用前一天日期
-        date = (datetime.now() - timedelta(hours=2)).strftime("%Y-%m-%d")
+        date = (clock.now() - timedelta(hours=2)).strftime("%Y-%m-%d")
         # 获取launch_tasks的所有key
         launch_tasks_keys_yesterday = redis_conn.scan_iter(f"tasks:launch_tasks:{date}:*")
         
         tasks_members = []
         for key in launch_tasks_keys_yesterday:
-            print(f"key: {key}")
+            logger.debug("复制麦序到数据库", extra={"key": key})
             # 拆分hour
             hour = key.split(":")[-1]
             # 拆分group_wxid(即倒数第二位)
@@ -844,7 +830,7 @@ def save_task_schedule_day_history(cleanup: bool = True):
         
         # 批量添加到数据库
         if tasks_members:
-            print(f"tasks_members: {tasks_members}")
+            logger.info("写入数据库的麦序", extra={"count": len(tasks_members)})
             asyncio.run(group_repo.add_group_members_tasks(tasks_members))
             logger.info(f"已添加 {len(tasks_members)} 条群成员扣排记录到数据库")
         else:
@@ -852,14 +838,16 @@ def save_task_schedule_day_history(cleanup: bool = True):
         
         if cleanup:
             # 清空所有7天前的launch_tasks缓存
-            date_7_days_ago = datetime.now() - timedelta(days=7)
+            date_7_days_ago = clock.now() - timedelta(days=7)
             expired_date = date_7_days_ago.strftime("%Y-%m-%d")
             # 获取所有launch_tasks缓存的键值
             launch_tasks_all_keys = redis_conn.scan_iter("tasks:launch_tasks:*")
+            # 获取所有扣排队列成员索引的键值
+            launch_index_all_keys = redis_conn.scan_iter("tasks:launch_index:*")
             # 获取所有bb缓存的键值
             bb_all_keys = redis_conn.scan_iter("history:bb:*")
 
-            all_keys = list(launch_tasks_all_keys) + list(bb_all_keys)
+            all_keys = list(launch_tasks_all_keys) + list(launch_index_all_keys) + list(bb_all_keys)
             keys_to_delete = []
 
             for key in all_keys:
@@ -867,7 +855,7 @@ def save_task_schedule_day_history(cleanup: bool = True):
                 # 拆分date
                 if len(parts) > 3:
                     key_date = parts[2]
-                    print(f"key_date: {key_date}")
+                    logger.debug("解析日期", extra={"key": key, "key_date": key_date})
                 else:
                     continue
                 # 转换为datetime对象
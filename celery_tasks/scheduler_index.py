@@ -0,0 +1,157 @@
+from datetime import datetime, timedelta
+from cache.redis_scripts import redis_scripts
+from common.clock import clock
+
+# 定时事件索引
+# 有序集合 成员为 "事件类型|group_wxid|触发小时"，分数为下一次触发的时间戳（秒）
+# 由 groups_config 和 tasks:hosts_tasks_config 生成，配置变更时重建对应群组的事件，
+# 每分钟的定时任务只领取到期的事件，开销与群组数量无关
+EVENTS_KEY = "tasks:schedule_events"
+# 每个群组当前拥有的事件集合，重建时用于移除已经不存在的事件
+GROUP_EVENTS_KEY = "tasks:schedule_events:group"
+# 拥有事件的群组集合
+EVENT_GROUPS_KEY = "tasks:schedule_events:groups"
+
+EVENT_START = "start"           # 开始扣排     send_koupai_task_start
+EVENT_END = "end"               # 扣排截止     send_koupai_task_end(end_koupai)
+EVENT_RENWU = "renwu"           # 任务截止     send_koupai_task_end(end_renwu)
+EVENT_SCHEDULE = "schedule"     # 上场打卡记录表 send_task_schedule
+# 打卡记录表在整点后第1分钟发送
+SCHEDULE_MINUTE = 1
+DAY_SECONDS = 24 * 3600
+
+
+def make_event(action: str, group_wxid: str, hour: int) -> str:
+    """生成事件成员"""
+    return f"{action}|{group_wxid}|{hour}"
+
+
+def parse_event(event: str) -> tuple:
+    """解析事件成员，返回 (事件类型, group_wxid, 触发小时)"""
+    action, group_wxid, hour = event.split("|")
+    return action, group_wxid, int(hour)
+
+
+def parse_minute(value) -> int:
+    """解析配置中的分钟，不在0-59之间时返回None（与原先按分钟逐个比较的行为一致）"""
+    try:
+        minute = int(value)
+    except (TypeError, ValueError):
+        return None
+    return minute if 0 <= minute <= 59 else None
+
+
+def get_group_events(redis_conn, group_wxid: str) -> dict:
+    """
+    根据群组配置生成该群组的所有事件
+    返回: {事件成员: (触发小时, 触发分钟)}
+    """
+    pipe = redis_conn.pipeline(transaction=False)
+    pipe.hmget(f"groups_config:{group_wxid}", "start_koupai", "end_koupai", "end_renwu")
+    for hour in range(24):
+        pipe.hmget(f"tasks:hosts_tasks_config:{group_wxid}:{hour}", "stage", "end_schedule")
+    (start_koupai, end_koupai, end_renwu), *hosts = pipe.execute()
+    minutes = {
+        EVENT_START: parse_minute(start_koupai),
+        EVENT_END: parse_minute(end_koupai),
+        EVENT_RENWU: parse_minute(end_renwu),
+    }
+    events = {}
+    for hour, (stage, end_schedule) in enumerate(hosts):
+        # 下一个小时为扣排场次时，在当前小时触发开始扣排、扣排截止、任务截止
+        if stage == "start":
+            fire_hour = (hour - 1) % 24
+            for action, minute in minutes.items():
+                if minute is not None:
+                    events[make_event(action, group_wxid, fire_hour)] = (fire_hour, minute)
+        # 场次在下一个小时结束时，在下一个小时发送上场打卡记录表
+        if end_schedule and int(end_schedule) % 24 == (hour + 1) % 24:
+            fire_hour = (hour + 1) % 24
+            events[make_event(EVENT_SCHEDULE, group_wxid, fire_hour)] = (fire_hour, SCHEDULE_MINUTE)
+    return events
+
+
+def next_fire_time(hour: int, minute: int, now: datetime) -> float:
+    """下一次触发的时间戳，当前分钟内的事件视为尚未触发"""
+    fire_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if fire_time < now.replace(second=0, microsecond=0):
+        fire_time += timedelta(days=1)
+    return fire_time.timestamp()
+
+
+def rebuild_group_events(redis_conn, group_wxid: str, now: datetime = None):
+    """重建指定群组的事件；触发时间未变化的事件保留原有分数，避免已触发的事件重复触发"""
+    now = now or clock.now()
+    events = get_group_events(redis_conn, group_wxid)
+    group_events_key = f"{GROUP_EVENTS_KEY}:{group_wxid}"
+    old_events = list(redis_conn.smembers(group_events_key))
+    old_scores = dict(zip(old_events, redis_conn.zmscore(EVENTS_KEY, old_events))) if old_events else {}
+    scores = {}
+    for event, (hour, minute) in events.items():
+        score = old_scores.get(event)
+        if score is not None:
+            fire_time = datetime.fromtimestamp(score)
+            if (fire_time.hour, fire_time.minute) == (hour, minute):
+                scores[event] = score
+                continue
+        scores[event] = next_fire_time(hour, minute, now)
+    pipe = redis_conn.pipeline()
+    removed = [event for event in old_events if event not in events]
+    if removed:
+        pipe.zrem(EVENTS_KEY, *removed)
+    pipe.delete(group_events_key)
+    if scores:
+        pipe.zadd(EVENTS_KEY, scores)
+        pipe.sadd(group_events_key, *scores)
+        pipe.sadd(EVENT_GROUPS_KEY, group_wxid)
+    else:
+        pipe.srem(EVENT_GROUPS_KEY, group_wxid)
+    pipe.execute()
+    return scores
+
+
+def remove_group_events(redis_conn, group_wxid: str):
+    """移除指定群组的所有事件"""
+    group_events_key = f"{GROUP_EVENTS_KEY}:{group_wxid}"
+    events = list(redis_conn.smembers(group_events_key))
+    pipe = redis_conn.pipeline()
+    if events:
+        pipe.zrem(EVENTS_KEY, *events)
+    pipe.delete(group_events_key)
+    pipe.srem(EVENT_GROUPS_KEY, group_wxid)
+    pipe.execute()
+
+
+def rebuild_all_events(redis_conn, now: datetime = None):
+    """重建所有扣排群组的事件，并移除已经不是扣排群组的事件"""
+    groups = set(redis_conn.smembers("groups_config:koupai_groups"))
+    for group_wxid in set(redis_conn.smembers(EVENT_GROUPS_KEY)) - groups:
+        remove_group_events(redis_conn, group_wxid)
+    for group_wxid in groups:
+        rebuild_group_events(redis_conn, group_wxid, now)
+
+
+def clear_all_events(redis_conn):
+    """清空所有事件"""
+    groups = list(redis_conn.smembers(EVENT_GROUPS_KEY))
+    redis_conn.delete(EVENTS_KEY, EVENT_GROUPS_KEY, *[f"{GROUP_EVENTS_KEY}:{group_wxid}" for group_wxid in groups])
+
+
+def claim_due_events(redis_conn, now: datetime = None) -> list:
+    """
+    领取所有到期的事件（领取后顺延到下一天）
+    返回: [(事件类型, group_wxid, 触发小时, 原定触发时间戳)]
+    """
+    now = now or clock.now()
+    due = redis_scripts.run(redis_conn, "claim_due_events", keys=[EVENTS_KEY], args=[now.timestamp(), DAY_SECONDS])
+    return [(*parse_event(event), float(score)) for event, score in zip(due[::2], due[1::2])]
+
+
+def restore_events(redis_conn, events: list):
+    """
+    恢复领取的事件的原定触发时间（任务发布失败时调用，下一次轮询在宽限时间内重新领取）
+    events: claim_due_events 返回的元素；重建时已经移除的事件不恢复
+    """
+    if events:
+        redis_conn.zadd(EVENTS_KEY, {make_event(action, group_wxid, hour): fire_time
+                                     for action, group_wxid, hour, fire_time in events}, xx=True)
@@ -2,108 +2,91 @@ import time
 import redis
 from datetime import datetime, timedelta
 from db.repository import group_repo
+from cache.redis_scripts import redis_scripts
+from common.clock import clock
+from common.metrics import QUEUE_ADDS
+from common.tracing import tracer
+from common.score_codec import (encode_score, tier_bounds, tier_min, tier_name, upgrade_legacy_score, MAI8_RANGE, MAI9_RANGE,
+                                TIER_SPEED, TIER_FIXED_SPEED, TIER_MAI8, TIER_MAI9, TIER_MIN, LEGACY_LIMIT)
 import asyncio
-def get_next_hour_group(redis_conn, groups_wxid: list, current_hour: int) -> list:
-    """检查符合下一个小时扣排任务的群组"""
-    valid_groups = []
-    task_hour = (current_hour + 1) % 24
-    for group_wxid in groups_wxid:
-        # 先检测stage是否为start ，如果不是则跳过
-        # 不论是发送截止还是扣排任务，都需要检测stage是否为start
-        if redis_conn.hget(f"tasks:hosts_tasks_config:{group_wxid}:{task_hour}", "stage") != "start":
-            print(f"群组 {group_wxid} 下一个小时 {task_hour} 不是扣牌时间")
-            continue
-        field = f"tasks:hosts_tasks_config:{group_wxid}:{task_hour}"
-        # print(f"field: {field}")
-        check_hour = redis_conn.scan_iter(field)
-        if not check_hour:
-            continue
-        valid_groups.append(group_wxid)
-    return valid_groups
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 使用扣排分数的有序集合：当天的扣排队列和保留7天的历史麦序
+SCORED_QUEUE_PATTERNS = ("tasks:launch_tasks:*", "history:tasks:*")
 
-def get_next_minute_group(redis_conn, groups_wxid: list, current_minute: int, field: str) -> list:
-    """检查符合下一个分钟扣排任务的群组"""
-    valid_groups = []
-    task_minute = (current_minute) % 60
-    for group_wxid in groups_wxid:
-        key = f"groups_config:{group_wxid}"
-        # print(f"field: {key}")
-        check_minute = (redis_conn.hget(key, field) == str(task_minute))
-        print(f"群组 {group_wxid} 下一个分钟 {task_minute} 检查结果 {check_minute}")
-        # print(f"!!!!check_minute: {check_minute}")
-        if check_minute:
-            valid_groups.append(group_wxid)
-    return valid_groups
-def get_next_schedule_group(redis_conn, groups_wxid:list, current_hour:int) -> list:
-    """检查符合发送打卡记录表的群组"""
-    valid_groups = []
-    for group_wxid in groups_wxid:
-        last_hour = (current_hour - 1) % 24
-        key_last_hour = f"tasks:hosts_tasks_config:{group_wxid}:{last_hour}"
-        end_schedule = redis_conn.hget(key_last_hour, "end_schedule")
-        # 如果从配置中读取到end_schedule为当前小时，则说明上场次结束，需要发送上场打卡记录表
-        if end_schedule:
-            if int(end_schedule) % 24 == current_hour:
-                valid_groups.append(group_wxid)
-    print(f"符合发送打卡记录表的群组: {valid_groups}")
-    return valid_groups
-def add_with_timestamp(redis_conn, group_wxid: str, member_wxid:str, base_score:float = 0, msg_content: str = "", limit_koupai: int = 8, mai_type:str = "", **kwargs) -> str:
-    """添加成员到有序集合，分数为当前时间戳。无论如何，不带base_score的分数始终低于带base_score，返回被挤出去的成员"""
-    print(f"进入add_with_timestamp: {kwargs}")
-    current_date = datetime.now().strftime("%Y-%m-%d")
-    cureent_time = time.time()
-    MAX_TIME = 4102444800  # 2100-01-01 的时间戳
-    
-    time_score = MAX_TIME - cureent_time
-    # 截取整数前四位，即时间10000秒内的排序
-    minute_part = time_score%10000
-    
-    score = kwargs.get('extend_score', base_score + minute_part / 10000 ) if msg_content != "固定手速" else base_score
-    # key
-    task_key = f"tasks:launch_tasks:{current_date}:{group_wxid}:{kwargs.get('current_hour', '')}"
-    # 先尝试移除对应的成员（带p）
-    #  redis_conn.zrem(task_key, f"{member_wxid}:p")
-    # 获取限制人数内的成员，因为会有在范围内重复打榜的可能
-    members = redis_conn.zrange(task_key, 0, limit_koupai-1)
-    # 移除 member_wxid:*的成员
-    for member in members:
-        if member.startswith(f"{member_wxid}:"):
-            redis_conn.zrem(task_key, member)
-    
-    redis_conn.zadd(task_key, {f"{member_wxid}:{msg_content}": score})    
-    # 当限制人数小于正分成员人数的时候，需要移除分数最低的正分成员（即被挤出去的成员）
-    # 当 mai_type 为空时，需要移除分数最低的正分成员（即被挤出去的成员）
-    if not mai_type:
-        
-        if limit_koupai < redis_conn.zcount(task_key, 0, float('inf')):
-            
-            positive_min_member = redis_conn.zrangebyscore(task_key, 0, float('inf'), start=0, num=1) 
-            print(f"positive_min_member: {positive_min_member}")
-            # 移除分数最低的正分成员（即被挤出去的成员）
-            if positive_min_member:
-                redis_conn.zrem(task_key, positive_min_member[0])
-                # 返回被挤出去的成员
-                print(f"被挤出去的正分成员: {positive_min_member[0].split(':')[0]}")
-                return positive_min_member[0].split(":")[0]
-    
-    if mai_type == "p8" or mai_type == "p9":
-        # 当负分范围在-200~0 的成员数量 > 1时，移除分数最小的负分成员
-        # mai8 负分范围在-200~0
-        # mai9 负分范围在 -1000~-500
-        print(f"mai_type: {mai_type}")
-        min_score = -200 if mai_type == "p8" else -1000
-        max_score = 0 if mai_type == "p8" else -500
-        if redis_conn.zcount(task_key, min_score, max_score) > 1:
-            negative_min_member = redis_conn.zrangebyscore(task_key, min=min_score, max=max_score, start=0, num=1)
-            print(f"negative_min_member: {negative_min_member}")
 
-            # 移除分数最小的负分成员（即被挤出去的成员）
-            if negative_min_member:
-                redis_conn.zrem(task_key, negative_min_member[0])
-                # 返回被挤出去的成员
-                print(f"被挤出去的负分成员: {negative_min_member[0].split(':')[0]}")
-                return negative_min_member[0].split(":")[0]
-    return ""
+def get_task_key(group_wxid: str, current_hour: int, current_date: str = None) -> str:
+    """获取扣排队列的key"""
+    if not current_date:
+        current_date = clock.now().strftime("%Y-%m-%d")
+    return f"tasks:launch_tasks:{current_date}:{group_wxid}:{current_hour}"
+def get_task_index_key(task_key: str) -> str:
+    """获取扣排队列对应的成员索引key（hash: member_wxid -> 成员字符串）"""
+    return task_key.replace("tasks:launch_tasks:", "tasks:launch_index:", 1)
+def upgrade_legacy_scores(redis_conn) -> int:
+    """
+    将扣排队列和历史麦序中的v0分数一次性转换为v1（档位范围的查询只适用于v1分数）
+    已经是v1的分数不变，重复调用没有影响
+    返回: 转换的成员数量
+    """
+    upgraded = 0
+    for pattern in SCORED_QUEUE_PATTERNS:
+        for key in redis_conn.scan_iter(pattern, count=1000, _type="zset"):
+            legacy = redis_conn.zrangebyscore(key, f"({-LEGACY_LIMIT}", f"({LEGACY_LIMIT}", withscores=True)
+            args = []
+            for member, score in legacy:
+                try:
+                    args.extend([member, repr(score), upgrade_legacy_score(score)])
+                except ValueError as e:
+                    logger.warning(f"无法转换分数 {key} {member}: {e}")
+            if args:
+                upgraded += redis_scripts.run(redis_conn, "upgrade_legacy_scores", keys=[key], args=args)
+    return upgraded
+def get_member(redis_conn, group_wxid: str, member_wxid: str, current_hour: int, current_date: str = None):
+    """
+    通过成员索引查询成员在扣排队列中的信息
+    返回: (扣排类型, 分数, 状态)，不在队列中返回None
+    """
+    key = get_task_key(group_wxid, current_hour, current_date)
+    result = redis_scripts.run(redis_conn, "get_member", keys=[key, get_task_index_key(key)], args=[member_wxid])
+    if not result:
+        return None
+    member, score = result
+    parts = member.split(":")
+    return parts[1], float(score), parts[2] if len(parts) > 2 else ""
+def build_add_member_args(group_wxid: str, member_wxid: str, base_score: float = 0, msg_content: str = "", limit_koupai: int = 8, mai_type: str = "", **kwargs) -> tuple:
+    """
+    生成add_with_timestamp脚本的keys和args（同步任务与快速通道共用）
+    分数由基础分和到达时间编码（见common.score_codec）
+    """
+    current_date = clock.now().strftime("%Y-%m-%d")
+    # 优先使用回调入口记录的到达时间，没有时使用当前时间
+    arrival_us = kwargs.get('arrival_us') or int(clock.time() * 1_000_000)
+    # extend_score 为转麦序时沿用原成员的分数
+    score = kwargs.get('extend_score', encode_score(base_score, arrival_us, current_date))
+    QUEUE_ADDS.inc(tier="extend" if 'extend_score' in kwargs else tier_name(base_score))
+    # key
+    task_key = get_task_key(group_wxid, kwargs.get('current_hour', ''), current_date)
+    # 买8 档位范围在-200~0，买9 档位范围在 -1000~-500
+    min_score, max_score = tier_bounds(*(MAI8_RANGE if mai_type == "p8" else MAI9_RANGE))
+    keys = [task_key, get_task_index_key(task_key)]
+    args = [member_wxid, f"{member_wxid}:{msg_content}", repr(score), limit_koupai, mai_type, min_score, max_score]
+    return keys, args
+@tracer.trace()
+def add_with_timestamp(redis_conn, group_wxid: str, member_wxid:str, base_score:float = 0, msg_content: str = "", limit_koupai: int = 8, mai_type:str = "", **kwargs) -> str:
+    """
+    添加成员到有序集合，分数由基础分和到达时间编码（见common.score_codec）。
+    无论如何，低档位的分数始终低于高档位，同档位先到的分数更高，返回被挤出去的成员
+    """
+    logger.debug("进入add_with_timestamp", extra={"group": group_wxid, "member": member_wxid, "params": kwargs})
+    keys, args = build_add_member_args(group_wxid, member_wxid, base_score, msg_content, limit_koupai, mai_type, **kwargs)
+    # 替换已有成员、添加、挤出超出人数的成员在同一个脚本中原子执行（一次往返）
+    exit_member, _ = redis_scripts.run(redis_conn, "add_with_timestamp", keys=keys, args=args)
+    if exit_member:
+        logger.info("被挤出去的成员: %s", exit_member, extra={"group": group_wxid, "member": member_wxid})
+    return exit_member or ""
 
     # time.sleep(0.0001)
 def delete_member(redis_conn, group_wxid: str, member_wxid: str, current_hour: int, limit_koupai: int = 8) -> int:
@@ -111,32 +94,31 @@ def delete_member(redis_conn, group_wxid: str, member_wxid: str, current_hour: i
     删除成员从有序集合
     返回剩余成员数量
     """
-    # 先尝试获得所有成员
-    print(f"delete_member: [{member_wxid}]")
-    current_date = datetime.now().strftime("%Y-%m-%d")
-    key = f"tasks:launch_tasks:{current_date}:{group_wxid}:{current_hour}"
-    members = redis_conn.zrange(key, 0, limit_koupai-1)
-    # 删除所有包含 member_wxid 的成员
+    logger.debug("删除成员", extra={"member": member_wxid})
+    key = get_task_key(group_wxid, current_hour)
+    # 通过成员索引删除，返回空余正分成员数量
+    positive_count = redis_scripts.run(redis_conn, "remove_member", keys=[key, get_task_index_key(key)], args=[member_wxid])
+    return limit_koupai - positive_count
+def remove_members(redis_conn, key: str, members: list):
+    """从扣排队列中移除多个成员字符串，并同步成员索引"""
+    if not members:
+        return
+    index_key = get_task_index_key(key)
+    pipe = redis_conn.pipeline()
+    pipe.zrem(key, *members)
     for member in members:
-        if member.startswith(f"{member_wxid}:"):
-            redis_conn.zrem(key, member)
-    # 返回空余正分成员数量
-    return limit_koupai - redis_conn.zcount(key, 0, float('inf'))
+        pipe.hdel(index_key, member.split(":")[0])
+    pipe.execute()
 def delete_members(redis_conn, group_wxid: str, current_hour: int, count: int = 1, current_date: str = None):
     """
-    删除多个成员从有序集合(从最分数为-1000以上的开始删除，从小到大)
+    删除多个成员从有序集合(从买9档位以上的开始删除，从小到大)
     将删除的成员member后缀改为:作废
     返回剩余成员数量
     """
     # 如果没有指定日期，默认使用当前日期
-    if not current_date:
-        current_date = datetime.now().strftime("%Y-%m-%d")
-
-    key = f"tasks:launch_tasks:{current_date}:{group_wxid}:{current_hour}"
-    print(f"key: {key}")
-    
-    min_members = redis_conn.zrangebyscore(key, min=-1000, max=float('inf'), start=0, num=count, withscores=True)
-    print(f"min_members: {min_members}")
+    key = get_task_key(group_wxid, current_hour, current_date)
+    min_members = redis_conn.zrangebyscore(key, min=tier_min(TIER_MAI9), max=float('inf'), start=0, num=count, withscores=True)
+    logger.debug("分数最低的成员", extra={"key": key, "min_members": min_members})
     for member, score in min_members:
         member_wxid = member.split(":")[0]
         # 提取koupai_type和state
@@ -148,10 +130,13 @@ def delete_members(redis_conn, group_wxid: str, current_hour: int, count: int =
         # 当存在p8或者p9时候(p8 1.0这种)，移除p8 p9前缀
         if koupai_type.startswith(("p8", "p9")):
             koupai_type_score = koupai_type.replace("p8", "").replace("p9", "")
-        print(f"koupai_type_score: {koupai_type_score}")
+        logger.debug("扣排分数", extra={"koupai_type_score": koupai_type_score})
         # 将删除的成员member后的state改为:作废
-        redis_conn.zrem(key, member)
-        redis_conn.zadd(key, {f"{member_wxid}:{koupai_type}:作废": score})
+        pipe = redis_conn.pipeline()
+        pipe.zrem(key, member)
+        pipe.zadd(key, {f"{member_wxid}:{koupai_type}:作废": score})
+        pipe.hset(get_task_index_key(key), member_wxid, f"{member_wxid}:{koupai_type}:作废")
+        pipe.execute()
         # 尝试把koupai_type_score转化为float，失败则保持原字符串
         try:
             koupai_type_score = float(koupai_type_score)
@@ -167,13 +152,12 @@ def delete_members(redis_conn, group_wxid: str, current_hour: int, count: int =
 def get_group_config(redis_conn, group_wxid: str) -> dict:
     """获取群组的配置"""
     config = redis_conn.hgetall(f"groups_config:{group_wxid}")
-    print(f"group config: {config}")
-    
+    logger.debug("group config", extra={"group": group_wxid, "config": config})
     return config
 def get_group_hosts_config(redis_conn, group_wxid: str, current_hour: int) -> dict:
     """获取群组的扣排配置"""
     config = redis_conn.hgetall(f"tasks:hosts_tasks_config:{group_wxid}:{(current_hour+1)%24}")
-    print(f"hosts config: {config}")
+    logger.debug("hosts config", extra={"group": group_wxid, "config": config})
     return config
 
 def get_group_hosts_all(redis_conn, group_wxid: str) -> list:
@@ -196,36 +180,33 @@ def get_group_task_members(redis_conn, group_wxid: str, current_hour: int, end_h
     返回: 群组的扣排麦序信息列表，每个元素为 (成员id, 任务类型, 分数, 状态)
     """
     # 当end_hour为24时，使用前一天日期，否则使用当前日期（一般出现end_hour的时候为 发送打卡记录表才会使用。当end_hour为24时，一般是发送前一天指定时间段的打卡记录）
-    current_date = datetime.now().strftime("%Y-%m-%d") if end_hour != 24 else (datetime.now() - timedelta(hours=1)).strftime("%Y-%m-%d")
-    # 我们将带走的数值设置为-1000以下
-    min_score = -2000 if with_daizou else -1000
+    current_date = clock.now().strftime("%Y-%m-%d") if end_hour != 24 else (clock.now() - timedelta(hours=1)).strftime("%Y-%m-%d")
+    # 我们将带走的档位设置为买9以下
+    min_score = tier_min(TIER_MIN if with_daizou else TIER_MAI9)
     max_score = float('inf')
     members = []
     
     key = f"tasks:launch_tasks:{current_date}:{group_wxid}"
     if date not in ["", None]:
         key = f"history:tasks:{group_wxid}:{date}"
-    print(f"key: {key}")
+    logger.debug("获取麦序", extra={"key": key, "current_hour": current_hour, "end_hour": end_hour})
     tasks_members = []
     for hour in range((current_hour+1)%24, end_hour if end_hour != None else (current_hour+1)%24 + 1):
-        print(f"hour: {hour}")
         tasks = redis_conn.zrevrangebyscore(f"{key}:{hour}", min=min_score, max=max_score, withscores=True)
-        # [('wxid_dofg3jonqvre22:p', 0.2816195680141449), ('wxid_2tkacjo984zq22:p', 0.28242833766937253)]
-        # 将成员id wxid_dofg3jonqvre22:p:带走 (wxid_dofg3jonqvre22, p, score, state, hour)
-        #         wxid_dofg3jonqvre22:p      (wxid_dofg3jonqvre22, p, score, '', hour)
-        tasks_members.extend(
-                (
-                    member.split(':')[0],
-                    member.split(':')[1], 
-                    score,
-                    member.split(':')[2] if len(member.split(':')) > 2 else '',
-                    hour,
-                    date,
-                    group_wxid
-                ) for member, score in tasks
-            )
+        tasks_members.extend(parse_task_members(tasks, hour, date, group_wxid))
     
     return tasks_members
+def parse_task_members(tasks: list, hour: int, date: str = None, group_wxid: str = None) -> list:
+    """
+    解析扣排队列中的成员
+    tasks: [('wxid_dofg3jonqvre22:p', 0.2816195680141449), ('wxid_2tkacjo984zq22:p:带走', 0.28242833766937253)]
+    返回: [(成员id, 任务类型, 分数, 状态, 场次, 日期, 群组)]，没有状态时为空字符串
+    """
+    members = []
+    for member, score in tasks:
+        parts = member.split(':')
+        members.append((parts[0], parts[1], score, parts[2] if len(parts) > 2 else '', hour, date, group_wxid))
+    return members
 def generate_task_members(group_tasks_members: list, with_zuofei: bool = False) -> dict:
     """
     生成群组的扣排麦序信息字典
@@ -251,7 +232,7 @@ def get_member_task(redis_conn, group_wxid: str) -> dict:
     for key in redis_conn.scan_iter(f"member_task:{group_wxid}:*"):
         accumulate_score = redis_conn.hget(key, "accumulate_score")
         complete_score = redis_conn.hget(key, "complete_score")
-        print(f"accumulate_score: {accumulate_score}, complete_score: {complete_score}")
+        logger.debug("成员任务累积", extra={"key": key, "accumulate_score": accumulate_score, "complete_score": complete_score})
         task[key.split(':')[-1]] = {"accumulate_score": float(accumulate_score), "complete_score": float(complete_score)}
     return task
 def update_group_member_task(redis_conn, group_wxid: str, group_tasks_members: list):
@@ -259,10 +240,22 @@ def update_group_member_task(redis_conn, group_wxid: str, group_tasks_members: l
     # 从redis中获取成员的任务累积
 
     member_tasks = get_member_task(redis_conn, group_wxid)
+    if logger.isEnabledFor(logging.DEBUG):
+        # 日志在后台线程中格式化，累加会原地修改member_tasks，这里输出副本
+        logger.debug("更新前的成员任务累积", extra={"member_tasks": {member: dict(info) for member, info in member_tasks.items()}})
+    accumulate_member_tasks(member_tasks, group_tasks_members)
+
+    # 更新redis中的成员任务累积
+    logger.debug("更新后的成员任务累积", extra={"member_tasks": member_tasks})
+    for member_wxid, task_info in member_tasks.items():
+        update_member_task(redis_conn, group_wxid, member_wxid, task_info["accumulate_score"], task_info["complete_score"])
+def accumulate_member_tasks(member_tasks: dict, group_tasks_members: list) -> dict:
+    """
+    将扣排麦序累加到成员任务累积 {member_wxid: {"accumulate_score", "complete_score"}}（原地修改并返回）
+    """
     # 遍历 group_tasks_members list，将成员的扣排类型转尝试化为float，如果转化成功则追加到member_tasks[member_wxid]["accumulate_score"]
     # 如果转化失败则忽略
     # 如果成员不在member_tasks中，则初始化。如果state为作废，则不初始化并且不追加。如果为带走或者过，则追加complete_score
-    print(f"更新前member_tasks===: {member_tasks}")
     for member_wxid, koupai_type, _, state, _, _, _ in group_tasks_members:
         if member_wxid not in member_tasks and state != "作废":
             member_tasks[member_wxid] = {"accumulate_score": 0, "complete_score": 0}
@@ -277,11 +270,7 @@ def update_group_member_task(redis_conn, group_wxid: str, group_tasks_members: l
                 member_tasks[member_wxid]["complete_score"] += float(koupai_type)
         except ValueError:
             pass
-
-    # 更新redis中的成员任务累积
-    print(f"更新后的member_tasks===: {member_tasks}")
-    for member_wxid, task_info in member_tasks.items():
-        update_member_task(redis_conn, group_wxid, member_wxid, task_info["accumulate_score"], task_info["complete_score"])
+    return member_tasks
 def update_member_task(redis_conn, group_wxid: str, member_wxid: str, accumulate_score: float = None, complete_score: float = None):
     """更新群组的成员任务累积"""
     if accumulate_score is None:
@@ -304,6 +293,9 @@ def update_member_task(redis_conn, group_wxid: str, member_wxid: str, accumulate
 def get_renwu_list(redis_conn, group_wxid: str) -> list:
     """获取群组的任务列表"""
     rules = redis_conn.hget(f"groups_config:{group_wxid}", "renwu_desc")
+    return parse_renwu_list(rules)
+def parse_renwu_list(rules: str) -> list:
+    """解析任务描述为任务列表"""
     # 返回指定字段 "0.3<0.5<1.0 .....100.0<新人置顶<魅力置顶"
     # 去除<号，生成对应列表 
     try:
@@ -325,6 +317,54 @@ def get_renwu_dict(renwu_list: list) -> dict:
     # print(f"rules: {rule_list}")
     return rule_dict
 
+def count_fixed_speed(members) -> int:
+    """
+    当前队列中有效的固定手速人数（带走、作废的成员不计入，同步任务与快速通道共用）
+    members: (扣排类型, 状态) 的列表
+    """
+    return sum(1 for koupai_type, state in members if koupai_type == "固定手速" and state not in ("带走", "作废"))
+def get_koupai_base_score(group_config: dict, msg_content: str, has_task: bool, fixed_num: int = 0) -> tuple:
+    """
+    计算 手速/补/固定手速 的基础分
+    fixed_num: 当前队列中有效的固定手速人数（见 count_fixed_speed）
+    返回: (基础分, 扣排类型)
+    """
+    base_score = TIER_SPEED
+    # 先获取是否有固定手速排人数和固定手速排任务
+    fixed_p_num = int(group_config.get("fixed_p_num", 0))
+    fixed_renwu_desc = group_config.get("fixed_renwu_desc", "")
+    # 如果固定手速排人数大于0，并且有task，并且固定手速人数未达标，那么需要设置base_score
+    if fixed_p_num > fixed_num and has_task and msg_content != "补":
+        # 设置base_score为固定手速档位，低于固定排
+        base_score = TIER_FIXED_SPEED
+        msg_content = "固定手速"
+        # 如果有固定手速排任务， 那么base_score为 字典中对应的分数
+        if fixed_renwu_desc != "":
+            base_score = get_renwu_dict(parse_renwu_list(group_config.get("renwu_desc"))).get(fixed_renwu_desc, 0)
+    if msg_content == "补":
+        koupai_type = "补"
+    elif msg_content == "固定手速":
+        koupai_type = "固定手速"
+    else:
+        koupai_type = "手速"
+    return base_score, koupai_type
+def get_mai89_score(msg_content: str, renwu_list: list) -> tuple:
+    """
+    计算买8/买9的基础分
+    返回: (mai_type, 扣排类型, 基础分)，基础分为0时说明输入不符合任务设置
+    """
+    part = msg_content.replace("买8", "").strip() if msg_content.startswith("买8") else msg_content.replace("买9", "").strip()
+    base_score = get_renwu_dict(renwu_list).get(part, 0)
+    mai_type = f"p8" if msg_content.startswith("买8") else f"p9"
+    mai_content = f"{mai_type} {part}"
+    if base_score == 0:
+        return mai_type, mai_content, 0
+    # 买8、买9分别降到对应档位，因为我们规定买9要在买8下面
+    if mai_type == "p8":
+        base_score = base_score + TIER_MAI8
+    if mai_type == "p9":
+        base_score = base_score + TIER_MAI9
+    return mai_type, mai_content, base_score
 def check_koupai_limit(redis_conn, group_wxid: str, current_hour: int) -> bool:
     """检查扣排人数是否超过限制"""
     limit = int(get_group_config(redis_conn, group_wxid).get("limit_koupai", 8))
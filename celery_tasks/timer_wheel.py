@@ -0,0 +1,39 @@
+from common.clock import clock
+from cache.redis_scripts import redis_scripts
+
+
+class TimerWheel:
+    """
+    基于redis有序集合的定时器：成员为定时器标识，分数为到期时间戳（秒）
+    由单个轮询任务批量领取到期的定时器，取消只需要一次ZREM，
+    未到期的定时器只存在于redis中，不占用worker内存
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+
+    def schedule(self, redis_conn, timer_id: str, due_time: float):
+        """添加（或重置）定时器"""
+        redis_conn.zadd(self.key, {timer_id: due_time})
+
+    def cancel(self, redis_conn, timer_id: str) -> bool:
+        """取消定时器，返回定时器是否存在（已经触发并确认的定时器返回False）"""
+        return bool(redis_conn.zrem(self.key, timer_id))
+
+    def claim_due(self, redis_conn, batch: int, lease: float, now: float = None) -> list:
+        """领取最多batch个到期的定时器，处理完成后需调用ack确认"""
+        now = now or clock.time()
+        return redis_scripts.run(redis_conn, "claim_due_timers", keys=[self.key], args=[now, now + lease, batch])
+
+    def ack(self, redis_conn, timer_ids: list):
+        """确认定时器已处理"""
+        if timer_ids:
+            redis_conn.zrem(self.key, *timer_ids)
+
+    def pending(self, redis_conn) -> int:
+        """未触发的定时器数量"""
+        return redis_conn.zcard(self.key)
+
+
+# 报备超时定时器，成员为报备记录的key history:bb:{date}:{group_wxid}:{hour}:{member_wxid}:{minute}
+bb_timers = TimerWheel("tasks:timers:bb")
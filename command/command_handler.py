@@ -3,7 +3,7 @@ import re
 from db.repository import group_repo, command_repo
 from db.database import db_manager
 from utils.send_utils import send_message, change_groupname
-from utils.send_utils_sync import get_member_nick
+from utils.send_utils_sync import get_member_nick, get_member_nicks
 from command.rules.hostPhrase_rules import validate_time_slots_array, parse_time_slots, parse_at_message
 import json
 from celery_tasks.tasks_crud import get_renwu_list, get_group_hosts_all
@@ -13,7 +13,9 @@ from celery_tasks.schedule_tasks import (scheduled_task, delete_koupai_member, a
                                         delete_koupai_members, send_task_schedule_day)
 from datetime import datetime, timedelta
 from cache.redis_pool import get_redis_connection
-from common.global_vars import *
+from common.group_state import group_state
+from command.router import (CommandRouter, MATCH_PREFIX, MATCH_EXACT, MATCH_CONTAINS,
+                            ARGS_COMMAND, ARGS_GROUP, ARGS_MEMBER, ARGS_COMMAND_MEMBER, ARGS_COMMAND_AT)
 class CommandHandler:
     """命令处理器，处理各种用户命令"""
 
@@ -23,7 +25,11 @@ class CommandHandler:
         self.register_commands()
         self.redis_conn = get_redis_connection(0)
     def register_commands(self):
-        """注册所有可用命令"""
+        """
+        注册所有可用命令
+        keywords: 触发命令的关键词（默认为命令名），match: 匹配方式（默认前缀匹配），
+        args: 处理函数的参数签名（默认 command, group_wxid）
+        """
         self.commands = {
             "修改昵称": {
                 "description": "修改昵称",
@@ -50,11 +56,13 @@ class CommandHandler:
             },
             "查询主持": {
                 "description": "查询主持",
-                "handler": self.handle_view_host
+                "handler": self.handle_view_host,
+                "args": ARGS_GROUP
             },
             "查询麦序文档": {
                 "description": "查询麦序文档",
-                "handler": self.handle_view_group_maixudesc
+                "handler": self.handle_view_group_maixudesc,
+                "args": ARGS_GROUP
             },
             "设置扣排时间": {
                 "description": "设置扣排时间+数字（0-59分钟）",
@@ -78,11 +86,15 @@ class CommandHandler:
             },
             "取": {
                 "description": "取排",
-                "handler": self.handle_remove_member
+                "handler": self.handle_remove_member,
+                "match": MATCH_EXACT,
+                "args": ARGS_MEMBER
             },
             "补": {
                 "description": "补排",
-                "handler": self.handle_re_member
+                "handler": self.handle_re_member,
+                "match": MATCH_EXACT,
+                "args": ARGS_MEMBER
             },
             "设置补位时间": {
                 "description": "设置补位时间+数字（0-59分钟）",
@@ -94,38 +106,50 @@ class CommandHandler:
             },
             "设置手速可取/不可取": {
                 "description": "切换手速排是否可取",
-                "handler": self.handle_set_p_qu
+                "handler": self.handle_set_p_qu,
+                "keywords": ["设置手速"]
             },
             "设置任务排可取/不可取": {
                 "description": "切换任务排是否可取",
-                "handler": self.handle_set_renwu_qu
+                "handler": self.handle_set_renwu_qu,
+                "keywords": ["设置任务排"]
             },
             "当前麦序/查询麦序/查询当前麦序": {
                 "description": "查询当前麦序",
-                "handler": self.handle_view_current_maixu
+                "handler": self.handle_view_current_maixu,
+                "keywords": ["当前麦序", "查询麦序", "查询当前麦序"],
+                "match": MATCH_EXACT,
+                "args": ARGS_GROUP
             },
             "转麦序": {
                 "description": "转麦序+@用户",
-                "handler": self.handle_transfer_koupai
+                "handler": self.handle_transfer_koupai,
+                "args": ARGS_COMMAND_MEMBER
             },
             "固定排": {
                 "description": "数字-数字固定排+@多个用户（可选，没有at的时候默认为自己），\n"
                                 "例如：\n"
                                 "0-2固定排@某人"
                                 ,
-                "handler": self.handle_set_fixed_koupai
+                "handler": self.handle_set_fixed_koupai,
+                "match": MATCH_CONTAINS,
+                "args": ARGS_COMMAND_MEMBER
             },
             "清空固定排": {
                 "description": "清空固定排+@用户 同固定排",
-                "handler": self.handle_remove_fixed_koupai
+                "handler": self.handle_remove_fixed_koupai,
+                "args": ARGS_COMMAND_MEMBER
             },
             "查询固定排": {
                 "description": "查询固定排",
-                "handler": self.handle_view_fixed_koupai
+                "handler": self.handle_view_fixed_koupai,
+                "args": ARGS_GROUP
             },
             "添加xxx卡片": {
                 "description": "添加xxx卡片+@多个用户+过期时间（可选，默认1天）+数量（可选，默认1张）",
-                "handler": self.handle_add_member_benefits
+                "handler": self.handle_add_member_benefits,
+                "keywords": ["添加"],
+                "args": ARGS_COMMAND_MEMBER
             },
             "设置报备时间": {
                 "description": "设置报备时间+数字",
@@ -135,10 +159,6 @@ class CommandHandler:
                 "description": "设置超时提示词+提示词",
                 "handler": self.handle_set_timeout_desc
             },
-            "设置报备时间": {
-                "description": "设置报备时间+数字",
-                "handler": self.handle_set_bb_time
-            },
             "设置报备人数": {
                 "description": "设置报备人数+数字",
                 "handler": self.handle_set_bb_limit
@@ -165,7 +185,9 @@ class CommandHandler:
             },
             "本档作废/上档作废": {
                 "description": "本档作废/上档作废",
-                "handler": self.handle_delete_koupai_members_all
+                "handler": self.handle_delete_koupai_members_all,
+                "keywords": ["本档作废", "上档作废", "下档作废"],
+                "match": MATCH_EXACT
             },
             "设置麦序作废人数": {
                 "description": "设置麦序作废人数+数字",
@@ -173,127 +195,69 @@ class CommandHandler:
             },
             "换主持": {
                 "description": "换主持+开始时间-结束时间 例如：换主持10-15",
-                "handler": self.handle_transfer_host
+                "handler": self.handle_transfer_host,
+                "args": ARGS_COMMAND_MEMBER
             },
             "禁排": {
                 "description": "禁排@多个用户",
-                "handler": self.handle_ban_member
+                "handler": self.handle_ban_member,
+                "match": MATCH_EXACT,
+                "args": ARGS_COMMAND_AT
             },
             "取消禁排": {
                 "description": "取消禁排@多个用户",
-                "handler": self.handle_unban_member
+                "handler": self.handle_unban_member,
+                "match": MATCH_EXACT,
+                "args": ARGS_COMMAND_AT
             },
             "今日麦序/昨日麦序": {
                 "description": "今日麦序+开始时间-结束时间 例如：今日麦序10-15",
-                "handler": self.handle_send_task_schedule_day
+                "handler": self.handle_send_task_schedule_day,
+                "keywords": ["今日麦序", "昨日麦序"]
             },
             "累计任务": {
                 "description": "累计任务",
-                "handler": self.handle_view_member_task
+                "handler": self.handle_view_member_task,
+                "match": MATCH_EXACT,
+                "args": ARGS_COMMAND_MEMBER
             },
             "累计过": {
                 "description": "累计过的任务",
-                "handler": self.handle_view_member_task
+                "handler": self.handle_view_member_task,
+                "match": MATCH_EXACT,
+                "args": ARGS_COMMAND_MEMBER
             },
             "添加累计": {
                 "description": "添加累计+@多个用户+数字",
-                "handler": self.handle_add_score
+                "handler": self.handle_add_score,
+                "args": ARGS_COMMAND_MEMBER
             }
 
 
         }
+        # 编译命令路由
+        self.router = CommandRouter()
+        for name, info in self.commands.items():
+            for keyword in info.get("keywords", [name]):
+                self.router.add(keyword, info["handler"], info.get("args", ARGS_COMMAND),
+                                info.get("match", MATCH_PREFIX), name)
+        # 添加管理由管理端处理，机器人不作响应
+        self.router.add("添加管理", None, name="添加管理")
+
+    def match_command(self, command: str):
+        """查找消息对应的命令路由，不是命令时返回None"""
+        return self.router.match(command)
     
     async def handle_command(self, command: str, group_wxid: str, **kwargs):
         """处理用户命令"""
         # 如果包含艾特消息
         # if kwargs.get("at_user"):
         #     command = parse_at_message(command)
-        # 根据命令类型进行处理
-        if command.startswith("修改昵称"):
-            return await self.handle_change_group_name(command, group_wxid)
-        elif command.startswith("设置欢迎词"):
-            return await self.handle_set_welcome(command, group_wxid)
-        elif command.startswith("设置退群词"):
-            return await self.handle_set_leave(command, group_wxid)
-        elif command.startswith("设置麦序文档"):
-            return await self.handle_set_group_maixudesc(command, group_wxid)
-        elif command.startswith("查询麦序文档"):
-            return await self.handle_view_group_maixudesc(group_wxid)
-        elif command.startswith("设置主持"):
-            return await self.handle_set_host(command, group_wxid)
-        elif command.startswith("查询主持"):
-            return await self.handle_view_host(group_wxid)
-        elif command.startswith("设置扣排时间"):
-            return await self.handle_set_koupai_start_time(command, group_wxid)
-        elif command.startswith("设置扣排截止时间"):
-            return await self.handle_set_koupai_end_time(command, group_wxid)
-        elif command.startswith("设置任务截止时间"):
-            return await self.handle_set_renwu_end_time(command, group_wxid)
-        elif command.startswith("设置扣排人数"):
-            return await self.handle_set_koupai_limit(command, group_wxid)
-        elif command.startswith("设置固定手速人数"):
-            return await self.handle_set_fixed_num(command, group_wxid)
-        elif command.startswith("设置固定手速任务"):
-            return await self.handle_set_fixed_renwu_desc(command, group_wxid)
-        elif command in ["当前麦序", "查询麦序", "查询当前麦序"]:
-            return await self.handle_view_current_maixu(group_wxid)
-        
-        elif command == "取":
-            return await self.handle_remove_member(group_wxid, kwargs.get("msg_owner"), kwargs.get("at_user"))
-        elif command == "补":
-            return await self.handle_re_member(group_wxid, kwargs.get("msg_owner"), kwargs.get("at_user"))
-        elif command.startswith("设置补位时间"):
-            return await self.handle_set_re_time(command, group_wxid)
-        elif command.startswith("设置取时间"):
-            return await self.handle_set_qu_time(command, group_wxid)
-        elif command.startswith("设置手速"):
-            return await self.handle_set_p_qu(command, group_wxid)
-        elif command.startswith("设置任务排"):
-            return await self.handle_set_renwu_qu(command, group_wxid)
-        elif command.startswith("设置任务"):
-            return await self.handle_set_renwu(command, group_wxid)
-        elif command.startswith("查看任务"):
-            return await self.handle_view_renwu(group_wxid)
-        elif command.startswith("转麦序"):
-            return await self.handle_transfer_koupai(command, group_wxid, kwargs.get("msg_owner"), kwargs.get("at_user"))
-        elif command.startswith("查询固定排"):
-            return await self.handle_view_fixed_koupai(group_wxid)
-        elif command.startswith("清空固定排"):
-            return await self.handle_remove_fixed_koupai(command, group_wxid, kwargs.get("msg_owner"), kwargs.get("at_user"))
-        elif "固定排" in command:
-            return await self.handle_set_fixed_koupai(command, group_wxid, kwargs.get("msg_owner"), kwargs.get("at_user"))
-        elif command.startswith("添加累计"):
-            return await self.handle_add_score(command, group_wxid, kwargs.get("msg_owner"), kwargs.get("at_user"))
-        elif "添加管理" in command:
-            return 
-        elif command.startswith("添加"):
-            return await self.handle_add_member_benefits(command, group_wxid, kwargs.get("msg_owner"), kwargs.get("at_user"))
-        elif command.startswith("设置报备时间"):
-            return await self.handle_set_bb_time(command, group_wxid)
-        elif command.startswith("设置报备人数"):
-            return await self.handle_set_bb_limit(command, group_wxid)
-        elif command.startswith("设置报备超时提示词"):
-            return await self.handle_set_timeout_desc(command, group_wxid)
-        elif command.startswith("设置报备次数"):
-            return await self.handle_set_bb_in_hour(command, group_wxid)
-        elif command.startswith("设置报备回厅词"):
-            return await self.handle_set_bb_back_desc(command, group_wxid)
-        elif command in ["本档作废", "上档作废", "下档作废"]:
-            return await self.handle_delete_koupai_members_all(command, group_wxid)
-        elif command.startswith("设置麦序作废人数"):
-            return await self.handle_delete_koupai_members(command, group_wxid)
-        elif command.startswith("换主持"):
-            return await self.handle_transfer_host(command, group_wxid, kwargs.get("msg_owner"), kwargs.get("at_user"))
-        elif command == "禁排":
-            return await self.handle_ban_member(command, group_wxid, kwargs.get("at_user"))
-        elif command == "取消禁排":
-            return await self.handle_unban_member(command, group_wxid, kwargs.get("at_user"))
-        elif command.startswith(("今日麦序", "昨日麦序")):
-            return await self.handle_send_task_schedule_day(command, group_wxid)
-        elif command in ["累计任务", "累计过"] :
-            return await self.handle_view_member_task(command, group_wxid, kwargs.get("msg_owner"), kwargs.get("at_user"))
-        else:
+        # 根据命令路由进行处理（最长匹配，与注册顺序无关）
+        route = kwargs.pop("route", None) or self.router.match(command)
+        if route is None:
             return "未注册命令，请输入 /help 查看帮助信息"
+        return await self.router.dispatch(route, command, group_wxid, **kwargs)
     async def handle_event(self, event_type: str, group_wxid: str):
         """群成员进退群事件处理器"""
         if event_type == 1:
@@ -486,11 +450,12 @@ class CommandHandler:
                 #fixed_hosts = '\r'.join([f"{slot[1]}-{slot[2]} {get_member_nick(group_wxid, slot[3])}" for slot in fixed_hosts])
                 #相同 start_hour 中的 wxid 合并到同一行（因为我们设置的end_hour都是start_hour+1），所以start_hour 和 end_hour是同一个不需要合并
                 fixed_hosts_dict = {}
+                nicks = get_member_nicks(group_wxid, [slot[3] for slot in fixed_hosts])
                 for slot in fixed_hosts:
                     start_hour = slot[1]
                     if start_hour not in fixed_hosts_dict:
                         fixed_hosts_dict[start_hour] = []
-                    fixed_hosts_dict[start_hour].append(f" @{get_member_nick(group_wxid, slot[3])}")
+                    fixed_hosts_dict[start_hour].append(f" @{nicks[slot[3]]}")
                 fixed_hosts = [f"{start_hour}-{start_hour+1} {', '.join(nicks)}" for start_hour, nicks in fixed_hosts_dict.items()]
                 # 解析并构建固定排消息
                 fixed_hosts_message = '\r'.join(fixed_hosts)
@@ -528,7 +493,7 @@ class CommandHandler:
             # 立即执行一次扣排任务查询，如果当前秒钟为0，则等待1秒（不等待会出现诡异的情况）
             # if datetime.now().second == 0:
             #     await asyncio.sleep(1)
-            scheduled_task.delay(koupai_type="start", update_group=group_wxid)
+            scheduled_task.delay()
             await send_message(group_wxid, f"扣排开始时间已设置为：{start_time}分钟")
             return f"扣排开始时间已设置为：{start_time}分钟"
         except Exception as e:
@@ -550,7 +515,7 @@ class CommandHandler:
             # 立即执行一次扣排任务查询，如果当前秒钟为0，则等待3秒（不等待会出现诡异的情况）
             # if datetime.now().second == 0:
             #     await asyncio.sleep(3)
-            scheduled_task.delay(koupai_type="end", update_group=group_wxid)
+            scheduled_task.delay()
             await send_message(group_wxid, f"扣排截止时间已设置为：{end_time}分钟")
             return f"扣排截止时间已设置为：{end_time}分钟"
         except Exception as e:
@@ -568,7 +533,7 @@ class CommandHandler:
             
             await group_repo.update_group_end_task(group_wxid, int(end_time))
             await initialize_tasks.update_groups_config(group_wxid, {"end_renwu": int(end_time)})
-            scheduled_task.delay(koupai_type="end", update_group=group_wxid)
+            scheduled_task.delay()
             await send_message(group_wxid, f"任务截止时间已设置为：{end_time}分钟")
         except Exception as e:
             return f"设置任务截止时间失败：{e}"
@@ -913,10 +878,11 @@ class CommandHandler:
                 return "命令格式错误，请@要禁排的成员"
             members_wxid = at_user
             members_desc = ""
+            nicks = get_member_nicks(group_wxid, members_wxid)
             for member_wxid in members_wxid:
                 await group_repo.update_group_member_is_baned(group_wxid, member_wxid, is_baned=True)
-                add_baned_member(group_wxid, member_wxid)
-                members_desc += f"{get_member_nick(group_wxid, member_wxid)} "
+                group_state.add_baned_member(group_wxid, member_wxid)
+                members_desc += f"{nicks[member_wxid]} "
             await send_message(group_wxid, f"{members_desc}已被禁排")
         except Exception as e:
             return f"禁排成员失败：{e}"
@@ -930,10 +896,11 @@ class CommandHandler:
                 return "命令格式错误，请@要取消禁排的成员"
             members_wxid = at_user
             members_desc = ""
+            nicks = get_member_nicks(group_wxid, members_wxid)
             for member_wxid in members_wxid:
                 await group_repo.update_group_member_is_baned(group_wxid, member_wxid, is_baned=False)
-                remove_baned_member(group_wxid, member_wxid)
-                members_desc += f"{get_member_nick(group_wxid, member_wxid)} "
+                group_state.remove_baned_member(group_wxid, member_wxid)
+                members_desc += f"{nicks[member_wxid]} "
             await send_message(group_wxid, f"{members_desc}已被取消禁排")
         except Exception as e:
             return f"取消禁排成员失败：{e}"
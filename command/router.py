@@ -0,0 +1,91 @@
+from typing import Callable, Optional, Tuple
+
+# 匹配方式
+MATCH_PREFIX = "prefix"         # 命令以关键词开头，后面跟参数
+MATCH_EXACT = "exact"           # 整条消息等于关键词
+MATCH_CONTAINS = "contains"     # 消息中包含关键词（前缀均未匹配时才检查）
+
+# 调用处理函数时可以使用的参数名
+ARG_NAMES = ("command", "group_wxid", "msg_owner", "at_user")
+# 常用的参数签名
+ARGS_COMMAND = ("command", "group_wxid")
+ARGS_GROUP = ("group_wxid",)
+ARGS_MEMBER = ("group_wxid", "msg_owner", "at_user")
+ARGS_COMMAND_MEMBER = ("command", "group_wxid", "msg_owner", "at_user")
+ARGS_COMMAND_AT = ("command", "group_wxid", "at_user")
+
+
+class Route:
+    """一条命令路由：关键词、匹配方式、处理函数以及处理函数的参数签名"""
+
+    __slots__ = ("keyword", "match", "handler", "args", "name")
+
+    def __init__(self, keyword: str, match: str, handler: Optional[Callable], args: Tuple[str, ...], name: str):
+        self.keyword = keyword
+        self.match = match
+        # handler 为 None 表示该命令由其他程序处理，机器人不作响应
+        self.handler = handler
+        self.args = args
+        self.name = name
+
+    def __repr__(self):
+        return f"Route({self.keyword!r}, {self.match})"
+
+
+class CommandRouter:
+    """
+    命令路由：由 register_commands 中声明的关键词编译成前缀字典树，
+    按最长匹配查找命令，查找耗时只与消息长度有关，与命令数量和注册顺序无关
+    """
+
+    def __init__(self):
+        # 字典树节点: {"children": {字符: 节点}, "prefix": Route, "exact": Route}
+        self._root = {"children": {}}
+        self._contains = []
+
+    def add(self, keyword: str, handler: Optional[Callable], args: Tuple[str, ...] = ARGS_COMMAND,
+            match: str = MATCH_PREFIX, name: str = None):
+        """添加一条路由，同一关键词同一匹配方式重复添加时以后添加的为准"""
+        unknown = set(args) - set(ARG_NAMES)
+        if unknown:
+            raise ValueError(f"命令 {keyword} 的参数签名不支持: {unknown}")
+        route = Route(keyword, match, handler, tuple(args), name or keyword)
+        if match == MATCH_CONTAINS:
+            self._contains = [r for r in self._contains if r.keyword != keyword] + [route]
+            return route
+        if match not in (MATCH_PREFIX, MATCH_EXACT):
+            raise ValueError(f"命令 {keyword} 的匹配方式不支持: {match}")
+        node = self._root
+        for char in keyword:
+            node = node["children"].setdefault(char, {"children": {}})
+        node[match] = route
+        return route
+
+    def match(self, command: str) -> Optional[Route]:
+        """
+        查找命令对应的路由，没有匹配时返回None
+        整条消息的完全匹配优先，其次为最长的前缀匹配，最后检查包含匹配
+        """
+        node = self._root
+        matched = None
+        for char in command:
+            node = node["children"].get(char)
+            if node is None:
+                break
+            matched = node.get(MATCH_PREFIX, matched)
+        else:
+            matched = node.get(MATCH_EXACT, matched)
+        if matched:
+            return matched
+        for route in self._contains:
+            if route.keyword in command:
+                return route
+        return None
+
+    async def dispatch(self, route: Route, command: str, group_wxid: str, **kwargs):
+        """按路由声明的参数签名调用处理函数"""
+        if route.handler is None:
+            return None
+        values = {"command": command, "group_wxid": group_wxid,
+                  "msg_owner": kwargs.get("msg_owner"), "at_user": kwargs.get("at_user")}
+        return await route.handler(*(values[arg] for arg in route.args))
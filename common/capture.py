@@ -0,0 +1,71 @@
+import json
+import queue
+import threading
+import time
+from typing import Iterator
+
+# 录制文件格式：每行一个紧凑的JSON {"t": 接收时间戳（秒）, "e": 回调事件}，只追加写入
+
+
+class CallbackRecorder:
+    """
+    回调录制：回调请求中只把事件放入内存队列，由后台线程批量追加写入文件，不阻塞回调响应
+    """
+
+    def __init__(self, path: str = ""):
+        self.path = path
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def record(self, event: dict):
+        """录制一个回调事件"""
+        if not self.path:
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="callback-recorder", daemon=True)
+                    self._thread.start()
+        self._queue.put((time.time(), event))
+
+    def _run(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                item = self._queue.get()
+                items = [item]
+                # 一次写入队列中已有的所有事件
+                while True:
+                    try:
+                        items.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                # None 为停止标记
+                records = [item for item in items if item is not None]
+                f.writelines(json.dumps({"t": ts, "e": event}, ensure_ascii=False, separators=(",", ":")) + "\n"
+                             for ts, event in records)
+                f.flush()
+                if len(records) < len(items):
+                    return
+
+    def close(self):
+        """写入剩余的事件并停止后台线程"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+def read_capture(path: str) -> Iterator[tuple]:
+    """读取录制文件，返回 (接收时间戳, 回调事件)，忽略写入中断导致的不完整行"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            yield item["t"], item["e"]
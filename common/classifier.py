@@ -0,0 +1,83 @@
+import threading
+from typing import Optional
+from cache.redis_pool import get_redis_connection
+from celery_tasks.tasks_crud import parse_renwu_list
+
+# 成员消息类型
+MSG_KOUPAI = "koupai"       # p/P/排
+MSG_BB = "bb"               # 报备
+MSG_BACK = "back"           # 回
+MSG_RENWU = "renwu"         # 扣任务
+MSG_MAI89 = "mai89"         # 买8/买9
+MSG_DAIZOU = "daizou"       # 带走
+
+KOUPAI_TOKENS = frozenset(("p", "P", "排"))
+BB_PREFIXES = ("bb", "BB", "Bb", "bB", "报备")
+MAI89_PREFIXES = ("买8", "买9")
+
+
+class GroupClassifier:
+    """单个群组编译好的成员消息分类规则"""
+
+    __slots__ = ("renwu_tokens",)
+
+    def __init__(self, renwu_desc: str):
+        self.renwu_tokens = frozenset(parse_renwu_list(renwu_desc))
+
+    def classify(self, msg_content: str) -> Optional[str]:
+        """返回消息类型，不是成员消息时返回None（判断顺序与原先回调中的分支顺序一致）"""
+        if msg_content in KOUPAI_TOKENS:
+            return MSG_KOUPAI
+        if msg_content.startswith(BB_PREFIXES):
+            return MSG_BB
+        if msg_content == "回":
+            return MSG_BACK
+        if msg_content.startswith(MAI89_PREFIXES):
+            return MSG_MAI89
+        if msg_content in self.renwu_tokens:
+            return MSG_RENWU
+        if msg_content == "带走":
+            return MSG_DAIZOU
+        return None
+
+
+class MessageClassifier:
+    """
+    成员消息分类器：每个群组的任务列表只在首次使用或配置变更后从 groups_config 编译一次，
+    之后每条消息的分类只是集合查找，不再访问redis
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._groups = {}
+
+    def get(self, group_wxid: str) -> GroupClassifier:
+        """获取群组的分类规则，不存在时从redis中的群组配置编译"""
+        classifier = self._groups.get(group_wxid)
+        if classifier is None:
+            renwu_desc = get_redis_connection(0).hget(f"groups_config:{group_wxid}", "renwu_desc")
+            classifier = self.compile(group_wxid, renwu_desc)
+        return classifier
+
+    def compile(self, group_wxid: str, renwu_desc: str) -> GroupClassifier:
+        """根据任务描述重新编译群组的分类规则"""
+        classifier = GroupClassifier(renwu_desc)
+        with self._lock:
+            self._groups[group_wxid] = classifier
+        return classifier
+
+    def invalidate(self, group_wxid: str = None):
+        """使群组的分类规则失效，下次使用时重新编译；不传group_wxid时清空所有群组"""
+        with self._lock:
+            if group_wxid is None:
+                self._groups.clear()
+            else:
+                self._groups.pop(group_wxid, None)
+
+    def classify(self, group_wxid: str, msg_content: str) -> Optional[str]:
+        """对群组中的成员消息分类"""
+        return self.get(group_wxid).classify(msg_content)
+
+
+# 全局成员消息分类器实例
+message_classifier = MessageClassifier()
@@ -0,0 +1,79 @@
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+
+class SystemClock:
+    """系统时钟"""
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def time(self) -> float:
+        return time.time()
+
+
+class SimulatedClock:
+    """模拟时钟：时间只在调用 set/advance 时变化，用于模拟器和压测"""
+
+    def __init__(self, start: datetime = None):
+        self._lock = threading.Lock()
+        self._now = start or datetime.now()
+
+    def now(self) -> datetime:
+        return self._now
+
+    def time(self) -> float:
+        return self._now.timestamp()
+
+    def set(self, when: datetime):
+        """设置当前时间"""
+        with self._lock:
+            self._now = when
+
+    def advance(self, seconds: float = 0, **kwargs) -> datetime:
+        """时间前进，参数同 timedelta"""
+        with self._lock:
+            self._now += timedelta(seconds=seconds, **kwargs)
+            return self._now
+
+
+class Clock:
+    """
+    全局时钟：celery_tasks 和 tasks_crud 中的当前时间均从这里获取，
+    默认使用系统时钟，模拟器可以替换为模拟时钟（对整个进程生效）
+    """
+
+    def __init__(self):
+        self._source = SystemClock()
+
+    def now(self) -> datetime:
+        """当前时间（本地时间）"""
+        return self._source.now()
+
+    def time(self) -> float:
+        """当前时间戳（秒）"""
+        return self._source.time()
+
+    def install(self, source):
+        """替换时钟"""
+        self._source = source
+
+    def reset(self):
+        """恢复为系统时钟"""
+        self._source = SystemClock()
+
+    @contextmanager
+    def use(self, source):
+        """在with块内使用指定的时钟"""
+        previous = self._source
+        self._source = source
+        try:
+            yield source
+        finally:
+            self._source = previous
+
+
+# 全局时钟实例
+clock = Clock()
@@ -0,0 +1,100 @@
+import os
+
+
+def env_bool(name: str, default: bool = False) -> bool:
+    """读取布尔类型的环境变量"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_int(name: str, default: int) -> int:
+    """读取整数类型的环境变量"""
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    """读取浮点类型的环境变量"""
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+# 快速通道：成员操作（p/任务/买89/带走）在回调请求内直接写入redis，不经过celery
+FAST_PATH_ENABLED = env_bool("KOUPAI_FAST_PATH", False)
+
+# 定时事件超过触发时间多久（秒）后不再执行，只顺延到下一天（例如worker停机期间错过的事件）
+SCHEDULER_GRACE_SECONDS = env_int("SCHEDULER_GRACE_SECONDS", 120)
+
+# 报备超时定时器的轮询间隔（秒）、每批领取数量、领取后的租约时间（秒）
+BB_TIMER_POLL_SECONDS = env_float("BB_TIMER_POLL_SECONDS", 5.0)
+BB_TIMER_BATCH = env_int("BB_TIMER_BATCH", 100)
+BB_TIMER_LEASE_SECONDS = env_int("BB_TIMER_LEASE_SECONDS", 60)
+
+# 千寻机器人HTTP接口
+QIANXUN_API_URL = os.getenv("QIANXUN_API_URL", "http://127.0.0.1:28888/wechat/httpapi")
+# 发送接口连接池大小（每个进程）、连接超时和读取超时（秒）、空闲连接保持时间（秒）
+HTTP_POOL_SIZE = env_int("HTTP_POOL_SIZE", 20)
+HTTP_CONNECT_TIMEOUT = env_float("HTTP_CONNECT_TIMEOUT", 3.0)
+HTTP_READ_TIMEOUT = env_float("HTTP_READ_TIMEOUT", 10.0)
+HTTP_KEEPALIVE_SECONDS = env_float("HTTP_KEEPALIVE_SECONDS", 60.0)
+
+# 成员昵称缓存：redis中的有效期（秒）、进程内缓存的有效期（秒）和容量
+NICK_CACHE_TTL = env_int("NICK_CACHE_TTL", 6 * 3600)
+NICK_LOCAL_TTL = env_float("NICK_LOCAL_TTL", 30.0)
+NICK_LOCAL_SIZE = env_int("NICK_LOCAL_SIZE", 4096)
+# 批量获取昵称时的并发数；千寻接口支持获取群成员列表时可配置其请求类型，缺失昵称较多时一次获取整个群
+NICK_FETCH_CONCURRENCY = env_int("NICK_FETCH_CONCURRENCY", 8)
+NICK_BULK_REQUEST_TYPE = os.getenv("NICK_BULK_REQUEST_TYPE", "")
+NICK_BULK_MIN_MISSING = env_int("NICK_BULK_MIN_MISSING", 3)
+
+# 同一群组的消息合并发送：缓冲时间（毫秒，0为不合并）、合并后的最大长度、合并时的分隔符
+SEND_COALESCE_MS = env_int("SEND_COALESCE_MS", 300)
+SEND_COALESCE_MAX_CHARS = env_int("SEND_COALESCE_MAX_CHARS", 1500)
+SEND_COALESCE_SEPARATOR = "\r"
+
+# 发送调度：同时发送的请求数、全局与每个群组的速率限制（条/秒）和突发数量（每个进程）
+SEND_CONCURRENCY = env_int("SEND_CONCURRENCY", 4)
+SEND_GLOBAL_RATE = env_float("SEND_GLOBAL_RATE", 10.0)
+SEND_GLOBAL_BURST = env_int("SEND_GLOBAL_BURST", 20)
+SEND_GROUP_RATE = env_float("SEND_GROUP_RATE", 2.0)
+SEND_GROUP_BURST = env_int("SEND_GROUP_BURST", 5)
+
+# 发送失败时的持久化发件箱：连续失败多少次后熔断、熔断后多久再尝试（秒）、
+# 补发失败的退避时间（秒，指数增长）、单条消息最多尝试次数、每次补发的最大条数、补发轮询间隔（秒）
+OUTBOX_FAILURE_THRESHOLD = env_int("OUTBOX_FAILURE_THRESHOLD", 3)
+OUTBOX_RESET_SECONDS = env_float("OUTBOX_RESET_SECONDS", 30.0)
+OUTBOX_BACKOFF_BASE = env_float("OUTBOX_BACKOFF_BASE", 1.0)
+OUTBOX_BACKOFF_MAX = env_float("OUTBOX_BACKOFF_MAX", 60.0)
+OUTBOX_MAX_ATTEMPTS = env_int("OUTBOX_MAX_ATTEMPTS", 10)
+OUTBOX_FLUSH_BATCH = env_int("OUTBOX_FLUSH_BATCH", 20)
+OUTBOX_POLL_SECONDS = env_float("OUTBOX_POLL_SECONDS", 2.0)
+
+# 回调录制：设置文件路径时将每个回调追加写入该文件（JSON Lines，见 common.capture），用于 benchmark.replay 回放
+CALLBACK_CAPTURE_PATH = os.getenv("CALLBACK_CAPTURE_PATH", "")
+
+# redis统计：单个celery任务的redis往返次数达到该值时打印警告
+REDIS_TASK_WARN_ROUND_TRIPS = env_int("REDIS_TASK_WARN_ROUND_TRIPS", 50)
+
+# 指标：celery worker的指标HTTP服务端口（/metrics），0为不启动；机器人的指标在 /metrics
+METRICS_WORKER_PORT = env_int("METRICS_WORKER_PORT", 9809)
+
+# 追踪：span导出文件（Zipkin v2 JSON Lines）、收集器地址（例如 http://127.0.0.1:9411/api/v2/spans）、采样比例、服务名称
+# 都未设置导出时只传递追踪ID（用于日志关联）
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+TRACE_COLLECTOR_URL = os.getenv("TRACE_COLLECTOR_URL", "")
+TRACE_SAMPLE_RATE = env_float("TRACE_SAMPLE_RATE", 1.0)
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "koupai-bot")
+
+# 日志：级别、格式（text 单行文本，json 每行一个JSON对象）、高频日志（见 common.log.sampled）的采样比例、
+# 运行时日志级别的redis hash（logger名称 -> 级别）及其读取间隔（秒）
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_SAMPLE_RATE = env_float("LOG_SAMPLE_RATE", 0.1)
+LOG_CONFIG_KEY = os.getenv("LOG_CONFIG_KEY", "log:levels")
+LOG_CONFIG_POLL_SECONDS = env_float("LOG_CONFIG_POLL_SECONDS", 5.0)
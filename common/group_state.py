@@ -0,0 +1,69 @@
+import threading
+from db.repository import group_repo
+
+
+class GroupState:
+    """
+    回调进程内的群组状态：启用的群组集合，以及 群组 -> 被禁排成员集合 的索引
+    查询均为O(1)，与群组数量和禁排人数无关
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._enable_groups = set()
+        self._baned_members = {}
+
+    async def load(self):
+        """从数据库加载启用的群组和所有被禁排成员，整体替换当前状态"""
+        enable_groups = {group[0] for group in await group_repo.get_all_active_groups()}
+        baned_members = {}
+        # [(group_wxid, member_wxid, is_baned)]
+        for group_wxid, member_wxid, *_ in await group_repo.get_all_group_member_baned():
+            baned_members.setdefault(group_wxid, set()).add(member_wxid)
+        with self._lock:
+            self._enable_groups = enable_groups
+            self._baned_members = baned_members
+
+    def is_enabled(self, group_wxid: str) -> bool:
+        """群组是否已启用机器人"""
+        return group_wxid in self._enable_groups
+
+    def enable_group(self, group_wxid: str):
+        """启用群组"""
+        with self._lock:
+            self._enable_groups.add(group_wxid)
+
+    def disable_group(self, group_wxid: str):
+        """停用群组"""
+        with self._lock:
+            self._enable_groups.discard(group_wxid)
+
+    def is_baned(self, group_wxid: str, member_wxid: str) -> bool:
+        """成员是否在群组中被禁排"""
+        return member_wxid in self._baned_members.get(group_wxid, ())
+
+    def add_baned_member(self, group_wxid: str, member_wxid: str):
+        """添加禁排成员"""
+        with self._lock:
+            self._baned_members.setdefault(group_wxid, set()).add(member_wxid)
+
+    def remove_baned_member(self, group_wxid: str, member_wxid: str):
+        """移除禁排成员，成员未被禁排时忽略"""
+        with self._lock:
+            members = self._baned_members.get(group_wxid)
+            if members is not None:
+                members.discard(member_wxid)
+                if not members:
+                    del self._baned_members[group_wxid]
+
+    def get_enable_groups(self) -> list:
+        """获取所有启用的群组"""
+        return list(self._enable_groups)
+
+    def get_baned_list(self) -> list:
+        """获取所有被禁排成员 [(group_wxid, member_wxid)]"""
+        return [(group_wxid, member_wxid) for group_wxid, members in self._baned_members.items() for member_wxid in members]
+
+
+# 全局群组状态实例
+group_state = GroupState()
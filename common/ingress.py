@@ -0,0 +1,37 @@
+import threading
+import time
+
+
+class IngressStamper:
+    """
+    回调入口到达时间戳（微秒）
+    优先使用微信消息自带的timeStamp（毫秒），没有时使用单调时钟换算的接收时间；
+    同一进程内严格递增（同一毫秒内、或时间戳比上一条消息早时，按接收顺序排在上一条之后），不需要额外的序号区分先后
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_us = 0
+        # 单调时钟起点对应的墙上时间，换算后的时间可以和其他进程比较
+        self._wall_base_us = time.time_ns() // 1000
+        self._mono_base_ns = time.monotonic_ns()
+
+    def _receive_us(self) -> int:
+        """单调时钟换算的接收时间（微秒）"""
+        return self._wall_base_us + (time.monotonic_ns() - self._mono_base_ns) // 1000
+
+    def stamp(self, data: dict) -> int:
+        """
+        为一条回调消息生成到达时间
+        返回: 到达时间微秒
+        """
+        msg_ts = str(data.get("timeStamp", "") or "")
+        with self._lock:
+            base_us = int(msg_ts) * 1000 if msg_ts.isdigit() else self._receive_us()
+            arrival_us = max(base_us, self._last_us + 1)
+            self._last_us = arrival_us
+        return arrival_us
+
+
+# 全局入口时间戳实例
+ingress_stamper = IngressStamper()
@@ -0,0 +1,172 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from common.config import LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_RATE, LOG_CONFIG_KEY, LOG_CONFIG_POLL_SECONDS
+from common.tracing import tracer
+from cache.redis_pool import get_redis_connection
+
+# 完整回调数据等调试输出使用的logger，默认不输出，运行时可以通过redis打开（见 LogConfigWatcher）
+PAYLOAD_LOGGER = "koupai.payload"
+
+# LogRecord 自带的属性，其余属性（extra传入的字段）作为结构化字段输出
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "trace_id", "sample"}
+
+
+def sampled(key: str = "default", **fields) -> dict:
+    """
+    高频日志的extra参数：按 LOG_SAMPLE_RATE 采样输出
+    例如: logger.info("收到消息: %s", msg, extra=sampled("callback", group=group_wxid))
+    """
+    return {"sample": key, **fields}
+
+
+class ContextFilter(logging.Filter):
+    """在调用线程中为日志记录加上当前的追踪ID，并对高频日志采样（采样在入队前进行，丢弃的日志不产生任何开销）"""
+
+    def __init__(self, sample_rate: float = LOG_SAMPLE_RATE):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "sample", None) and record.levelno < logging.WARNING and random.random() >= self.sample_rate:
+            return False
+        record.trace_id = tracer.current_trace_id()
+        return True
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    结构化日志：json 为每行一个JSON对象，text 为便于阅读的单行文本加 key=value 字段
+    extra 传入的字段作为结构化字段输出，payload 字段（回调数据等）只在这里序列化
+    """
+
+    def __init__(self, fmt_type: str = LOG_FORMAT):
+        super().__init__()
+        self.fmt_type = fmt_type
+
+    def fields(self, record: logging.LogRecord) -> dict:
+        return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        fields = self.fields(record)
+        if self.fmt_type == "json":
+            item = {"ts": round(record.created, 6), "level": record.levelname, "logger": record.name, "msg": message}
+            if getattr(record, "trace_id", ""):
+                item["trace_id"] = record.trace_id
+            item.update(fields)
+            if record.exc_info:
+                item["exc"] = self.formatException(record.exc_info)
+            return json.dumps(item, ensure_ascii=False, default=str)
+        created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.created))
+        line = f"{created}.{int(record.msecs):03d} {record.levelname:<7} {record.name}: {message}"
+        if getattr(record, "trace_id", ""):
+            line += f" trace_id={record.trace_id}"
+        for key, value in fields.items():
+            line += f" {key}={json.dumps(value, ensure_ascii=False, default=str) if not isinstance(value, str) else value}"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class AsyncQueueHandler(QueueHandler):
+    """只把日志记录放入队列，格式化和输出都在 QueueListener 的线程中进行"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 默认实现会在调用线程中格式化消息，这里保留原始记录
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # 输出跟不上时丢弃，不阻塞请求和任务
+            pass
+
+
+class LogConfigWatcher:
+    """
+    运行时日志级别：定时读取redis hash（LOG_CONFIG_KEY，字段为logger名称，值为级别），修改后无需重启
+    例如打开完整回调数据输出: HSET log:levels koupai.payload DEBUG，恢复: HDEL log:levels koupai.payload
+    """
+
+    def __init__(self, key: str = LOG_CONFIG_KEY, interval: float = LOG_CONFIG_POLL_SECONDS):
+        self.key = key
+        self.interval = interval
+        # 通过redis修改过的logger及其原来的级别
+        self._defaults = {}
+        self._thread = None
+
+    def apply(self, levels: dict):
+        """应用级别配置，配置中删除的logger恢复原来的级别"""
+        for name, level in levels.items():
+            level = logging.getLevelName(str(level).upper())
+            if not isinstance(level, int):
+                continue
+            target = logging.getLogger(name or None)
+            self._defaults.setdefault(name, target.level)
+            if target.level != level:
+                target.setLevel(level)
+        for name in [name for name in self._defaults if name not in levels]:
+            logging.getLogger(name or None).setLevel(self._defaults.pop(name))
+
+    def poll(self):
+        self.apply(get_redis_connection(0).hgetall(self.key))
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"读取日志级别配置失败: {e}")
+            time.sleep(self.interval)
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name="log-config", daemon=True)
+            self._thread.start()
+
+
+# 全局日志级别配置实例
+log_config_watcher = LogConfigWatcher()
+_listener = None
+
+
+def setup_logging(level: str = LOG_LEVEL, stream=None, watch: bool = True):
+    """
+    配置根logger：日志记录经队列交给后台线程格式化和输出，替换已有的处理器（多次调用只配置一次）
+    watch: 是否定时从redis读取运行时日志级别
+    """
+    global _listener
+    if _listener is not None:
+        return
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(StructuredFormatter())
+    queue_handler = AsyncQueueHandler(queue.Queue(maxsize=100_000))
+    queue_handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    # 调试输出默认关闭，只在运行时打开
+    logging.getLogger(PAYLOAD_LOGGER).setLevel(logging.INFO)
+    _listener = QueueListener(queue_handler.queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    if watch:
+        log_config_watcher.start()
+
+
+def stop_logging():
+    """输出队列中剩余的日志并停止后台线程"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
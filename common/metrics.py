@@ -0,0 +1,225 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from cache.redis_stats import redis_stats
+
+# 默认的耗时分桶（秒），覆盖从redis单条命令到发送消息的范围
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger(__name__)
+
+
+def escape_label_value(value) -> str:
+    """标签值中的反斜杠、引号和换行需要转义"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    """生成 {a="1",b="2"} 形式的标签"""
+    items = [f'{name}="{escape_label_value(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        items.append(extra)
+    return "{" + ",".join(items) + "}" if items else ""
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """只增不减的计数，按标签值分别计数"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def collect(self) -> list:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}" for key, value in values]
+
+
+class Histogram:
+    """耗时分布：按分桶计数，并记录总数和总和"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # 标签值 -> [各分桶计数..., 总数, 总和]
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            item = self._values.get(key)
+            if item is None:
+                item = self._values[key] = [0] * len(self.buckets) + [0, 0.0]
+            if index < len(self.buckets):
+                item[index] += 1
+            item[-2] += 1
+            item[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """记录with块的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        item = self._values.get(self._key(labels))
+        return item[-2] if item else 0
+
+    def collect(self) -> list:
+        with self._lock:
+            values = [(key, list(item)) for key, item in self._values.items()]
+        lines = []
+        for key, item in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, item):
+                cumulative += count
+                le = 'le="%s"' % format_value(bound)
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, le)} {item[-2]}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {item[-2]}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {format_value(item[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    进程内的指标注册表，以Prometheus文本格式输出
+    机器人通过 /metrics 输出，celery worker通过 start_exporter 启动的HTTP服务输出（见 celery_app）
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        # 输出时调用的收集函数，返回 [(名称, 类型, 说明, [样本行])]
+        self._collectors = []
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        """添加输出时调用的收集函数（例如把已有的统计转换为指标）"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        families = [(metric.name, metric.type_name, metric.documentation, metric.collect())
+                    for metric in list(self._metrics.values())]
+        for collector in self._collectors:
+            families.extend(collector())
+        for name, type_name, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {type_name}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+# 全局指标注册表实例
+metrics = MetricsRegistry()
+
+# 回调处理
+HTTP_REQUEST_SECONDS = metrics.histogram("koupai_http_request_seconds", "HTTP请求（回调）处理耗时", ("path",))
+CALLBACK_MESSAGES = metrics.counter("koupai_callback_messages_total", "按消息分类的成员消息数", ("msg_class",))
+COMMANDS = metrics.counter("koupai_commands_total", "按命令的命令消息数", ("command",))
+QUEUE_ADDS = metrics.counter("koupai_queue_adds_total", "按档位加入扣排队列的次数", ("tier",))
+# celery
+BROKER_WAIT_SECONDS = metrics.histogram("koupai_celery_broker_wait_seconds", "任务从发布到开始执行的等待时间", ("task",))
+TASK_SECONDS = metrics.histogram("koupai_celery_task_seconds", "任务执行耗时", ("task",))
+# 依赖
+REDIS_SECONDS = metrics.histogram("koupai_redis_seconds", "每个请求或任务等待redis响应的总时间", ("scope",))
+BOT_API_SECONDS = metrics.histogram("koupai_bot_api_seconds", "千寻接口请求耗时", ("request_type",))
+BOT_API_ERRORS = metrics.counter("koupai_bot_api_errors_total", "千寻接口请求失败次数", ("request_type",))
+SQLITE_SECONDS = metrics.histogram("koupai_sqlite_seconds", "SQLite操作耗时", ("operation",))
+
+
+def collect_redis_stats():
+    """把 cache.redis_stats 按作用域的汇总输出为计数指标"""
+    scopes = redis_stats.snapshot()["scopes"]
+    families = []
+    for field, name, documentation in (("commands", "koupai_redis_commands_total", "按作用域的redis命令数"),
+                                       ("round_trips", "koupai_redis_round_trips_total", "按作用域的redis往返次数")):
+        samples = [f"{name}{format_labels(('scope',), (scope,))} {item[field]}" for scope, item in scopes.items()]
+        families.append((name, "counter", documentation, samples))
+    return families
+
+
+metrics.add_collector(collect_redis_stats)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """GET /metrics 输出指标"""
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 不打印每次抓取的访问日志
+        pass
+
+
+def start_exporter(port: int, host: str = "0.0.0.0"):
+    """在后台线程中启动指标HTTP服务（celery worker等没有HTTP服务的进程使用），返回server"""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True)
+    thread.start()
+    logger.info(f"指标服务已启动: http://{host}:{port}/metrics")
+    return server
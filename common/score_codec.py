@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+# 扣排队列分数编码（v1）
+# 分数 = 基础分 * ARRIVAL_SPAN + (ARRIVAL_SPAN - 1 - 到达偏移)
+# 基础分为整数档位（固定排、固定手速、任务权值、买8、买9、带走），到达偏移为微秒，
+# 同档位内越早到达分数越高；整体为不超过53位的整数，redis中的double可以精确表示
+SCORE_VERSION = 1
+ARRIVAL_BITS = 38
+ARRIVAL_SPAN = 1 << ARRIVAL_BITS    # 约76小时（微秒）
+TIER_LIMIT = 1 << 14                # 基础分绝对值上限，保证 |分数| < 2^53
+# v0（旧版浮点分数）的绝对值不会超过该值，用于区分新旧编码
+LEGACY_LIMIT = 1 << 20
+# v0分数转换为v1后使用的到达偏移范围（微秒），远小于当天实际到达的偏移（至少12小时）
+LEGACY_ARRIVAL_SPAN = 1_000_000
+
+# 各档位基础分
+TIER_FIXED = 1000           # 固定排
+TIER_FIXED_SPEED = 500      # 固定手速
+TIER_SPEED = 0              # 手速/补
+TIER_MAI8 = -200            # 买8 基础分 = 任务权值 - 200
+TIER_MAI9 = -1000           # 买9 基础分 = 任务权值 - 1000
+TIER_DAIZOU = -1500         # 带走
+TIER_MIN = -2000            # 包含带走成员时的下限
+
+# 买8/买9 各自的档位范围 [min, max)
+MAI8_RANGE = (TIER_MAI8, 0)
+MAI9_RANGE = (TIER_MAI9, -500)
+
+
+def arrival_epoch_us(current_date: str) -> int:
+    """到达偏移的起点：队列日期前一天12点（微秒）"""
+    epoch = datetime.strptime(current_date, "%Y-%m-%d") - timedelta(hours=12)
+    return int(epoch.timestamp()) * 1_000_000
+
+
+def encode_score(base_score: int, arrival_us: int, current_date: str) -> int:
+    """将基础分和到达时间（微秒时间戳）编码为整数分数"""
+    base_score = int(base_score)
+    if not -TIER_LIMIT < base_score < TIER_LIMIT:
+        raise ValueError(f"基础分超出范围: {base_score}")
+    offset = min(max(arrival_us - arrival_epoch_us(current_date), 0), ARRIVAL_SPAN - 1)
+    return base_score * ARRIVAL_SPAN + (ARRIVAL_SPAN - 1 - offset)
+
+
+def decode_score(score: float, current_date: str = None) -> Tuple[int, Optional[int], int]:
+    """
+    解码分数
+    返回: (基础分, 到达时间微秒时间戳（v0或未提供日期时为None）, 编码版本)
+    """
+    if abs(score) < LEGACY_LIMIT:
+        # v0: base_score + 时间小数部分
+        return int(score // 1), None, 0
+    score = int(score)
+    base_score = score // ARRIVAL_SPAN
+    offset = ARRIVAL_SPAN - 1 - (score - base_score * ARRIVAL_SPAN)
+    arrival_us = arrival_epoch_us(current_date) + offset if current_date else None
+    return base_score, arrival_us, SCORE_VERSION
+
+
+def upgrade_legacy_score(score: float) -> int:
+    """
+    将v0分数（基础分 + 越早到达越大的时间小数）转换为v1编码
+    v0的成员都早于升级，转换后排在同档位所有新到达的成员之前，相互之间保持原来的顺序
+    """
+    base_score = int(score // 1)
+    fraction = score - base_score
+    offset = min(int((1 - fraction) * LEGACY_ARRIVAL_SPAN), LEGACY_ARRIVAL_SPAN)
+    if not -TIER_LIMIT < base_score < TIER_LIMIT:
+        raise ValueError(f"基础分超出范围: {base_score}")
+    return base_score * ARRIVAL_SPAN + (ARRIVAL_SPAN - 1 - offset)
+
+
+def tier_min(base_score: int) -> int:
+    """基础分不低于base_score的最小分数"""
+    return int(base_score) * ARRIVAL_SPAN
+
+
+def tier_bounds(min_base: int, max_base: int = None) -> Tuple[int, float]:
+    """
+    基础分在 [min_base, max_base) 范围内的分数上下限（闭区间，可直接用于ZCOUNT/ZRANGEBYSCORE）
+    max_base为None时上限为正无穷
+    """
+    max_score = float('inf') if max_base is None else int(max_base) * ARRIVAL_SPAN - 1
+    return tier_min(min_base), max_score
+
+
+def tier_name(base_score: int) -> str:
+    """基础分所在的档位名称（用于统计）"""
+    base_score = int(base_score)
+    if base_score >= TIER_FIXED:
+        return "fixed"
+    if base_score >= TIER_FIXED_SPEED:
+        return "fixed_speed"
+    if base_score > TIER_SPEED:
+        return "renwu"
+    if base_score == TIER_SPEED:
+        return "speed"
+    if MAI8_RANGE[0] <= base_score < MAI8_RANGE[1]:
+        return "mai8"
+    if MAI9_RANGE[0] <= base_score < MAI9_RANGE[1]:
+        return "mai9"
+    return "daizou"
@@ -0,0 +1,251 @@
+import atexit
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+import requests
+from common.config import TRACE_EXPORT_PATH, TRACE_COLLECTOR_URL, TRACE_SAMPLE_RATE, TRACE_SERVICE_NAME
+
+logger = logging.getLogger(__name__)
+
+# 跨进程传递追踪上下文的celery消息头
+HEADER_TRACE_ID = "trace_id"
+HEADER_PARENT_SPAN_ID = "parent_span_id"
+HEADER_SAMPLED = "trace_sampled"
+
+# 导出格式为 Zipkin v2 JSON（时间单位为微秒），文件中每行一个span，收集器按批POST一个span数组
+# （Zipkin、Jaeger、OpenTelemetry Collector 的 zipkin receiver 均可接收）
+
+
+def new_id(bits: int = 64) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Span:
+    """一次操作的耗时，属于一个追踪（trace_id），parent_id 为上一跳的span"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "sampled", "start", "duration", "tags")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str = None, sampled: bool = True, start: float = None, **tags):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = new_id()
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start = start if start is not None else time.time()
+        self.duration = None
+        self.tags = {key: str(value) for key, value in tags.items() if value is not None}
+
+    def tag(self, **tags):
+        self.tags.update({key: str(value) for key, value in tags.items() if value is not None})
+
+    def finish(self, end: float = None):
+        self.duration = max((end if end is not None else time.time()) - self.start, 0)
+
+    def ref(self) -> dict:
+        """发送消息等跨线程传递时携带的追踪信息（可JSON序列化）"""
+        return {"trace_id": self.trace_id, "span_id": self.span_id, "sampled": self.sampled, "ts": time.time()}
+
+    def to_zipkin(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "id": self.span_id,
+            "name": self.name,
+            "timestamp": int(self.start * 1_000_000),
+            "duration": max(int((self.duration or 0) * 1_000_000), 1),
+            "localEndpoint": {"serviceName": TRACE_SERVICE_NAME},
+            "tags": self.tags,
+        }
+        if self.parent_id:
+            span["parentId"] = self.parent_id
+        return span
+
+
+class SpanExporter:
+    """
+    span导出：结束的span放入内存队列，由后台线程批量追加写入文件和/或POST到收集器，不阻塞请求和任务
+    """
+
+    def __init__(self, path: str = "", url: str = "", batch: int = 200):
+        self.path = path
+        self.url = url
+        self.batch = batch
+        self._queue = queue.Queue(maxsize=100_000)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path or self.url)
+
+    def export(self, span: Span):
+        if not self.enabled:
+            return
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # fork后的子进程重新启动导出线程
+                    self._queue = queue.Queue(maxsize=100_000)
+                    self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                    self._thread.start()
+                    self._pid = os.getpid()
+        try:
+            self._queue.put_nowait(span.to_zipkin())
+        except queue.Full:
+            # 导出跟不上时丢弃，不影响业务
+            pass
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            items = [item]
+            while len(items) < self.batch:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # None 为停止标记
+            spans = [item for item in items if item is not None]
+            if spans:
+                self._write(spans)
+            if len(spans) < len(items):
+                return
+
+    def _write(self, spans: list):
+        if self.path:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps(span, ensure_ascii=False, separators=(",", ":")) + "\n" for span in spans)
+            except OSError as e:
+                logger.warning(f"写入span文件失败: {e}")
+        if self.url:
+            try:
+                requests.post(self.url, json=spans, timeout=5)
+            except requests.RequestException as e:
+                logger.warning(f"发送span到收集器失败: {e}")
+
+    def close(self):
+        """导出剩余的span并停止后台线程"""
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+            self._pid = None
+
+
+class Tracer:
+    """
+    追踪：在回调入口创建追踪，通过contextvars在同一请求/任务内传递当前span，
+    通过celery消息头（见 inject/extract）和发送消息的元数据（见 ref/record_send）跨进程、跨线程传递
+    未配置导出时只传递追踪ID（用于日志关联），不记录span
+    """
+
+    def __init__(self, exporter: SpanExporter = None, sample_rate: float = TRACE_SAMPLE_RATE):
+        self.exporter = exporter or SpanExporter()
+        self.sample_rate = sample_rate
+        self._current: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+
+    def current(self) -> Optional[Span]:
+        return self._current.get()
+
+    def current_trace_id(self) -> str:
+        span = self._current.get()
+        return span.trace_id if span else ""
+
+    def begin(self, name: str, trace_id: str = None, parent_id: str = None, sampled: bool = None, **tags):
+        """
+        开始一个span并设为当前span，返回用于 end 的token
+        没有指定trace_id时作为当前span的子span，没有当前span时开始一个新的追踪
+        """
+        parent = self._current.get()
+        if trace_id is None and parent is not None:
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        if trace_id is None:
+            trace_id = new_id(128)
+        if sampled is None:
+            sampled = random.random() < self.sample_rate
+        return self._current.set(Span(name, trace_id, parent_id, sampled, **tags))
+
+    def end(self, token) -> Optional[Span]:
+        """结束当前span并导出"""
+        span = self._current.get()
+        self._current.reset(token)
+        if span is not None:
+            span.finish()
+            if span.sampled:
+                self.exporter.export(span)
+        return span
+
+    @contextmanager
+    def span(self, name: str, **tags):
+        token = self.begin(name, **tags)
+        try:
+            yield self._current.get()
+        finally:
+            self.end(token)
+
+    def trace(self, name: str = None):
+        """装饰器：函数调用记录为当前span的子span"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name or func.__name__):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def tag(self, **tags):
+        """为当前span添加标签，不在span内时忽略"""
+        span = self._current.get()
+        if span is not None:
+            span.tag(**tags)
+
+    def inject(self, headers: dict):
+        """把当前追踪上下文写入celery消息头"""
+        span = self._current.get()
+        if span is not None:
+            headers[HEADER_TRACE_ID] = span.trace_id
+            headers[HEADER_PARENT_SPAN_ID] = span.span_id
+            headers[HEADER_SAMPLED] = span.sampled
+
+    def extract(self, request) -> dict:
+        """从celery任务的请求上下文中读取追踪上下文，作为 begin 的参数"""
+        trace_id = request.get(HEADER_TRACE_ID)
+        if not trace_id:
+            return {}
+        return {"trace_id": trace_id, "parent_id": request.get(HEADER_PARENT_SPAN_ID), "sampled": request.get(HEADER_SAMPLED, True)}
+
+    def ref(self) -> Optional[dict]:
+        """当前span的追踪信息，随消息一起传递到发送线程"""
+        span = self._current.get()
+        return span.ref() if span is not None else None
+
+    def record_span(self, name: str, trace_id: str, parent_id: str, start: float, end: float, **tags):
+        """记录一个已经结束的span（例如broker等待、发送排队，开始和结束不在同一处）"""
+        span = Span(name, trace_id, parent_id, start=start, **tags)
+        span.finish(end)
+        self.exporter.export(span)
+
+    def record_send(self, refs, start: float, end: float, **tags):
+        """
+        记录一次消息发送：为合并到这条消息中的每个追踪记录排队（从调用send_message到开始发送）和发送两个span
+        refs: ref() 返回的追踪信息列表
+        """
+        for ref in refs or ():
+            if not ref or not ref.get("sampled"):
+                continue
+            self.record_span("send_queue", ref["trace_id"], ref["span_id"], ref["ts"], start, **tags)
+            self.record_span("send_message", ref["trace_id"], ref["span_id"], start, end, **tags)
+
+
+# 全局追踪实例
+tracer = Tracer(SpanExporter(TRACE_EXPORT_PATH, TRACE_COLLECTOR_URL))
@@ -0,0 +1,40 @@
+import random
+import threading
+import time
+import pytest
+
+# test_tasks.py、test_tasks2.py 是手动向celery提交任务的脚本（导入时会连接broker），不作为测试收集
+collect_ignore = ["test_tasks.py", "test_tasks2.py"]
+
+
+@pytest.fixture
+def redis_conn():
+    """独立的内存redis（fakeredis），Lua脚本需要lupa，缺少时跳过"""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    return fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+
+
+class RecordingSender:
+    """记录发送的消息 (wxid, msg, priority, traces)，delay 大于0时每次发送随机耗时 [0, delay) 秒"""
+
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def __call__(self, wxid, msg, priority, traces):
+        if self.delay:
+            time.sleep(random.uniform(0, self.delay))
+        with self._lock:
+            self.sent.append((wxid, msg, priority, traces))
+
+    def messages(self, wxid: str = None) -> list:
+        """按发送顺序返回消息内容，指定wxid时只返回该群组的消息"""
+        return [msg for group, msg, _, _ in self.sent if wxid is None or group == wxid]
+
+
+@pytest.fixture
+def sender():
+    """记录发送的消息的发送函数（SendScheduler、MessageCoalescer 的 send_func）"""
+    return RecordingSender()
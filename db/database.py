@@ -4,6 +4,7 @@ from typing import Optional, AsyncGenerator
 from contextlib import asynccontextmanager
 import logging
 from collections import deque
+from common.metrics import SQLITE_SECONDS
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -238,10 +239,11 @@ class DatabaseManager:
     async def execute_query(self, query: str, params: tuple = ()) -> list:
         """执行查询并返回所有结果"""
         try:
-            async with self.get_connection() as conn:
-                cursor = await conn.execute(query, params)
-                results = await cursor.fetchall()
-                return results
+            with SQLITE_SECONDS.time(operation="query"):
+                async with self.get_connection() as conn:
+                    cursor = await conn.execute(query, params)
+                    results = await cursor.fetchall()
+                    return results
         except Exception as e:
             logger.error(f"查询执行失败: {query}, 参数: {params}, 错误: {e}")
             raise
@@ -249,10 +251,11 @@ class DatabaseManager:
     async def execute_single_query(self, query: str, params: tuple = ()):
         """执行查询并返回单个结果"""
         try:
-            async with self.get_connection() as conn:
-                cursor = await conn.execute(query, params)
-                result = await cursor.fetchone()
-                return result
+            with SQLITE_SECONDS.time(operation="single_query"):
+                async with self.get_connection() as conn:
+                    cursor = await conn.execute(query, params)
+                    result = await cursor.fetchone()
+                    return result
         except Exception as e:
             logger.error(f"单条查询执行失败: {query}, 参数: {params}, 错误: {e}")
             raise
@@ -260,22 +263,24 @@ class DatabaseManager:
     async def execute_update(self, query: str, params: tuple = ()) -> int:
         """执行更新操作并返回影响的行数"""
         try:
-            async with self.get_connection() as conn:
-                cursor = await conn.execute(query, params)
-                await conn.commit()
-                rowcount = cursor.rowcount
-                logger.info(f"更新操作成功，影响行数: {rowcount}")
-                return rowcount
+            with SQLITE_SECONDS.time(operation="update"):
+                async with self.get_connection() as conn:
+                    cursor = await conn.execute(query, params)
+                    await conn.commit()
+                    rowcount = cursor.rowcount
+                    logger.info(f"更新操作成功，影响行数: {rowcount}")
+                    return rowcount
         except Exception as e:
             logger.error(f"更新操作失败: {query}, 参数: {params}, 错误: {e}")
             raise
     async def execute_many(self, query: str, params_list: list):
         """执行批量更新操作"""
         try:
-            async with self.get_connection() as conn:
-                await conn.executemany(query, params_list)
-                await conn.commit()
-                logger.info(f"批量更新操作成功，影响行数: {len(params_list)}")
+            with SQLITE_SECONDS.time(operation="many"):
+                async with self.get_connection() as conn:
+                    await conn.executemany(query, params_list)
+                    await conn.commit()
+                    logger.info(f"批量更新操作成功，影响行数: {len(params_list)}")
         except Exception as e:
             logger.error(f"批量更新操作失败: {query}, 参数列表: {params_list}, 错误: {e}")
             raise
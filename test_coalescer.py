@@ -0,0 +1,68 @@
+import time
+from utils.coalescer import MessageCoalescer
+from utils.send_scheduler import PRIORITY_NORMAL, PRIORITY_URGENT
+
+
+def make_coalescer(sender, **kwargs):
+    options = dict(window_ms=200, max_chars=10, separator="|")
+    options.update(kwargs)
+    return MessageCoalescer(sender, **options)
+
+
+def test_messages_in_window_are_merged_in_order(sender):
+    coalescer = make_coalescer(sender, max_chars=100)
+    coalescer.send("g1", "a", trace={"span_id": "1"})
+    coalescer.send("g1", "b", PRIORITY_URGENT, trace={"span_id": "2"})
+    coalescer.send("g2", "c")
+    time.sleep(0.3)
+    assert sorted(sender.sent) == [("g1", "a|b", PRIORITY_URGENT, [{"span_id": "1"}, {"span_id": "2"}]),
+                                   ("g2", "c", PRIORITY_NORMAL, [None])]
+
+
+def test_overflow_keeps_one_timer_per_group(sender):
+    coalescer = make_coalescer(sender)
+    coalescer.send("g1", "aaaaaa")
+    time.sleep(0.1)
+    # 超过最大长度：先发送a，b留在缓冲中由第一条消息的定时器发送
+    coalescer.send("g1", "bbbbbb")
+    assert sender.messages() == ["aaaaaa"]
+    assert len(coalescer._timers) == 1
+    time.sleep(0.15)
+    assert sender.messages() == ["aaaaaa", "bbbbbb"]
+    # 之后的消息重新计时，不会被多余的定时器提前发送
+    coalescer.send("g1", "c")
+    time.sleep(0.1)
+    assert sender.messages() == ["aaaaaa", "bbbbbb"]
+    time.sleep(0.2)
+    assert sender.messages() == ["aaaaaa", "bbbbbb", "c"]
+    assert coalescer._timers == {}
+
+
+def test_flush_cancels_pending_timer(sender):
+    coalescer = make_coalescer(sender)
+    coalescer.send("g1", "a")
+    coalescer.flush("g1")
+    assert coalescer._timers == {}
+    coalescer.send("g1", "b")
+    time.sleep(0.1)
+    assert sender.messages() == ["a"]
+    time.sleep(0.2)
+    assert sender.messages() == ["a", "b"]
+
+
+def test_shutdown_hands_buffers_to_shutdown_func(sender):
+    stored = []
+    coalescer = make_coalescer(sender, max_chars=100,
+                               shutdown_func=lambda wxid, msg, priority, traces: stored.append((wxid, msg)))
+    coalescer.send("g1", "a")
+    coalescer.send("g1", "b")
+    coalescer.shutdown()
+    time.sleep(0.3)
+    assert stored == [("g1", "a|b")]
+    assert sender.sent == []
+
+
+def test_without_window_sends_immediately(sender):
+    coalescer = make_coalescer(sender, window_ms=0)
+    coalescer.send("g1", "a")
+    assert sender.sent == [("g1", "a", PRIORITY_NORMAL, [None])]
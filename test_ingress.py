@@ -0,0 +1,30 @@
+from common.ingress import IngressStamper
+
+
+def test_stamps_strictly_increasing_within_one_millisecond():
+    stamper = IngressStamper()
+    stamps = [stamper.stamp({"timeStamp": "1700000000000"}) for _ in range(2500)]
+    assert all(a < b for a, b in zip(stamps, stamps[1:]))
+    assert stamps[0] == 1700000000000 * 1000
+
+
+def test_stamps_follow_message_timestamp():
+    stamper = IngressStamper()
+    first = stamper.stamp({"timeStamp": "1700000000000"})
+    later = stamper.stamp({"timeStamp": "1700000000005"})
+    assert later == 1700000000005 * 1000 > first
+
+
+def test_earlier_message_timestamp_keeps_receive_order():
+    stamper = IngressStamper()
+    first = stamper.stamp({"timeStamp": "1700000000005"})
+    second = stamper.stamp({"timeStamp": "1700000000000"})
+    assert second > first
+
+
+def test_stamps_without_message_timestamp_increase():
+    stamper = IngressStamper()
+    stamps = [stamper.stamp({}) for _ in range(1000)]
+    assert all(a < b for a, b in zip(stamps, stamps[1:]))
+    mixed = [stamper.stamp({"timeStamp": "1"}), stamper.stamp({})]
+    assert stamps[-1] < mixed[0] < mixed[1]
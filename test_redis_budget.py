@@ -0,0 +1,107 @@
+import asyncio
+import socket
+import threading
+import pytest
+import redis
+from cache.redis_stats import redis_stats, InstrumentedConnection, RedisBudgetExceeded
+
+REDIS_ADDRESS = ("127.0.0.1", 6379)
+
+
+@pytest.fixture(scope="module")
+def fake_server():
+    """
+    在 127.0.0.1:6379 上启动 fakeredis 服务（连接池和celery broker的地址是固定的），
+    端口已被占用时跳过，避免写入真实redis（导入celery时会清空broker）
+    """
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    pytest.importorskip("celery")
+    with socket.socket() as sock:
+        if sock.connect_ex(REDIS_ADDRESS) == 0:
+            pytest.skip("6379 端口已有redis服务")
+    server = fakeredis.TcpFakeServer(REDIS_ADDRESS, server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def instrumented_conn(fake_server):
+    pool = redis.ConnectionPool(host=REDIS_ADDRESS[0], port=REDIS_ADDRESS[1], db=2, decode_responses=True,
+                                connection_class=InstrumentedConnection)
+    client = redis.Redis(connection_pool=pool)
+    client.ping()
+    yield client
+    client.close()
+    pool.disconnect()
+
+
+def test_instrumented_connection_counts_commands(instrumented_conn):
+    with redis_stats.scope("single") as counter:
+        instrumented_conn.set("budget:key", 1)
+        instrumented_conn.get("budget:key")
+    assert (counter.round_trips, counter.commands) == (2, 2)
+
+
+def test_pipeline_is_one_round_trip(instrumented_conn):
+    with redis_stats.budget("pipeline", round_trips=1, commands=3) as counter:
+        with instrumented_conn.pipeline(transaction=False) as pipe:
+            pipe.set("budget:key", 1)
+            pipe.incr("budget:key")
+            pipe.get("budget:key")
+            assert pipe.execute() == [True, 2, "2"]
+    assert (counter.round_trips, counter.commands) == (1, 3)
+
+
+def test_budget_exceeded_raises(instrumented_conn):
+    with pytest.raises(RedisBudgetExceeded):
+        with redis_stats.budget("over", round_trips=1):
+            instrumented_conn.get("budget:key")
+            instrumented_conn.get("budget:key")
+
+
+def test_fast_path_operations_within_budget(fake_server, monkeypatch):
+    """快速通道的成员操作为一次读取（pipeline）加一次原子脚本"""
+    from cache.redis_pool import get_redis_connection, redis_pool
+    from common.clock import clock
+    from celery_tasks.fast_path import koupai_fast_path
+    from celery_tasks.tasks_crud import get_task_key
+    from benchmark.redis_budget import setup_group, clear_group, load_scripts
+    from benchmark.callback_driver import group_wxid_of, member_wxid_of
+
+    # 后台发送的消息不计入预算（在后台线程中执行，计数时机不确定）
+    sent = []
+    monkeypatch.setattr(koupai_fast_path, "_send_later", lambda func, *args: sent.append(func.__name__))
+    redis_conn = get_redis_connection(0)
+    hour = clock.now().hour
+    group_wxid = group_wxid_of(99998)
+    members = [member_wxid_of(99998, i) for i in range(2)]
+    setup_group(redis_conn, group_wxid, hour, members)
+    load_scripts(redis_conn)
+    cases = [
+        ("fast add p", lambda: koupai_fast_path.add_koupai_member(group_wxid, members[0], "p")),
+        ("fast renwu", lambda: koupai_fast_path.update_koupai_member(group_wxid, members[0], "1.0")),
+        ("fast mai89", lambda: koupai_fast_path.add_mai89_member(group_wxid, members[1], "买81.0")),
+        ("fast daizou", lambda: koupai_fast_path.add_daizou_member(group_wxid, members[0])),
+    ]
+
+    async def run_cases():
+        counters = {}
+        try:
+            for name, func in cases:
+                with redis_stats.budget(name, round_trips=2) as counter:
+                    await func()
+                counters[name] = counter.round_trips
+        finally:
+            await redis_pool.close_async()
+        return counters
+
+    try:
+        counters = asyncio.run(run_cases())
+        assert redis_conn.zcard(get_task_key(group_wxid, (hour+1)%24)) == 2
+    finally:
+        clear_group(redis_conn, group_wxid, hour)
+    assert all(round_trips >= 1 for round_trips in counters.values())
+    assert sent
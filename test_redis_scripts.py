@@ -0,0 +1,83 @@
+from cache.redis_scripts import redis_scripts
+from celery_tasks.tasks_crud import get_task_key, get_task_index_key, build_add_member_args, get_member, delete_member
+from common.clock import clock
+from common.score_codec import TIER_SPEED, TIER_MAI8, TIER_MAI9, TIER_DAIZOU
+
+HOUR = 10
+# 各用例的到达时间以此为起点
+BASE_US = int(clock.time() * 1_000_000)
+
+
+def add(redis_conn, member_wxid, base_score=TIER_SPEED, msg_content="p", arrival=0, limit=8, mai_type=""):
+    """按指定的到达顺序（arrival，微秒偏移）执行 add_with_timestamp 脚本，返回 (被挤出去的成员, 正分成员数量)"""
+    keys, args = build_add_member_args("g1", member_wxid, base_score, msg_content, limit, mai_type,
+                                       current_hour=HOUR, arrival_us=BASE_US + arrival)
+    exit_member, count = redis_scripts.run(redis_conn, "add_with_timestamp", keys=keys, args=args)
+    return exit_member, count
+
+
+def queue(redis_conn) -> list:
+    """扣排队列中的成员，按分数从高到低"""
+    return redis_conn.zrevrange(get_task_key("g1", HOUR), 0, -1)
+
+
+def test_same_tier_ordered_by_arrival(redis_conn):
+    add(redis_conn, "a", arrival=20)
+    add(redis_conn, "b", arrival=0)
+    add(redis_conn, "c", arrival=10)
+    add(redis_conn, "d", base_score=3, msg_content="1.0", arrival=30)
+    assert queue(redis_conn) == ["d:1.0", "b:p", "c:p", "a:p"]
+
+
+def test_existing_member_is_replaced_through_index(redis_conn):
+    add(redis_conn, "a")
+    add(redis_conn, "b", arrival=1)
+    assert add(redis_conn, "a", base_score=3, msg_content="1.0", arrival=2) == ("", 2)
+    assert queue(redis_conn) == ["a:1.0", "b:p"]
+    assert redis_conn.hgetall(get_task_index_key(get_task_key("g1", HOUR))) == {"a": "a:1.0", "b": "b:p"}
+    assert get_member(redis_conn, "g1", "a", HOUR)[0::2] == ("1.0", "")
+
+
+def test_overflow_evicts_lowest_positive_member(redis_conn):
+    assert add(redis_conn, "a", arrival=0, limit=2) == ("", 1)
+    assert add(redis_conn, "b", arrival=1, limit=2) == ("", 2)
+    # 同档位后到的成员分数最低，被挤出的是自己
+    assert add(redis_conn, "c", arrival=2, limit=2) == ("c", 2)
+    # 高档位挤出同档位最后到的正分成员
+    assert add(redis_conn, "d", base_score=3, msg_content="1.0", arrival=3, limit=2) == ("b", 2)
+    assert queue(redis_conn) == ["d:1.0", "a:p"]
+    assert get_member(redis_conn, "g1", "b", HOUR) is None
+
+
+def test_mai89_evicts_only_within_its_range(redis_conn):
+    add(redis_conn, "a", arrival=0)
+    add(redis_conn, "x", base_score=TIER_MAI9 + 3, msg_content="p9 1.0", arrival=1, mai_type="p9")
+    assert add(redis_conn, "y", base_score=TIER_MAI8 + 3, msg_content="p8 1.0", arrival=2, mai_type="p8") == ("", 1)
+    # 买8范围内已有成员：分数较低的被挤出，买9和正分成员不受影响
+    assert add(redis_conn, "z", base_score=TIER_MAI8 + 5, msg_content="p8 2.0", arrival=3, mai_type="p8") == ("y", 1)
+    assert queue(redis_conn) == ["a:p", "z:p8 2.0", "x:p9 1.0"]
+
+
+def test_daizou_never_evicts(redis_conn):
+    add(redis_conn, "a", arrival=0, limit=1)
+    add(redis_conn, "b", arrival=1, limit=1, mai_type="p8", base_score=TIER_MAI8 + 1, msg_content="p8 1.0")
+    assert add(redis_conn, "a", base_score=TIER_DAIZOU, msg_content="p:带走", arrival=2, limit=0, mai_type="daizou") == ("", 0)
+    assert add(redis_conn, "c", base_score=TIER_DAIZOU, msg_content="p:带走", arrival=3, limit=0, mai_type="daizou") == ("", 0)
+    assert queue(redis_conn) == ["b:p8 1.0", "a:p:带走", "c:p:带走"]
+
+
+def test_remove_member_updates_queue_and_index(redis_conn):
+    add(redis_conn, "a", arrival=0)
+    add(redis_conn, "b", arrival=1)
+    assert delete_member(redis_conn, "g1", "a", HOUR, limit_koupai=8) == 7
+    assert queue(redis_conn) == ["b:p"]
+    assert redis_conn.hgetall(get_task_index_key(get_task_key("g1", HOUR))) == {"b": "b:p"}
+    # 不在队列中的成员
+    assert delete_member(redis_conn, "g1", "a", HOUR, limit_koupai=8) == 7
+
+
+def test_index_is_rebuilt_for_old_queues(redis_conn):
+    task_key = get_task_key("g1", HOUR)
+    redis_conn.zadd(task_key, {"a:p": 5})
+    assert add(redis_conn, "a", base_score=3, msg_content="1.0") == ("", 1)
+    assert queue(redis_conn) == ["a:1.0"]
@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+from celery_tasks.scheduler_index import (claim_due_events, restore_events, make_event, EVENTS_KEY,
+                                          EVENT_START, EVENT_SCHEDULE, DAY_SECONDS)
+
+NOW = datetime(2026, 10, 18, 9, 30, 5)
+
+
+def test_claim_moves_due_events_to_next_day(redis_conn):
+    fire_time = NOW.replace(second=0).timestamp()
+    redis_conn.zadd(EVENTS_KEY, {make_event(EVENT_START, "g1", 9): fire_time,
+                                 make_event(EVENT_SCHEDULE, "g1", 10): fire_time + 3600})
+    assert claim_due_events(redis_conn, NOW) == [(EVENT_START, "g1", 9, fire_time)]
+    assert redis_conn.zscore(EVENTS_KEY, make_event(EVENT_START, "g1", 9)) == fire_time + DAY_SECONDS
+    assert claim_due_events(redis_conn, NOW) == []
+
+
+def test_restored_events_are_claimed_again(redis_conn):
+    fire_time = NOW.replace(second=0).timestamp()
+    redis_conn.zadd(EVENTS_KEY, {make_event(EVENT_START, "g1", 9): fire_time})
+    claimed = claim_due_events(redis_conn, NOW)
+    # 发布失败：恢复后下一分钟重新领取
+    restore_events(redis_conn, claimed)
+    assert claim_due_events(redis_conn, NOW + timedelta(minutes=1)) == claimed
+
+
+def test_restore_skips_removed_events(redis_conn):
+    fire_time = NOW.replace(second=0).timestamp()
+    redis_conn.zadd(EVENTS_KEY, {make_event(EVENT_START, "g1", 9): fire_time})
+    claimed = claim_due_events(redis_conn, NOW)
+    # 领取后群组的事件被重建移除
+    redis_conn.zrem(EVENTS_KEY, make_event(EVENT_START, "g1", 9))
+    restore_events(redis_conn, claimed)
+    assert redis_conn.zcard(EVENTS_KEY) == 0
@@ -0,0 +1,83 @@
+from celery_tasks.tasks_crud import (get_task_key, get_task_index_key, build_add_member_args, get_group_task_members,
+                                     upgrade_legacy_scores)
+from cache.redis_scripts import redis_scripts
+from common.clock import clock
+from common.score_codec import (decode_score, encode_score, tier_min, upgrade_legacy_score,
+                                TIER_SPEED, TIER_MAI9, TIER_DAIZOU, LEGACY_LIMIT)
+
+DATE = "2026-10-18"
+
+
+def test_upgraded_legacy_scores_keep_tier_and_order():
+    earlier, later = upgrade_legacy_score(0.75), upgrade_legacy_score(0.25)
+    assert earlier > later
+    assert decode_score(earlier)[0] == TIER_SPEED
+    assert decode_score(upgrade_legacy_score(TIER_DAIZOU + 0.5))[0] == TIER_DAIZOU
+    assert upgrade_legacy_score(TIER_DAIZOU + 0.5) < tier_min(TIER_MAI9)
+    # 旧成员都早于升级，排在同档位新到达的成员之前
+    arrival_us = int(clock.time() * 1_000_000)
+    assert later > encode_score(TIER_SPEED, arrival_us, clock.now().strftime("%Y-%m-%d"))
+
+
+def test_history_with_mixed_scores(redis_conn):
+    key = f"history:tasks:g1:{DATE}:10"
+    arrival_us = int(clock.time() * 1_000_000)
+    redis_conn.zadd(key, {
+        "old1:p": 0.75,
+        "old2:p": 0.25,
+        "old3:p:带走": TIER_DAIZOU + 0.5,
+        "new1:p": encode_score(TIER_SPEED, arrival_us, DATE),
+        "new2:p:带走": encode_score(TIER_DAIZOU, arrival_us, DATE),
+    })
+    # 升级前v0的带走成员落在买9以上的范围内
+    assert "old3:p:带走" in redis_conn.zrangebyscore(key, tier_min(TIER_MAI9), float("inf"))
+
+    assert upgrade_legacy_scores(redis_conn) == 3
+    assert redis_conn.zcount(key, f"({-LEGACY_LIMIT}", f"({LEGACY_LIMIT}") == 0
+    members = get_group_task_members(redis_conn, "g1", 9, date=DATE)
+    assert [member for member, *_ in members] == ["old1", "old2", "new1"]
+    with_daizou = get_group_task_members(redis_conn, "g1", 9, with_daizou=True, date=DATE)
+    assert [member for member, *_ in with_daizou] == ["old1", "old2", "new1", "old3", "new2"]
+    # 重复调用没有影响
+    assert upgrade_legacy_scores(redis_conn) == 0
+
+
+def test_upgrade_skips_other_key_types(redis_conn):
+    redis_conn.sadd("tasks:launch_tasks:koupai_tasks_list", "g1:10")
+    assert upgrade_legacy_scores(redis_conn) == 0
+
+
+def test_overflow_evicts_newest_instead_of_legacy_member(redis_conn):
+    task_key = get_task_key("g1", 10)
+    redis_conn.zadd(task_key, {"old:p": 0.5})
+    redis_conn.hset(get_task_index_key(task_key), "old", "old:p")
+    upgrade_legacy_scores(redis_conn)
+    arrival_us = int(clock.time() * 1_000_000)
+    for i, member_wxid in enumerate(("a", "b")):
+        keys, args = build_add_member_args("g1", member_wxid, TIER_SPEED, "p", limit_koupai=2, current_hour=10,
+                                           arrival_us=arrival_us + i)
+        exit_member, count = redis_scripts.run(redis_conn, "add_with_timestamp", keys=keys, args=args)
+    assert (exit_member, count) == ("b", 2)
+    assert redis_conn.zrevrange(task_key, 0, -1) == ["old:p", "a:p"]
+
+
+def test_encode_decode_round_trip():
+    epoch_us = int(clock.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp()) * 1_000_000
+    for base_score in (1000, 500, 3, TIER_SPEED, -197, -997, TIER_DAIZOU):
+        for arrival_us in (epoch_us, epoch_us + 1, epoch_us + 3_600_000_000 * 23 + 999_999):
+            score = encode_score(base_score, arrival_us, clock.now().strftime("%Y-%m-%d"))
+            assert score == int(float(score))
+            assert decode_score(float(score), clock.now().strftime("%Y-%m-%d")) == (base_score, arrival_us, 1)
+
+
+def test_tiers_never_overlap_and_earlier_ranks_higher():
+    current_date = clock.now().strftime("%Y-%m-%d")
+    now_us = int(clock.time() * 1_000_000)
+    # 高档位最晚到达的分数仍高于低档位最早到达的分数
+    tiers = [1000, 500, 3, TIER_SPEED, -197, TIER_MAI9 + 3, TIER_DAIZOU]
+    scores = [(encode_score(base, now_us + 3_600_000_000, current_date), encode_score(base, now_us - 3_600_000_000, current_date))
+              for base in tiers]
+    for (latest_high, _), (_, earliest_low) in zip(scores, scores[1:]):
+        assert latest_high > earliest_low
+    assert encode_score(TIER_SPEED, now_us, current_date) > encode_score(TIER_SPEED, now_us + 1, current_date)
+    assert tier_min(TIER_MAI9) <= encode_score(TIER_MAI9, now_us, current_date) < tier_min(TIER_MAI9 + 1)
@@ -0,0 +1,58 @@
+import threading
+import time
+from utils.send_scheduler import SendScheduler, PRIORITY_NORMAL, PRIORITY_URGENT
+
+
+def make_scheduler(sender, **kwargs):
+    # 随机的发送耗时，并发发送时后提交的消息可能先完成
+    sender.delay = 0.01
+    options = dict(concurrency=4, global_rate=0, global_burst=1, group_rate=0, group_burst=5)
+    options.update(kwargs)
+    return SendScheduler(sender, **options)
+
+
+def test_same_group_in_submission_order(sender):
+    scheduler = make_scheduler(sender)
+    for i in range(20):
+        scheduler.submit("g1", str(i))
+    scheduler.drain(timeout=5)
+    assert sender.messages() == [str(i) for i in range(20)]
+
+
+def test_same_group_in_order_with_group_burst(sender):
+    scheduler = make_scheduler(sender, group_rate=1000, group_burst=5)
+    for i in range(10):
+        scheduler.submit("g1", str(i))
+    scheduler.drain(timeout=5)
+    assert sender.messages() == [str(i) for i in range(10)]
+
+
+def test_groups_are_independent_and_ordered(sender):
+    scheduler = make_scheduler(sender)
+    for i in range(10):
+        for wxid in ("g1", "g2", "g3"):
+            scheduler.submit(wxid, str(i))
+    scheduler.drain(timeout=5)
+    assert len(sender.sent) == 30
+    for wxid in ("g1", "g2", "g3"):
+        assert sender.messages(wxid) == [str(i) for i in range(10)]
+
+
+def test_urgent_does_not_overtake_inflight_message(sender):
+    started = threading.Event()
+    release = threading.Event()
+
+    def send_func(wxid, msg, priority, traces):
+        if msg == "麦序":
+            started.set()
+            release.wait(5)
+        sender(wxid, msg, priority, traces)
+
+    scheduler = SendScheduler(send_func, concurrency=4, global_rate=0, group_rate=0)
+    scheduler.submit("g1", "麦序", PRIORITY_NORMAL)
+    assert started.wait(5)
+    scheduler.submit("g1", "顶", PRIORITY_URGENT)
+    time.sleep(0.05)
+    release.set()
+    scheduler.drain(timeout=5)
+    assert sender.messages() == ["麦序", "顶"]
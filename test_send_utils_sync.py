@@ -0,0 +1,29 @@
+from utils import send_utils_sync
+from utils.send_utils_sync import get_member_nicks
+
+
+class MemoryNickCache:
+    def __init__(self):
+        self.nicks = {}
+
+    def get_many(self, group_wxid, members_wxid):
+        return {member: self.nicks[member] for member in members_wxid if member in self.nicks}
+
+    def set_many(self, group_wxid, nicks):
+        self.nicks.update(nicks)
+
+
+def test_failed_nick_fetch_returns_empty_for_that_member(monkeypatch):
+    cache = MemoryNickCache()
+
+    def fetch_member_nick(group_wxid, member_wxid):
+        if member_wxid == "bad":
+            raise ConnectionError("接口不可用")
+        return f"nick-{member_wxid}"
+
+    monkeypatch.setattr(send_utils_sync, "nick_cache", cache)
+    monkeypatch.setattr(send_utils_sync, "fetch_member_nick", fetch_member_nick)
+    monkeypatch.setattr(send_utils_sync, "NICK_BULK_REQUEST_TYPE", "")
+    assert get_member_nicks("g1", ["a", "bad", "b"]) == {"a": "nick-a", "bad": "", "b": "nick-b"}
+    # 获取失败的昵称不缓存，下次重新获取
+    assert cache.nicks == {"a": "nick-a", "b": "nick-b"}
@@ -0,0 +1,31 @@
+from celery_tasks.tasks_crud import count_fixed_speed, get_koupai_base_score, parse_task_members
+from common.score_codec import TIER_SPEED, TIER_FIXED_SPEED
+
+GROUP_CONFIG = {"fixed_p_num": "2", "fixed_renwu_desc": "", "renwu_desc": ""}
+
+
+def index_members(members):
+    """成员索引中的成员字符串 -> (扣排类型, 状态)，与快速通道的解析一致"""
+    return [(member.split(":")[1], member.split(":")[2] if member.count(":") > 1 else "") for member in members]
+
+
+def test_count_fixed_speed_skips_daizou_and_zuofei():
+    members = ["a:固定手速", "b:固定手速:带走", "c:固定手速:作废", "d:手速", "e:p8 1.0"]
+    assert count_fixed_speed(index_members(members)) == 1
+
+
+def test_fast_path_and_task_count_the_same_members():
+    members = ["a:固定手速", "b:固定手速:作废", "c:手速"]
+    # 同步任务从扣排队列解析成员，快速通道从成员索引解析成员
+    queue_members = parse_task_members([(member, 1.0) for member in members], hour=10)
+    from_queue = count_fixed_speed((koupai_type, state) for _, koupai_type, _, state, *_ in queue_members)
+    assert from_queue == count_fixed_speed(index_members(members)) == 1
+
+
+def test_fixed_speed_tier_until_quota_is_met():
+    assert get_koupai_base_score(GROUP_CONFIG, "p", True, 1) == (TIER_FIXED_SPEED, "固定手速")
+    assert get_koupai_base_score(GROUP_CONFIG, "p", True, 2) == (TIER_SPEED, "手速")
+    # 作废的固定手速不占名额
+    fixed_num = count_fixed_speed(index_members(["a:固定手速", "b:固定手速:作废"]))
+    assert get_koupai_base_score(GROUP_CONFIG, "p", True, fixed_num) == (TIER_FIXED_SPEED, "固定手速")
+    assert get_koupai_base_score(GROUP_CONFIG, "补", True, 0) == (TIER_SPEED, "补")
@@ -0,0 +1,39 @@
+from celery_tasks.timer_wheel import TimerWheel
+
+
+def test_claim_only_due_timers_in_due_order(redis_conn):
+    wheel = TimerWheel("test:timers")
+    wheel.schedule(redis_conn, "b", 20)
+    wheel.schedule(redis_conn, "a", 10)
+    wheel.schedule(redis_conn, "later", 100)
+    assert wheel.claim_due(redis_conn, 10, 60, now=50) == ["a", "b"]
+    assert wheel.pending(redis_conn) == 3
+
+
+def test_claimed_timers_are_leased(redis_conn):
+    wheel = TimerWheel("test:timers")
+    wheel.schedule(redis_conn, "a", 10)
+    assert wheel.claim_due(redis_conn, 10, 60, now=50) == ["a"]
+    # 租约期间其他轮询领取不到
+    assert wheel.claim_due(redis_conn, 10, 60, now=100) == []
+    # 没有确认的定时器在租约到期后重新领取
+    assert wheel.claim_due(redis_conn, 10, 60, now=111) == ["a"]
+
+
+def test_ack_and_cancel_remove_timers(redis_conn):
+    wheel = TimerWheel("test:timers")
+    wheel.schedule(redis_conn, "a", 10)
+    wheel.schedule(redis_conn, "b", 10)
+    assert wheel.cancel(redis_conn, "b")
+    keys = wheel.claim_due(redis_conn, 10, 60, now=50)
+    wheel.ack(redis_conn, keys)
+    assert wheel.claim_due(redis_conn, 10, 60, now=1000) == []
+    assert not wheel.cancel(redis_conn, "a")
+
+
+def test_claim_respects_batch(redis_conn):
+    wheel = TimerWheel("test:timers")
+    for i in range(5):
+        wheel.schedule(redis_conn, f"t{i}", i)
+    assert wheel.claim_due(redis_conn, 2, 60, now=50) == ["t0", "t1"]
+    assert wheel.claim_due(redis_conn, 10, 60, now=50) == ["t2", "t3", "t4"]
@@ -0,0 +1,106 @@
+import threading
+from typing import Callable
+from common.config import SEND_COALESCE_MS, SEND_COALESCE_MAX_CHARS, SEND_COALESCE_SEPARATOR
+from utils.send_scheduler import PRIORITY_NORMAL
+
+
+class MessageCoalescer:
+    """
+    按群组合并发送消息：同一群组在缓冲时间内的多条消息按原顺序合并为一条发送
+    第一条消息到达时开始计时，到期后发送；合并后超过最大长度时先发送已缓冲的消息
+    合并后的消息使用其中最高的优先级，并携带其中每条消息的追踪信息（见 common.tracing）
+    进程退出时需调用 shutdown：缓冲的消息交给 shutdown_func（例如直接写入发件箱，由 flush_outbox 补发），
+    进程被强制结束（SIGKILL）时最多丢失 window_ms 内缓冲的消息
+    """
+
+    def __init__(self, send_func: Callable, window_ms: int = SEND_COALESCE_MS,
+                 max_chars: int = SEND_COALESCE_MAX_CHARS, separator: str = SEND_COALESCE_SEPARATOR,
+                 shutdown_func: Callable = None):
+        self._send_func = send_func
+        self._shutdown_func = shutdown_func
+        self.window = window_ms / 1000
+        self.max_chars = max_chars
+        self.separator = separator
+        self._lock = threading.Lock()
+        # group_wxid -> 待发送的消息列表
+        self._buffers = {}
+        # group_wxid -> 缓冲消息中最高的优先级
+        self._priorities = {}
+        # group_wxid -> 与待发送的消息一一对应的追踪信息
+        self._traces = {}
+        # group_wxid -> 发送锁，保证同一群组的合并消息按顺序发送
+        self._send_locks = {}
+        # group_wxid -> 等待到期的定时器，每个群组最多一个
+        self._timers = {}
+
+    def send(self, wxid: str, msg: str, priority: int = PRIORITY_NORMAL, trace: dict = None):
+        """缓冲一条消息，不合并时直接发送"""
+        if self.window <= 0:
+            return self._send_func(wxid, msg, priority, [trace])
+        flush_now = False
+        with self._lock:
+            self._priorities[wxid] = min(priority, self._priorities.get(wxid, priority))
+            self._traces.setdefault(wxid, []).append(trace)
+            buffer = self._buffers.get(wxid)
+            if buffer is None:
+                self._buffers[wxid] = [msg]
+                self._start_timer(wxid)
+            else:
+                buffer.append(msg)
+                flush_now = sum(len(item) for item in buffer) + len(self.separator) * (len(buffer) - 1) > self.max_chars
+        if flush_now:
+            self.flush(wxid, keep_last=True)
+
+    def flush(self, wxid: str, keep_last: bool = False, send_func: Callable = None):
+        """
+        发送群组缓冲的消息
+        keep_last: 超过最大长度时，最后一条留在缓冲中，由已经在等待的定时器发送
+        send_func: 使用指定的发送函数（默认为 send_func）
+        """
+        with self._get_send_lock(wxid):
+            with self._lock:
+                buffer = self._buffers.pop(wxid, None)
+                priority = self._priorities.pop(wxid, PRIORITY_NORMAL)
+                traces = self._traces.pop(wxid, [])
+                if buffer and keep_last and len(buffer) > 1:
+                    self._buffers[wxid] = buffer[-1:]
+                    self._priorities[wxid] = priority
+                    self._traces[wxid] = traces[-1:]
+                    buffer, traces = buffer[:-1], traces[:-1]
+                    self._start_timer(wxid)
+                elif not keep_last:
+                    # 缓冲已全部取出，取消等待中的定时器，避免之后的缓冲被提前发送
+                    timer = self._timers.pop(wxid, None)
+                    if timer is not None:
+                        timer.cancel()
+            if buffer:
+                (send_func or self._send_func)(wxid, self.separator.join(buffer), priority, traces)
+
+    def flush_all(self, send_func: Callable = None):
+        """发送所有缓冲的消息"""
+        with self._lock:
+            groups = list(self._buffers)
+        for wxid in groups:
+            self.flush(wxid, send_func=send_func)
+
+    def shutdown(self):
+        """进程退出时调用：缓冲的消息交给 shutdown_func，没有设置时直接发送"""
+        self.flush_all(self._shutdown_func)
+
+    def _start_timer(self, wxid: str):
+        """群组没有等待中的定时器时开始计时（调用时需持有 self._lock）"""
+        if wxid in self._timers:
+            return
+        timer = threading.Timer(self.window, self._on_timer, args=(wxid,))
+        timer.daemon = True
+        self._timers[wxid] = timer
+        timer.start()
+
+    def _on_timer(self, wxid: str):
+        with self._lock:
+            self._timers.pop(wxid, None)
+        self.flush(wxid)
+
+    def _get_send_lock(self, wxid: str) -> threading.Lock:
+        with self._lock:
+            return self._send_locks.setdefault(wxid, threading.Lock())
@@ -0,0 +1,84 @@
+import os
+import threading
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from common.config import (QIANXUN_API_URL, HTTP_POOL_SIZE, HTTP_CONNECT_TIMEOUT,
+                           HTTP_READ_TIMEOUT, HTTP_KEEPALIVE_SECONDS)
+
+HEADERS = {
+    'User-Agent': 'Apifox/1.0.0 (https://apifox.com)',
+    'Content-Type': 'application/json'
+}
+
+
+class HttpClient:
+    """
+    同步发送接口的HTTP客户端（celery worker侧）
+    每个进程一个长连接的requests.Session，fork后的子进程会重新创建，不共享父进程的连接
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+
+    def get_session(self) -> requests.Session:
+        """获取当前进程的连接池"""
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    session.headers.update(HEADERS)
+                    self._session = session
+                    self._pid = os.getpid()
+        return self._session
+
+    def post(self, payload: bytes) -> requests.Response:
+        """发送请求到千寻接口"""
+        return self.get_session().post(QIANXUN_API_URL, data=payload,
+                                       timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+
+    def close(self):
+        """关闭连接池"""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+class AsyncHttpClient:
+    """
+    异步发送接口的HTTP客户端（FastAPI侧）
+    整个应用共用一个aiohttp.ClientSession，在lifespan关闭时释放
+    """
+
+    def __init__(self):
+        self._session = None
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """获取共用的连接池，需在事件循环中调用"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=HTTP_POOL_SIZE, keepalive_timeout=HTTP_KEEPALIVE_SECONDS)
+            timeout = aiohttp.ClientTimeout(connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout, headers=HEADERS)
+        return self._session
+
+    async def post(self, payload: bytes) -> tuple:
+        """发送请求到千寻接口，返回 (响应, 响应内容)"""
+        async with self.get_session().post(QIANXUN_API_URL, data=payload) as response:
+            return response, await response.text()
+
+    async def close(self):
+        """关闭连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+# 全局HTTP客户端实例
+http_client = HttpClient()
+async_http_client = AsyncHttpClient()
@@ -0,0 +1,174 @@
+import json
+import logging
+import threading
+import time
+from typing import Callable
+from cache.redis_pool import get_redis_connection
+from common.config import (OUTBOX_FAILURE_THRESHOLD, OUTBOX_RESET_SECONDS, OUTBOX_BACKOFF_BASE,
+                           OUTBOX_BACKOFF_MAX, OUTBOX_MAX_ATTEMPTS)
+from utils.send_scheduler import PRIORITIES, PRIORITY_NORMAL
+from common.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# 待补发的消息，每个优先级一个列表，元素为 {"wxid", "msg", "ts", "traces"（可选）} 的JSON，按入队顺序补发
+OUTBOX_KEY = "outbox:send"
+# 超过最大尝试次数的消息
+OUTBOX_DEAD_KEY = "outbox:send:dead"
+# 补发状态 hash: failures 连续失败次数, retry_at 下次补发时间戳, attempts:{优先级} 队首消息的尝试次数
+OUTBOX_STATE_KEY = "outbox:send:state"
+# 补发锁，同一时间只有一个进程补发，保证顺序
+OUTBOX_LOCK_KEY = "outbox:send:lock"
+
+
+def get_outbox_key(priority: int) -> str:
+    """获取指定优先级的发件箱key"""
+    return f"{OUTBOX_KEY}:{priority}"
+
+
+def backoff_seconds(failures: int) -> float:
+    """第failures次连续失败后的退避时间"""
+    return min(OUTBOX_BACKOFF_BASE * 2 ** max(failures - 1, 0), OUTBOX_BACKOFF_MAX)
+
+
+class CircuitBreaker:
+    """
+    进程内的熔断器：连续失败达到阈值后打开，打开期间不再请求接口；
+    经过 reset_seconds 后放行一个探测请求（半开），成功则关闭，失败则重新打开
+    """
+
+    def __init__(self, threshold: int = OUTBOX_FAILURE_THRESHOLD, reset_seconds: float = OUTBOX_RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def allow(self) -> bool:
+        """是否可以请求接口"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.reset_seconds:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+
+class Outbox:
+    """
+    持久化发件箱：接口可用时直接发送；接口失败、熔断打开或已有待补发的消息时，
+    消息写入redis列表，由 flush_outbox 定时任务按顺序补发，失败时指数退避
+    """
+
+    def __init__(self, send_func: Callable, breaker: CircuitBreaker = None):
+        self._send_func = send_func
+        self.breaker = breaker or CircuitBreaker()
+
+    def send(self, wxid: str, msg: str, priority: int = PRIORITY_NORMAL, traces: list = None):
+        """发送消息，无法发送时写入发件箱；traces 为消息的追踪信息，发送后记录发送耗时"""
+        redis_conn = get_redis_connection(0)
+        # 发件箱中还有消息时直接排在后面，保证接口恢复后按顺序发送
+        if redis_conn.llen(get_outbox_key(priority)) == 0 and self.breaker.allow():
+            start = time.time()
+            try:
+                self._send_func(wxid, msg)
+                self.breaker.record_success()
+                tracer.record_send(traces, start, time.time(), wxid=wxid, priority=priority)
+                return
+            except Exception as e:
+                self.breaker.record_failure()
+                logger.warning(f"发送消息到{wxid}失败，写入发件箱: {e}")
+        self.push(redis_conn, wxid, msg, priority, traces)
+
+    def store(self, wxid: str, msg: str, priority: int = PRIORITY_NORMAL, traces: list = None):
+        """直接写入发件箱，不尝试发送（进程退出时保存还没有发送的消息，由 flush_outbox 补发）"""
+        self.push(get_redis_connection(0), wxid, msg, priority, traces)
+
+    def push(self, redis_conn, wxid: str, msg: str, priority: int = PRIORITY_NORMAL, traces: list = None):
+        """写入发件箱"""
+        message = {"wxid": wxid, "msg": msg, "ts": time.time()}
+        if traces:
+            message["traces"] = traces
+        redis_conn.rpush(get_outbox_key(priority), json.dumps(message, ensure_ascii=False))
+
+    def pending(self, redis_conn) -> int:
+        """发件箱中待补发的消息数量"""
+        pipe = redis_conn.pipeline(transaction=False)
+        for priority in PRIORITIES:
+            pipe.llen(get_outbox_key(priority))
+        return sum(pipe.execute())
+
+    def flush(self, redis_conn, batch: int, lock_seconds: int = 60) -> int:
+        """
+        按优先级、按入队顺序补发消息，遇到失败时停止并退避
+        返回: 本次补发成功的数量
+        """
+        lock = redis_conn.lock(OUTBOX_LOCK_KEY, timeout=lock_seconds, blocking=False)
+        if not lock.acquire():
+            return 0
+        try:
+            state = redis_conn.hgetall(OUTBOX_STATE_KEY)
+            if float(state.get("retry_at", 0)) > time.time():
+                return 0
+            sent = 0
+            for priority in PRIORITIES:
+                key = get_outbox_key(priority)
+                while sent < batch:
+                    item = redis_conn.lindex(key, 0)
+                    if item is None:
+                        break
+                    message = json.loads(item)
+                    start = time.time()
+                    try:
+                        self._send_func(message["wxid"], message["msg"])
+                    except Exception as e:
+                        self._record_flush_failure(redis_conn, key, priority, state, e)
+                        return sent
+                    tracer.record_send(message.get("traces"), start, time.time(), wxid=message["wxid"], priority=priority, outbox=True)
+                    # 只有持有锁的进程从队首取出，其他进程只追加到队尾
+                    redis_conn.lpop(key)
+                    redis_conn.hdel(OUTBOX_STATE_KEY, "failures", "retry_at", f"attempts:{priority}")
+                    state = {}
+                    self.breaker.record_success()
+                    sent += 1
+            return sent
+        finally:
+            try:
+                lock.release()
+            except Exception:
+                pass
+
+    def _record_flush_failure(self, redis_conn, key: str, priority: int, state: dict, error: Exception):
+        """记录补发失败：退避，队首消息超过最大尝试次数时移入死信列表"""
+        failures = int(state.get("failures", 0)) + 1
+        attempts = int(state.get(f"attempts:{priority}", 0)) + 1
+        self.breaker.record_failure()
+        pipe = redis_conn.pipeline()
+        if attempts >= OUTBOX_MAX_ATTEMPTS:
+            pipe.lmove(key, OUTBOX_DEAD_KEY, "LEFT", "RIGHT")
+            pipe.hdel(OUTBOX_STATE_KEY, f"attempts:{priority}")
+            logger.error(f"补发消息失败{attempts}次，移入死信列表 {OUTBOX_DEAD_KEY}: {error}")
+        else:
+            pipe.hset(OUTBOX_STATE_KEY, f"attempts:{priority}", attempts)
+            logger.warning(f"补发消息失败（第{attempts}次）: {error}")
+        pipe.hset(OUTBOX_STATE_KEY, mapping={"failures": failures, "retry_at": time.time() + backoff_seconds(failures)})
+        pipe.execute()
@@ -0,0 +1,171 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from common.config import (SEND_CONCURRENCY, SEND_GLOBAL_RATE, SEND_GLOBAL_BURST,
+                           SEND_GROUP_RATE, SEND_GROUP_BURST)
+
+logger = logging.getLogger(__name__)
+
+# 发送优先级（数值越小越优先）
+PRIORITY_URGENT = 0     # 成员操作的即时回复（已满、顶、禁排、输入错误等）
+PRIORITY_NORMAL = 1     # 一般消息（开始/截止扣排、报备等）
+PRIORITY_BULK = 2       # 批量输出（打卡记录表、今日麦序统计等）
+PRIORITIES = (PRIORITY_URGENT, PRIORITY_NORMAL, PRIORITY_BULK)
+
+
+class TokenBucket:
+    """令牌桶，rate为每秒补充的令牌数（<=0时不限速），burst为桶容量"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """距离下一个令牌可用的秒数，0表示当前可用"""
+        if self.rate <= 0:
+            return 0
+        self._refill(now)
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        """取走一个令牌（调用前需确认 wait_time 为0）"""
+        if self.rate > 0:
+            self._refill(now)
+            self.tokens -= 1
+
+    def idle(self, now: float) -> bool:
+        """令牌桶已补满（可以回收）"""
+        return self.rate <= 0 or self.tokens + (now - self.updated) * self.rate >= self.burst
+
+
+class SendScheduler:
+    """
+    发送调度器：按优先级排队，受全局和每个群组的令牌桶限速，并限制同时发送的请求数
+    优先发送高优先级中可以发送的消息；某个群组被限速时，不影响其他群组的消息
+    同一群组同一优先级的消息按提交顺序发送：每个群组同时只有一条消息在发送，上一条发送完成后才发送下一条
+    """
+
+    def __init__(self, send_func: Callable, concurrency: int = SEND_CONCURRENCY,
+                 global_rate: float = SEND_GLOBAL_RATE, global_burst: int = SEND_GLOBAL_BURST,
+                 group_rate: float = SEND_GROUP_RATE, group_burst: int = SEND_GROUP_BURST):
+        self._send_func = send_func
+        self.concurrency = max(concurrency, 1)
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self._global_bucket = TokenBucket(global_rate, global_burst)
+        self._group_buckets = {}
+        self._queues = {priority: deque() for priority in PRIORITIES}
+        self._cond = threading.Condition()
+        self._inflight = 0
+        # 正在发送消息的群组
+        self._busy_groups = set()
+        self._pid = None
+        self._executor = None
+        atexit.register(self.drain)
+
+    def submit(self, wxid: str, msg: str, priority: int = PRIORITY_NORMAL, traces: list = None):
+        """提交一条待发送的消息，traces 为消息的追踪信息（随消息传给 send_func）"""
+        with self._cond:
+            self._ensure_started()
+            self._queues[priority].append((wxid, msg, traces))
+            self._cond.notify_all()
+
+    def pending(self) -> int:
+        """排队中的消息数量"""
+        with self._cond:
+            return sum(len(queue) for queue in self._queues.values()) + self._inflight
+
+    def drain(self, timeout: float = 10.0):
+        """等待排队中的消息发送完成（进程退出时调用）"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while (self._inflight or any(self._queues.values())) and self._pid == os.getpid():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+    def _ensure_started(self):
+        """在当前进程中启动调度线程（fork后的子进程重新启动）"""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._inflight = 0
+        self._busy_groups = set()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="sender")
+        threading.Thread(target=self._run, name="send-scheduler", daemon=True).start()
+
+    def _group_bucket(self, wxid: str) -> TokenBucket:
+        bucket = self._group_buckets.get(wxid)
+        if bucket is None:
+            bucket = self._group_buckets[wxid] = TokenBucket(self.group_rate, self.group_burst)
+        return bucket
+
+    def _next(self, now: float):
+        """
+        选出下一条可以发送的消息
+        返回: (消息, 需要等待的秒数)，没有可发送的消息时消息为None，等待时间为None表示等待新消息
+        """
+        if self._inflight >= self.concurrency:
+            return None, None
+        global_wait = self._global_bucket.wait_time(now)
+        if global_wait > 0:
+            return None, global_wait
+        min_wait = None
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            limited = set()
+            for index, (wxid, msg, traces) in enumerate(queue):
+                # 正在发送的群组等发送完成后再选（完成时会唤醒调度线程）
+                if wxid in limited or wxid in self._busy_groups:
+                    continue
+                bucket = self._group_bucket(wxid)
+                wait = bucket.wait_time(now)
+                if wait <= 0:
+                    del queue[index]
+                    self._global_bucket.take(now)
+                    bucket.take(now)
+                    return (wxid, msg, priority, traces), 0
+                limited.add(wxid)
+                min_wait = wait if min_wait is None else min(min_wait, wait)
+        return None, min_wait
+
+    def _prune(self, now: float):
+        """回收已经补满的群组令牌桶"""
+        if len(self._group_buckets) > 1024:
+            for wxid in [wxid for wxid, bucket in self._group_buckets.items() if bucket.idle(now)]:
+                del self._group_buckets[wxid]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                item, wait = self._next(time.monotonic())
+                while item is None:
+                    self._prune(time.monotonic())
+                    self._cond.wait(wait)
+                    item, wait = self._next(time.monotonic())
+                self._inflight += 1
+                self._busy_groups.add(item[0])
+            self._executor.submit(self._deliver, *item)
+
+    def _deliver(self, wxid: str, msg: str, priority: int, traces: list):
+        try:
+            self._send_func(wxid, msg, priority, traces)
+        except Exception as e:
+            logger.error(f"发送消息到{wxid}时出错: {e}")
+        finally:
+            with self._cond:
+                self._inflight -= 1
+                self._busy_groups.discard(wxid)
+                self._cond.notify_all()
@@ -1,6 +1,11 @@
-import aiohttp
 import json
 import asyncio
+import logging
+from utils.http_client import async_http_client
+from common.metrics import BOT_API_SECONDS, BOT_API_ERRORS
+from common.log import sampled
+
+logger = logging.getLogger(__name__)
 
 async def change_groupname(group_id, new_name):
     """
@@ -17,25 +22,21 @@ async def send_request(wxid, request_type, data):
     """
     发送请求到微信服务器的通用函数。
     """
-    url = "http://127.0.0.1:28888/wechat/httpapi"
-
     payload = json.dumps({
         "type": request_type,
         "data": data
     }, ensure_ascii=False)  # 确保中文字符能够正确传输
 
-    headers = {
-        'User-Agent': 'Apifox/1.0.0 (https://apifox.com)',
-        'Content-Type': 'application/json'
-    }
-
-    print(f"Sending {request_type} to {wxid}: {data}")
-    
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers=headers, data=payload.encode('utf-8')) as response:
-            response_text = await response.text()
-            print(f"Response from server: {response_text}")  # 打印服务器响应
-            return response
+    logger.info("发送请求: %s", request_type, extra=sampled("send", wxid=wxid, data=data))
+    try:
+        # 使用共用的长连接池，不再为每条消息创建新的ClientSession
+        with BOT_API_SECONDS.time(request_type=request_type):
+            response, response_text = await async_http_client.post(payload.encode('utf-8'))
+    except Exception:
+        BOT_API_ERRORS.inc(request_type=request_type)
+        raise
+    logger.debug("接口响应", extra={"request_type": request_type, "response": response_text})
+    return response
 
 
 async def send_message(wxid, msg):
@@ -1,6 +1,24 @@
+import atexit
 import json
-import requests
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.http_client import http_client
+from common.config import NICK_FETCH_CONCURRENCY, NICK_BULK_REQUEST_TYPE, NICK_BULK_MIN_MISSING
+from cache.nick_cache import nick_cache
+from utils.coalescer import MessageCoalescer
+from utils.send_scheduler import SendScheduler, PRIORITY_NORMAL
+from utils.outbox import Outbox
 from utils.emoji_map import emoji_map
+from common.metrics import BOT_API_SECONDS, BOT_API_ERRORS
+from common.tracing import tracer
+from common.log import sampled
+
+logger = logging.getLogger(__name__)
+
+_nick_executor = None
+_nick_executor_lock = threading.Lock()
+
 def generate_custom_msg_content(**kwargs) -> str:
     """
     生成自定义消息内容
@@ -13,7 +31,70 @@ def generate_custom_msg_content(**kwargs) -> str:
 
 def get_member_nick(group_wxid: str, member_wxid: str) -> str:
     """
-    获取指定用户的昵称。
+    获取指定用户的昵称（优先使用昵称缓存）。
+    """
+    nick = nick_cache.get(group_wxid, member_wxid)
+    if nick is not None:
+        return nick
+    nick = fetch_member_nick(group_wxid, member_wxid)
+    # 接口没有返回昵称时不缓存，下次重新获取
+    if nick:
+        nick_cache.set(group_wxid, member_wxid, nick)
+    return nick
+
+def get_member_nicks(group_wxid: str, members_wxid) -> dict:
+    """
+    批量获取成员昵称，返回 {member_wxid: 昵称}（获取不到时为空字符串）。
+    缓存未命中的成员并发获取（缺失较多且配置了群成员列表接口时一次获取整个群），结果一次写入缓存。
+    """
+    members_wxid = list(dict.fromkeys(members_wxid))
+    nicks = nick_cache.get_many(group_wxid, members_wxid)
+    missing = [member_wxid for member_wxid in members_wxid if member_wxid not in nicks]
+    if not missing:
+        return nicks
+    fetched = {}
+    if NICK_BULK_REQUEST_TYPE and len(missing) >= NICK_BULK_MIN_MISSING:
+        fetched = {member_wxid: nick for member_wxid, nick in fetch_group_nicks(group_wxid).items() if member_wxid in missing}
+    remaining = [member_wxid for member_wxid in missing if member_wxid not in fetched]
+    if remaining:
+        results = get_nick_executor().map(lambda member_wxid: fetch_member_nick_or_empty(group_wxid, member_wxid), remaining)
+        fetched.update(zip(remaining, results))
+    # 接口没有返回昵称时不缓存，下次重新获取
+    nick_cache.set_many(group_wxid, {member_wxid: nick for member_wxid, nick in fetched.items() if nick})
+    nicks.update(fetched)
+    return nicks
+
+def get_nick_executor() -> ThreadPoolExecutor:
+    """获取昵称并发获取使用的线程池（每个进程一个）"""
+    global _nick_executor
+    if _nick_executor is None:
+        with _nick_executor_lock:
+            if _nick_executor is None:
+                _nick_executor = ThreadPoolExecutor(max_workers=NICK_FETCH_CONCURRENCY, thread_name_prefix="nick")
+    return _nick_executor
+
+def fetch_group_nicks(group_wxid: str) -> dict:
+    """
+    通过群成员列表接口一次获取整个群的昵称 {member_wxid: 昵称}。
+    """
+    try:
+        response = send_request(group_wxid, NICK_BULK_REQUEST_TYPE, {"wxid": group_wxid})
+    except Exception as e:
+        logger.warning(f"获取群成员列表失败: {e}")
+        return {}
+    result = response.get("result", [])
+    # 兼容 result 为列表，或 result 中包含成员列表字段的情况
+    if isinstance(result, dict):
+        result = next((value for value in result.values() if isinstance(value, list)), [])
+    nicks = {}
+    for member in result:
+        if isinstance(member, dict) and member.get("wxid"):
+            nicks[member["wxid"]] = member.get("groupNick") or member.get("nick") or ""
+    return nicks
+
+def fetch_member_nick(group_wxid: str, member_wxid: str) -> str:
+    """
+    从接口获取指定用户的昵称。
     """
     data = {
         "wxid": group_wxid,
@@ -28,13 +109,21 @@ def get_member_nick(group_wxid: str, member_wxid: str) -> str:
         return group_nickid
     return ""
 
+def fetch_member_nick_or_empty(group_wxid: str, member_wxid: str) -> str:
+    """
+    从接口获取指定用户的昵称，失败时返回空字符串（批量获取时单个成员失败不影响其他成员）。
+    """
+    try:
+        return fetch_member_nick(group_wxid, member_wxid)
+    except Exception as e:
+        logger.warning(f"获取成员{member_wxid}的昵称失败: {e}")
+        return ""
+
 def at_user(wxid: str, trueAt: bool = True) -> str:
     """
     生成@用户的字符串。
     """
-    at_msg = f"[@,wxid={wxid},nick=,isAuto={'true' if trueAt else 'false'}]"
-    print(f"生成的@用户字符串: {at_msg}")
-    return at_msg
+    return f"[@,wxid={wxid},nick=,isAuto={'true' if trueAt else 'false'}]"
 
 def change_groupname(group_id, new_name):
     """
@@ -55,25 +144,34 @@ def send_request(wxid, request_type, data):
         request_type: 请求类型，例如 "sendText"
         data: 请求数据，包含必要的参数
     """
-    url = "http://127.0.0.1:28888/wechat/httpapi"
-
     payload = json.dumps({
         "type": request_type,
         "data": data
     }, ensure_ascii=False)  # 确保中文字符能够正确传输
 
-    headers = {
-        'User-Agent': 'Apifox/1.0.0 (https://apifox.com)',
-        'Content-Type': 'application/json'
-    }
-
-    print(f"Sending {request_type} to {wxid}: {data}")
-    response = requests.post(url, headers=headers, data=payload.encode('utf-8'))  # 确保以 UTF-8 编码发送
-    print(f"Response from server: {response.text}")  # 打印服务器响应
+    logger.info("发送请求: %s", request_type, extra=sampled("send", wxid=wxid, data=data))
+    try:
+        # 使用当前进程的长连接池，确保以 UTF-8 编码发送
+        with BOT_API_SECONDS.time(request_type=request_type):
+            response = http_client.post(payload.encode('utf-8'))
+        logger.debug("接口响应", extra={"request_type": request_type, "response": response.text})
+        # 接口异常（重启中、网关错误等）时抛出，由发件箱重试
+        response.raise_for_status()
+    except Exception:
+        BOT_API_ERRORS.inc(request_type=request_type)
+        raise
     return response.json()
 
-def send_message(wxid, msg):
-    """发送文本消息"""
+def send_message(wxid, msg, priority=PRIORITY_NORMAL):
+    """
+    发送文本消息
+    同一群组短时间内的多条消息会合并发送（见 utils.coalescer），
+    之后按优先级和速率限制排队发送（见 utils.send_scheduler），接口不可用时写入发件箱补发（见 utils.outbox）
+    """
+    return message_coalescer.send(wxid, msg, priority, trace=tracer.ref())
+
+def send_message_now(wxid, msg):
+    """立即发送文本消息"""
     data = {
         "wxid": wxid,
         "msg": msg,
@@ -81,6 +179,16 @@ def send_message(wxid, msg):
     }
     return send_request(wxid, "sendText", data)
 
+# 全局发件箱实例
+outbox = Outbox(send_message_now)
+# 全局发送调度实例
+send_scheduler = SendScheduler(outbox.send)
+# 全局消息合并实例（进程退出时缓冲的消息写入发件箱）
+message_coalescer = MessageCoalescer(send_scheduler.submit, shutdown_func=outbox.store)
+# 进程退出时先等待调度器中排队的消息发送完成，再把合并缓冲中的消息写入发件箱，保证同一群组的消息顺序（atexit后注册的先执行）
+atexit.register(message_coalescer.shutdown)
+atexit.register(send_scheduler.drain)
+
 def send_file(wxid, file_path, file_name):
     """发送文件"""
     data = {